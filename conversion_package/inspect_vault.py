@@ -3,10 +3,18 @@
 Inspect OG-MARL vault to see available qualities and metadata
 """
 
+import os
+import re
 import sys
 import json
 from pathlib import Path
 
+# metadata.json shape strings, e.g. "(1, 50000, 20, 238)"
+_OBS_RE = re.compile(r'\(1,\s*(\d+),\s*(\d+),\s*(\d+)\)')
+_ACT_CONT_RE = re.compile(r'\(1,\s*\d+,\s*\d+,\s*(\d+)\)')
+_ACT_DISC_RE = re.compile(r'\(1,\s*(\d+),\s*(\d+)\)$')
+_STATE_RE = re.compile(r'\(1,\s*\d+,\s*(\d+)\)')
+
 def inspect_vault(vault_path):
     """
     Inspect vault and display available qualities and metadata
@@ -30,17 +38,23 @@ def inspect_vault(vault_path):
 
     # Find all quality directories
     qualities = []
-    for item in vault_dir.iterdir():
-        if item.is_dir():
+    with os.scandir(vault_dir) as entries:
+        for entry in entries:
+            if not entry.is_dir(follow_symlinks=False):
+                continue
+
             # Check if it has the vault structure (metadata.json, manifest.ocdbt, d/)
-            has_metadata = (item / 'metadata.json').exists()
-            has_manifest = (item / 'manifest.ocdbt').exists()
-            has_data_dir = (item / 'd').exists()
+            # with one directory listing instead of three stat() probes
+            with os.scandir(entry.path) as children:
+                names = {child.name for child in children}
+            has_metadata = 'metadata.json' in names
+            has_manifest = 'manifest.ocdbt' in names
+            has_data_dir = 'd' in names
 
             if has_metadata or has_manifest or has_data_dir:
                 qualities.append({
-                    'name': item.name,
-                    'path': item,
+                    'name': entry.name,
+                    'path': Path(entry.path),
                     'has_metadata': has_metadata,
                     'has_manifest': has_manifest,
                     'has_data': has_data_dir
@@ -81,8 +95,7 @@ def inspect_vault(vault_path):
                     if 'observations' in shapes:
                         obs_shape = shapes['observations']
                         # Parse shape string like "(1, 50000, 20, 238)"
-                        import re
-                        match = re.search(r'\(1, (\d+), (\d+), (\d+)\)', obs_shape)
+                        match = _OBS_RE.search(obs_shape)
                         if match:
                             timesteps, agents, obs_dim = match.groups()
                             print(f"         Timesteps: {int(timesteps):,}")
@@ -93,9 +106,9 @@ def inspect_vault(vault_path):
                     if 'actions' in shapes:
                         act_shape = shapes['actions']
                         # Try continuous actions: (1, timesteps, agents, act_dim)
-                        match_cont = re.search(r'\(1, \d+, \d+, (\d+)\)', act_shape)
+                        match_cont = _ACT_CONT_RE.search(act_shape)
                         # Try discrete actions: (1, timesteps, agents)
-                        match_disc = re.search(r'\(1, (\d+), (\d+)\)$', act_shape)
+                        match_disc = _ACT_DISC_RE.search(act_shape)
 
                         if match_cont:
                             print(f"         Act dim: {match_cont.group(1)} (continuous)")
@@ -110,7 +123,7 @@ def inspect_vault(vault_path):
                     # State
                     if 'infos' in shapes and isinstance(shapes['infos'], dict) and 'state' in shapes['infos']:
                         state_shape = shapes['infos']['state']
-                        match = re.search(r'\(1, \d+, (\d+)\)', state_shape)
+                        match = _STATE_RE.search(state_shape)
                         if match:
                             print(f"         State dim: {match.group(1)}")
 
@@ -128,7 +141,8 @@ def inspect_vault(vault_path):
         # Check data directory size
         if q['has_data']:
             data_dir = q['path'] / 'd'
-            num_files = len(list(data_dir.iterdir()))
+            with os.scandir(data_dir) as entries:
+                num_files = sum(1 for _ in entries)
             print(f"   Data files: {num_files}")
 
         print()
@@ -1,5 +1,23 @@
 from flashbax.vault import Vault
-import jax, json, numpy as np
+import argparse, jax, json, sys, numpy as np
+
+from converters._vault_common import dumps_line, json_rows, to_structured_array
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+parser = argparse.ArgumentParser(description='Export the 2halfcheetah Replay vault from the project root')
+parser.add_argument('--format', choices=['npy', 'jsonl-preview'], default='npy',
+                    help='npy: every timestep as a NumPy structured array (default); '
+                         'jsonl-preview: first --preview-steps timesteps as JSON')
+parser.add_argument('--preview-steps', type=int, default=100,
+                    help='Timesteps exported by jsonl-preview (default: 100)')
+parser.add_argument('--pretty', action='store_true',
+                    help='jsonl-preview only: write one indented JSON document instead of JSONL')
+args = parser.parse_args()
 
 print("Loading vault from project root...")
 
@@ -12,7 +30,7 @@ vault = Vault(
 
 print("Reading experience data...")
 experience = vault.read().experience
-data = jax.tree.map(lambda x: np.array(x), experience)
+data = jax.tree.map(np.asarray, jax.device_get(experience))
 
 print("\nData structure loaded:")
 for key in data.keys():
@@ -23,40 +41,80 @@ for key in data.keys():
     else:
         print(f"  {key}: {data[key].shape}")
 
-# Convert to JSON (first 100 timesteps)
+if args.format == 'npy':
+    # Full-precision, memory-mappable export of every timestep
+    records = to_structured_array(data)
+    np.save('vault_output.npy', records)
+
+    print(f"\n✅ Saved to vault_output.npy ({len(records)} timesteps)")
+    print(f"   Fields: {', '.join(records.dtype.names)}")
+    print("   Load with: np.load('vault_output.npy', mmap_mode='r')")
+    sys.exit(0)
+
+# Convert to JSON (first --preview-steps timesteps)
 print("\nConverting to JSON...")
-trajectories = []
-n_timesteps = min(100, data['observations'].shape[1])
+# Bind the batch-0 slices and shapes once
+obs0, act0, rew0, term0, trunc0 = (
+    data[k][0] for k in ('observations', 'actions', 'rewards', 'terminals', 'truncations')
+)
+total_timesteps, n_agents, obs_dim = obs0.shape
+action_dim = act0.shape[2]
+n_timesteps = min(args.preview_steps, total_timesteps)
+
+# One bulk conversion per field instead of one per timestep
+obs_list = json_rows(obs0[:n_timesteps])
+act_list = json_rows(act0[:n_timesteps])
+rew_list = json_rows(rew0[:n_timesteps])
+term_list = json_rows(term0[:n_timesteps])
+trunc_list = json_rows(trunc0[:n_timesteps])
 
-for t in range(n_timesteps):
-    step = {
+trajectories = [
+    {
         "timestep": t,
-        "observations": data['observations'][0, t].tolist(),
-        "actions": data['actions'][0, t].tolist(),
-        "rewards": data['rewards'][0, t].tolist(),
-        "terminals": data['terminals'][0, t].tolist(),
-        "truncations": data['truncations'][0, t].tolist()
+        "observations": o,
+        "actions": a,
+        "rewards": r,
+        "terminals": term,
+        "truncations": trunc
     }
-    # Add state if available
-    if 'infos' in data and 'state' in data['infos']:
-        step["state"] = data['infos']['state'][0, t].tolist()
-    trajectories.append(step)
+    for t, (o, a, r, term, trunc) in enumerate(
+        zip(obs_list, act_list, rew_list, term_list, trunc_list)
+    )
+]
+
+# Add state if available
+if 'infos' in data and 'state' in data['infos']:
+    state_list = json_rows(data['infos']['state'][0, :n_timesteps])
+    for step, state in zip(trajectories, state_list):
+        step["state"] = state
 
 # Create output with metadata
 output = {
     "metadata": {
-        "n_timesteps": int(data['observations'].shape[1]),
-        "n_agents": int(data['observations'].shape[2]),
-        "obs_dim": int(data['observations'].shape[3]),
-        "action_dim": int(data['actions'].shape[3])
+        "n_timesteps": int(total_timesteps),
+        "n_agents": int(n_agents),
+        "obs_dim": int(obs_dim),
+        "action_dim": int(action_dim)
     },
     "trajectories": trajectories
 }
 
 # Save
-with open('vault_output.json', 'w') as f:
-    json.dump(output, f, indent=2)
+if args.pretty:
+    output_file = 'vault_output.json'
+    if orjson is not None:
+        with open(output_file, 'wb') as f:
+            f.write(orjson.dumps(output, option=orjson.OPT_INDENT_2 | orjson.OPT_SERIALIZE_NUMPY))
+    else:
+        with open(output_file, 'w') as f:
+            json.dump(output, f, indent=2)
+else:
+    # JSONL: metadata header line, then one line per timestep
+    output_file = 'vault_output.jsonl'
+    with open(output_file, 'wb') as f:
+        f.write(dumps_line({"metadata": output["metadata"]}))
+        f.writelines(dumps_line(step) for step in trajectories)
 
-print(f"\n✅ Saved to vault_output.json ({n_timesteps} timesteps)")
+print(f"\n✅ Saved to {output_file} ({n_timesteps} timesteps)")
 print(f"   Agents: {output['metadata']['n_agents']}")
 print(f"   Total timesteps in vault: {output['metadata']['n_timesteps']}")
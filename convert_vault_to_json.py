@@ -4,12 +4,26 @@ Windows-compatible OG-MARL vault to JSON converter
 Fixes path issues on Windows systems
 """
 
+import argparse
 import json
 import numpy as np
 from pathlib import Path
 import os
 import sys
 
+from converters._vault_common import dumps_line, json_rows, to_structured_array
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    from numba import njit, prange
+    NUMBA_AVAILABLE = True
+except ImportError:
+    NUMBA_AVAILABLE = False
+
 # Try to import required packages
 try:
     from flashbax.vault import Vault
@@ -20,9 +34,30 @@ except ImportError:
     print("⚠️ Flashbax not installed. Install with: pip install flashbax jax")
 
 
-def convert_vault_to_json(vault_path, quality="Replay"):
+# tensorstore accepts absolute POSIX paths everywhere except Windows, where
+# drive-letter paths break it; there, load from the vault's parent directory
+_PATH_STRATEGY = "chdir" if sys.platform == "win32" else "absolute"
+
+
+def _read_experience(vault_path, quality):
+    """Read the vault experience using the platform's path strategy"""
+    if _PATH_STRATEGY == "absolute":
+        return Vault(vault_path.as_posix(), vault_uid=quality).read().experience
+
+    original_dir = Path.cwd()
+    os.chdir(vault_path.parent)
+    try:
+        return Vault(vault_path.name, vault_uid=quality).read().experience
+    finally:
+        os.chdir(original_dir)
+
+
+def convert_vault_to_json(vault_path, quality="Replay", output_format="jsonl-preview"):
     """
     Convert vault data to readable JSON format - Windows compatible version
+
+    output_format="npy" returns every timestep as a NumPy structured array
+    (see to_structured_array) instead of the JSON preview dict
     """
 
     if not FLASHBAX_AVAILABLE:
@@ -36,68 +71,19 @@ def convert_vault_to_json(vault_path, quality="Replay"):
     # Convert to Path object and get absolute path
     vault_path = Path(vault_path).absolute()
 
-    # METHOD 1: Try with forward slashes (Unix-style)
     try:
-        vault_path_unix = vault_path.as_posix()
-        print(f"Trying Unix-style path: {vault_path_unix}")
-
-        vault = Vault(vault_path_unix, vault_uid=quality)
-        experience = vault.read().experience
-        print("✅ Successfully loaded with Unix-style path!")
-
-    except Exception as e1:
-        print(f"Unix-style path failed: {str(e1)[:100]}...")
-
-        # METHOD 2: Try with relative path from current directory
-        try:
-            current_dir = Path.cwd()
-            rel_path = vault_path.relative_to(current_dir)
-            rel_path_str = rel_path.as_posix()
-            print(f"\nTrying relative path: {rel_path_str}")
-
-            vault = Vault(rel_path_str, vault_uid=quality)
-            experience = vault.read().experience
-            print("✅ Successfully loaded with relative path!")
-
-        except Exception as e2:
-            print(f"Relative path failed: {str(e2)[:100]}...")
-
-            # METHOD 3: Try changing directory and using local path
-            try:
-                vault_dir = vault_path / quality
-                if vault_dir.exists():
-                    print(f"\nTrying direct directory access: {vault_dir}")
-
-                    # Change to parent directory
-                    original_dir = Path.cwd()
-                    try:
-                        os.chdir(vault_path.parent)
-
-                        # Use just the folder name
-                        vault_name = vault_path.name
-                        vault = Vault(vault_name, vault_uid=quality)
-                        experience = vault.read().experience
-
-                        # Change back
-                        os.chdir(original_dir)
-                        print("✅ Successfully loaded with directory change!")
-                    except Exception as e_inner:
-                        # Make sure we restore directory even on error
-                        os.chdir(original_dir)
-                        raise e_inner
-                else:
-                    raise Exception(f"Vault directory not found: {vault_dir}")
-
-            except Exception as e3:
-                print(f"Directory method failed: {str(e3)[:100]}...")
-
-                # METHOD 4: Manual loading attempt
-                print("\n❌ All automatic methods failed. Trying manual approach...")
-                return load_vault_manually(vault_path, quality)
+        print(f"Loading with {_PATH_STRATEGY} path strategy...")
+        experience = _read_experience(vault_path, quality)
+        print("✅ Successfully loaded vault!")
+
+    except Exception as e:
+        print(f"Loading failed: {str(e)[:100]}...")
+        print("\n❌ Automatic loading failed. Trying manual approach...")
+        return load_vault_manually(vault_path, quality)
 
     # If we got here, we successfully loaded the vault
     # Convert to numpy
-    data = jax.tree.map(lambda x: np.array(x), experience)
+    data = jax.tree.map(np.asarray, jax.device_get(experience))
 
     print("\n📊 Data structure:")
     for key in data.keys():
@@ -108,6 +94,9 @@ def convert_vault_to_json(vault_path, quality="Replay"):
         else:
             print(f"  {key}: {data[key].shape}")
 
+    if output_format == "npy":
+        return to_structured_array(data)
+
     # Create readable format
     readable_data = extract_readable_data(data)
 
@@ -126,14 +115,11 @@ def load_vault_manually(vault_path, quality):
     # Check if the directory exists
     if not vault_dir.exists():
         print(f"❌ Directory not found: {vault_dir}")
-        print(f"Available directories: {list(vault_path.iterdir())}")
+        with os.scandir(vault_path) as entries:
+            available = sorted(e.name for e in entries if e.is_dir(follow_symlinks=False))
+        print(f"Available directories: {available}")
         return None
 
-    # Try to read the manifest
-    manifest_file = vault_dir / "manifest.ocdbt"
-    if manifest_file.exists():
-        print(f"✅ Found manifest: {manifest_file}")
-
     # Since manual loading is complex, provide instructions
     print("\n📝 Manual loading instructions:")
     print("1. Navigate to the vault directory in terminal/cmd:")
@@ -148,16 +134,50 @@ def load_vault_manually(vault_path, quality):
     return None
 
 
+def _reward_stats_numpy(rewards, terminals, truncations):
+    """(sum, min, max, episode count) of (timesteps, agents) arrays"""
+    episode_ends = np.logical_or(terminals.any(axis=1), truncations.any(axis=1))
+    return (rewards.sum(dtype=np.float64), rewards.min(), rewards.max(),
+            int(episode_ends.sum()))
+
+
+if NUMBA_AVAILABLE:
+    @njit(parallel=True, cache=True)
+    def _reward_stats(rewards, terminals, truncations):
+        """Fused single pass over the arrays; same result as _reward_stats_numpy"""
+        n_timesteps, n_agents = rewards.shape
+        total = 0.0
+        lo = np.inf
+        hi = -np.inf
+        n_episodes = 0
+        for t in prange(n_timesteps):
+            ended = False
+            for a in range(n_agents):
+                r = float(rewards[t, a])
+                total += r
+                lo = min(lo, r)
+                hi = max(hi, r)
+                if terminals[t, a] != 0 or truncations[t, a] != 0:
+                    ended = True
+            if ended:
+                n_episodes += 1
+        return total, lo, hi, n_episodes
+else:
+    _reward_stats = _reward_stats_numpy
+
+
 def extract_readable_data(data):
     """
     Extract readable data from the loaded vault
     """
+    # Bind the batch-0 slices once
+    obs0, act0, rew0, term0, trunc0 = (
+        data[k][0] for k in ('observations', 'actions', 'rewards', 'terminals', 'truncations')
+    )
+
     # Get dimensions
-    batch_size = data['observations'].shape[0]
-    n_timesteps = data['observations'].shape[1]
-    n_agents = data['observations'].shape[2]
-    obs_dim = data['observations'].shape[3]
-    action_dim = data['actions'].shape[3]
+    n_timesteps, n_agents, obs_dim = obs0.shape
+    action_dim = act0.shape[2]
 
     print(f"\n📈 Dataset info:")
     print(f"  Timesteps: {n_timesteps}")
@@ -180,53 +200,73 @@ def extract_readable_data(data):
     # Extract first 100 timesteps
     max_steps = min(100, n_timesteps)
 
-    for t in range(max_steps):
-        timestep = {
+    # One bulk conversion per field instead of per-cell scalar boxing
+    obs_all = json_rows(obs0[:max_steps])
+    act_all = json_rows(act0[:max_steps])
+    rew_all = rew0[:max_steps].tolist()
+    term_all = term0[:max_steps].astype(bool).tolist()
+    trunc_all = trunc0[:max_steps].astype(bool).tolist()
+
+    readable_data["trajectories"] = [
+        {
             "timestep": t,
-            "agents": []
+            "agents": [
+                {
+                    "agent_id": agent_id,
+                    "observation": obs_all[t][agent_id],
+                    "action": act_all[t][agent_id],
+                    "reward": float(rew_all[t][agent_id]),
+                    "terminal": term_all[t][agent_id],
+                    "truncation": trunc_all[t][agent_id]
+                }
+                for agent_id in range(n_agents)
+            ]
         }
-
-        for agent_id in range(n_agents):
-            agent_data = {
-                "agent_id": agent_id,
-                "observation": data['observations'][0, t, agent_id].tolist(),
-                "action": data['actions'][0, t, agent_id].tolist(),
-                "reward": float(data['rewards'][0, t, agent_id]),
-                "terminal": bool(data['terminals'][0, t, agent_id]),
-                "truncation": bool(data['truncations'][0, t, agent_id])
-            }
-            timestep["agents"].append(agent_data)
-
-        # Add global state if available
-        if 'infos' in data and 'state' in data['infos']:
-            timestep["global_state"] = data['infos']['state'][0, t].tolist()
-
-        readable_data["trajectories"].append(timestep)
-
-    # Calculate statistics
-    all_rewards = data['rewards'][0].flatten()
+        for t in range(max_steps)
+    ]
+
+    # Add global state if available
+    if 'infos' in data and 'state' in data['infos']:
+        state_all = json_rows(data['infos']['state'][0, :max_steps])
+        for timestep, state in zip(readable_data["trajectories"], state_all):
+            timestep["global_state"] = state
+
+    # Calculate statistics and count episodes in one pass; the standard
+    # deviation is left to np.std, as sqrt(E[x^2] - mean^2) loses precision
+    total, lo, hi, n_episodes = _reward_stats(rew0, term0, trunc0)
+    mean = total / rew0.size
     readable_data["statistics"] = {
-        "total_reward": float(np.sum(all_rewards)),
-        "mean_reward": float(np.mean(all_rewards)),
-        "min_reward": float(np.min(all_rewards)),
-        "max_reward": float(np.max(all_rewards)),
-        "std_reward": float(np.std(all_rewards))
+        "total_reward": float(total),
+        "mean_reward": float(mean),
+        "min_reward": float(lo),
+        "max_reward": float(hi),
+        "std_reward": float(np.std(rew0, dtype=np.float64)),
+        "n_episodes": int(n_episodes)
     }
 
-    # Count episodes
-    episode_ends = np.logical_or(
-        data['terminals'][0].any(axis=1),
-        data['truncations'][0].any(axis=1)
-    )
-    readable_data["statistics"]["n_episodes"] = int(np.sum(episode_ends))
-
     return readable_data
 
 
-def save_json(data, output_path):
-    """Save data to JSON file"""
-    with open(output_path, 'w') as f:
-        json.dump(data, f, indent=2)
+def save_json(data, output_path, pretty=False):
+    """
+    Save data to JSON file (with orjson when installed)
+
+    By default writes newline-delimited JSON: a header line holding the
+    metadata and statistics, then one line per timestep. pretty=True writes
+    the whole structure as one indented document instead.
+    """
+    if pretty:
+        if orjson is not None:
+            with open(output_path, 'wb') as f:
+                f.write(orjson.dumps(data, option=orjson.OPT_INDENT_2 | orjson.OPT_SERIALIZE_NUMPY))
+        else:
+            with open(output_path, 'w') as f:
+                json.dump(data, f, indent=2)
+    else:
+        header = {key: value for key, value in data.items() if key != "trajectories"}
+        with open(output_path, 'wb') as f:
+            f.write(dumps_line(header))
+            f.writelines(dumps_line(step) for step in data["trajectories"])
 
     file_size = Path(output_path).stat().st_size / 1024
     print(f"\n✅ Saved to: {output_path} ({file_size:.1f} KB)")
@@ -253,7 +293,7 @@ import numpy as np
 
 vault = Vault('{vault_path.name}', vault_uid='{quality}')
 experience = vault.read().experience
-data = jax.tree.map(lambda x: np.array(x), experience)
+data = jax.tree.map(np.asarray, jax.device_get(experience))
 
 # Extract first 10 timesteps as sample
 sample = {{}}
@@ -286,49 +326,75 @@ pause
 
 # Main execution
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description='Convert an OG-MARL vault quality to NumPy or JSON (Windows-compatible)',
+        epilog='Example: python convert_vault_to_json.py vaults/og_marl/gymnasium_mamujoco/2halfcheetah.vlt Replay'
+    )
+    parser.add_argument('vault_path', help='Path to .vlt directory')
+    parser.add_argument('quality', nargs='?', default='Replay', help='Quality to convert (default: Replay)')
+    parser.add_argument('--format', choices=['npy', 'jsonl-preview'], default='npy',
+                        help='npy: every timestep as a NumPy structured array (default); '
+                             'jsonl-preview: first 100 timesteps as JSON')
+    parser.add_argument('--pretty', action='store_true',
+                        help='jsonl-preview only: write one indented JSON document instead of JSONL')
+    args = parser.parse_args()
+
     print("🔄 OG-MARL Vault to JSON Converter (Windows Edition)")
     print("=" * 50)
 
-    if len(sys.argv) > 1:
-        vault_path = sys.argv[1]
-        quality = sys.argv[2] if len(sys.argv) > 2 else "Replay"
-
-        # Try to convert
-        json_data = convert_vault_to_json(vault_path, quality)
-
-        if json_data:
-            # Save the data
-            output_path = Path(vault_path).stem + "_readable.json"
-            save_json(json_data, output_path)
-
-            print(f"\n📊 Summary:")
-            print(f"   Agents: {json_data['metadata']['n_agents']}")
-            print(f"   Timesteps: {json_data['metadata']['n_timesteps']}")
-            print(f"   Total reward: {json_data['statistics']['total_reward']:.2f}")
-            print(f"   Episodes: {json_data['statistics']['n_episodes']}")
-        else:
-            print("\n🔧 Alternative approach:")
-            print("Since automatic loading failed, try this workaround:")
-
-            # Create batch file for Windows
-            if sys.platform == "win32":
-                batch_file = windows_vault_workaround(vault_path, quality)
-                print(f"\n1. Run the batch file: {batch_file}")
-                print("2. Or use the Python script approach below")
-
-            print("\n📝 Python script approach:")
-            print(f"1. Open command prompt/terminal")
-            print(f"2. Navigate to: {Path(vault_path).parent}")
-            print(f"3. Run this Python code:")
-            print("-" * 40)
-            print(f"""
+    vault_path = args.vault_path
+    quality = args.quality
+    output_format = args.format
+    pretty = args.pretty
+
+    # Try to convert
+    json_data = convert_vault_to_json(vault_path, quality, output_format=output_format)
+
+    if json_data is not None and output_format == "npy":
+        # Full-precision export of every timestep
+        output_path = Path(vault_path).stem + "_trajectories.npy"
+        np.save(output_path, json_data)
+
+        file_size = Path(output_path).stat().st_size / (1024 * 1024)
+        print(f"\n✅ Saved to: {output_path} ({file_size:.1f} MB)")
+        print(f"\n📊 Summary:")
+        print(f"   Agents: {json_data['observations'].shape[1]}")
+        print(f"   Timesteps: {len(json_data)}")
+        print(f"   Total reward: {json_data['rewards'].sum():.2f}")
+        print(f"   Load with: np.load('{output_path}', mmap_mode='r')")
+    elif json_data is not None:
+        # Save the data
+        output_path = Path(vault_path).stem + ("_readable.json" if pretty else "_readable.jsonl")
+        save_json(json_data, output_path, pretty=pretty)
+
+        print(f"\n📊 Summary:")
+        print(f"   Agents: {json_data['metadata']['n_agents']}")
+        print(f"   Timesteps: {json_data['metadata']['n_timesteps']}")
+        print(f"   Total reward: {json_data['statistics']['total_reward']:.2f}")
+        print(f"   Episodes: {json_data['statistics']['n_episodes']}")
+    else:
+        print("\n🔧 Alternative approach:")
+        print("Since automatic loading failed, try this workaround:")
+
+        # Create batch file for Windows
+        if sys.platform == "win32":
+            batch_file = windows_vault_workaround(vault_path, quality)
+            print(f"\n1. Run the batch file: {batch_file}")
+            print("2. Or use the Python script approach below")
+
+        print("\n📝 Python script approach:")
+        print(f"1. Open command prompt/terminal")
+        print(f"2. Navigate to: {Path(vault_path).parent}")
+        print(f"3. Run this Python code:")
+        print("-" * 40)
+        print(f"""
 from flashbax.vault import Vault
 import jax, json, numpy as np
 
 # Load vault
 vault = Vault('{Path(vault_path).name}', vault_uid='{quality}')
 experience = vault.read().experience
-data = jax.tree.map(lambda x: np.array(x), experience)
+data = jax.tree.map(np.asarray, jax.device_get(experience))
 
 # Convert to JSON (first 100 timesteps)
 output = {{"metadata": {{}}, "trajectories": []}}
@@ -347,7 +413,4 @@ with open('output.json', 'w') as f:
 
 print("Saved to output.json")
 """)
-            print("-" * 40)
-    else:
-        print("Usage: python script.py <vault_path> [quality]")
-        print("Example: python script.py vaults/og_marl/gymnasium_mamujoco/2halfcheetah.vlt Replay")
+        print("-" * 40)
@@ -0,0 +1,521 @@
+"""
+Vault helpers shared by the converter scripts: quality discovery,
+metadata.json parsing, page-cache hints, lazy vault fields and the
+writers/loaders/encoders used by more than one output format
+"""
+
+import os
+import re
+import glob
+import json
+import struct
+import zipfile
+import functools
+import numpy as np
+from pathlib import Path
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Shape strings in metadata.json look like "(1, 50000, 20, 238)" or, for
+# discrete actions, "(1, 50000, 20)"
+_SHAPE_RE = re.compile(r'\(1,\s*(\d+),\s*(\d+)(?:,\s*(\d+))?\)')
+
+
+def discover_qualities(vault_dir):
+    """
+    Find the quality directories (those holding a metadata.json) of a vault
+
+    Args:
+        vault_dir: Path to .vlt directory
+
+    Returns:
+        Sorted list of quality names
+    """
+    # One glob instead of an is_dir() + exists() stat pair per child
+    pattern = os.path.join(glob.escape(str(vault_dir)), '*', 'metadata.json')
+    return sorted(os.path.basename(os.path.dirname(m)) for m in glob.glob(pattern))
+
+
+@functools.lru_cache(maxsize=None)
+def _load_metadata(path, mtime_ns):
+    with open(path, 'r') as f:
+        return json.load(f)
+
+
+def load_metadata(quality_dir):
+    """
+    Parse a quality's metadata.json, cached until the file changes
+
+    The returned dict is shared between callers; do not modify it.
+
+    Args:
+        quality_dir: Path to the quality directory inside the .vlt
+    """
+    path = os.path.join(str(quality_dir), 'metadata.json')
+    return _load_metadata(path, os.stat(path).st_mtime_ns)
+
+
+def parse_shapes(metadata):
+    """
+    Read dataset dimensions from a parsed metadata.json
+
+    Args:
+        metadata: Dict returned by load_metadata()
+
+    Returns:
+        (total_timesteps, n_agents, obs_dim, act_dim), with act_dim 1 for
+        discrete actions, or None if the observation shape is not recognized
+    """
+    shapes = metadata.get('structure_shape', {})
+
+    match = _SHAPE_RE.search(shapes.get('observations', ''))
+    if not match or match.group(3) is None:
+        return None
+    total_timesteps, n_agents, obs_dim = map(int, match.groups())
+
+    act_match = _SHAPE_RE.search(shapes.get('actions', ''))
+    act_dim = int(act_match.group(3)) if act_match and act_match.group(3) else 1
+
+    return total_timesteps, n_agents, obs_dim, act_dim
+
+
+def _iter_files(path):
+    """Yield the regular files at path (the path itself, or the files of a directory tree)"""
+    if not os.path.isdir(path):
+        yield path
+        return
+    with os.scandir(path) as entries:
+        for entry in entries:
+            if entry.is_dir(follow_symlinks=False):
+                yield from _iter_files(entry.path)
+            elif entry.is_file(follow_symlinks=False):
+                yield entry.path
+
+
+def _fadvise(path, advice, sync=False):
+    """Apply posix_fadvise to every file under path (no-op where unsupported)"""
+    if not hasattr(os, 'posix_fadvise'):
+        return
+    for file_path in _iter_files(str(path)):
+        try:
+            fd = os.open(file_path, os.O_RDONLY)
+        except OSError:
+            continue
+        try:
+            if sync:
+                os.fsync(fd)
+            os.posix_fadvise(fd, 0, 0, advice)
+        except OSError:
+            pass
+        finally:
+            os.close(fd)
+
+
+def drop_from_page_cache(path):
+    """
+    Flush a freshly written output file (or directory) and evict it from the page cache
+
+    Conversion output is rarely re-read right away, so keeping it cached
+    only pushes the rest of the system's working set out.
+
+    Args:
+        path: Output file or directory
+    """
+    if hasattr(os, 'POSIX_FADV_DONTNEED'):
+        _fadvise(path, os.POSIX_FADV_DONTNEED, sync=True)
+
+
+def json_rows(array):
+    """
+    A field's rows in the form the JSON encoder takes
+
+    orjson serializes NumPy arrays natively; the stdlib json needs nested
+    lists, made with one bulk .tolist() instead of one per row.
+    """
+    array = np.ascontiguousarray(array)
+    return array if orjson is not None else array.tolist()
+
+
+def dumps_line(obj):
+    """Encode one compact JSON line (with orjson when installed)"""
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_SERIALIZE_NUMPY) + b"\n"
+    return (json.dumps(obj, separators=(',', ':')) + "\n").encode()
+
+
+def to_structured_array(data):
+    """
+    Pack batch 0 of a read vault into a NumPy structured array, one record per timestep
+
+    Keeps the source dtypes (no precision loss) and can be saved with np.save
+    and loaded back with np.load(..., mmap_mode='r')
+
+    Args:
+        data: Vault experience as NumPy arrays of shape (1, timesteps, ...)
+    """
+    fields = [(k, data[k]) for k in ('observations', 'actions', 'rewards', 'terminals', 'truncations')]
+    if 'infos' in data and 'state' in data['infos']:
+        fields.append(('state', data['infos']['state']))
+
+    dtype = np.dtype([(name, array.dtype, array.shape[2:]) for name, array in fields])
+    records = np.empty(fields[0][1].shape[1], dtype=dtype)
+    for name, array in fields:
+        records[name] = array[0]
+    return records
+
+
+def reduce_precision(actions: np.ndarray, precision: str):
+    """
+    Reduce (timesteps, agents, ...) actions to the requested export precision
+
+    'half' rounds them through float16 and then to 4 decimals, so they are
+    written with a few digits instead of a full float repr. 'int8' quantizes
+    each agent's actions to int8 with a per-agent scale: actions are
+    recovered as quantized * scale[agent].
+
+    Returns:
+        (actions, scale): scale is the per-agent list of floats for 'int8',
+        otherwise None
+    """
+    if precision == 'half':
+        return np.round(actions.astype(np.float16).astype(np.float64), 4), None
+    if precision == 'int8':
+        other_axes = tuple(axis for axis in range(actions.ndim) if axis != 1)
+        max_abs = np.abs(actions).max(axis=other_axes, initial=0)
+        scale = np.where(max_abs > 0, max_abs / 127, 1.0)
+        agent_shape = (1, actions.shape[1]) + (1,) * (actions.ndim - 2)
+        quantized = np.rint(actions / scale.reshape(agent_shape)).astype(np.int8)
+        return quantized, scale.tolist()
+    return actions, None
+
+
+# Fields narrowed by --dtype; rewards stay float32 (small, numerically sensitive)
+QUANTIZED_FIELDS = ('observations', 'actions')
+
+# Default timesteps read from the vault at a time
+SLAB_TIMESTEPS = 8192
+
+
+class VaultField:
+    """
+    Batch 0 of one vault leaf, read `chunk_size` timesteps at a time
+
+    Stands in for the (timesteps, ...) NumPy array so writers can stream the
+    field to disk without the whole vault ever being held in memory.
+    `source` is either the leaf's tensorstore (each slab is read straight
+    from disk) or an already-read (1, timesteps, ...) array (each slab is
+    converted to NumPy on its own). With agent_major=True the field stands
+    in for the (agents, timesteps, ...) transpose.
+    """
+
+    def __init__(self, source, n_timesteps, chunk_size=SLAB_TIMESTEPS, transform=None, dtype=None,
+                 agent_major=False):
+        self.source = source
+        self.n_timesteps = n_timesteps
+        self.chunk_size = chunk_size
+        self.agent_major = agent_major
+        trailing = tuple(source.shape[2:])
+        if agent_major:
+            self.shape = (trailing[0], n_timesteps, *trailing[1:])
+        else:
+            self.shape = (n_timesteps, *trailing)
+        self.ndim = len(self.shape)
+        self.dtype = np.dtype(dtype or getattr(source.dtype, 'numpy_dtype', source.dtype))
+        self.transform = transform
+
+    def read(self, start, stop):
+        """Read timesteps [start, stop) as a (time-major) NumPy array"""
+        slab = self.source[0, start:min(stop, self.n_timesteps)]
+        slab = slab.read().result() if hasattr(slab, 'read') else np.asarray(slab)
+        return slab if self.transform is None else self.transform(slab)
+
+    def iter_slabs(self):
+        """Yield the field in memory order (for agent-major, one pass over the vault per agent)"""
+        for agent in range(self.shape[0]) if self.agent_major else [None]:
+            for start in range(0, self.n_timesteps, self.chunk_size):
+                slab = self.read(start, start + self.chunk_size)
+                yield slab if agent is None else slab[:, agent]
+
+    def iter_blocks(self):
+        """Yield (index, block) pairs covering the field in a single pass over the vault"""
+        for start in range(0, self.n_timesteps, self.chunk_size):
+            slab = self.read(start, start + self.chunk_size)
+            rows = slice(start, start + len(slab))
+            if self.agent_major:
+                yield (slice(None), rows), slab.swapaxes(0, 1)
+            else:
+                yield (rows,), slab
+
+    def map(self, fn, dtype):
+        """Lazily apply fn to every slab read from this field"""
+        inner = self.transform
+        transform = fn if inner is None else (lambda slab: fn(inner(slab)))
+        return VaultField(self.source, self.n_timesteps, self.chunk_size, transform, dtype,
+                          self.agent_major)
+
+    def to_agent_major(self):
+        """Lazy (agents, timesteps, ...) view of this field"""
+        return VaultField(self.source, self.n_timesteps, self.chunk_size, self.transform,
+                          self.dtype, agent_major=True)
+
+
+def available_memory():
+    """Bytes of memory available to new allocations, or None if unknown"""
+    try:
+        import psutil
+        return psutil.virtual_memory().available
+    except ImportError:
+        pass
+    try:
+        with open('/proc/meminfo', 'r') as f:
+            for line in f:
+                if line.startswith('MemAvailable:'):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return None
+
+
+def open_vault_fields(vault, chunk_size=SLAB_TIMESTEPS, full_read_bytes=None):
+    """
+    Open every vault leaf lazily as a VaultField (batch dimension removed)
+
+    Reads go straight to the per-leaf tensorstores when this flashbax
+    version exposes them; otherwise the vault is read once and converted
+    to NumPy a slab at a time.
+
+    Args:
+        vault: flashbax Vault
+        chunk_size: Timesteps per slab
+        full_read_bytes: Estimated size of a full vault.read(); if the
+            fallback needs one and it exceeds available memory, raise
+            MemoryError up front instead of being OOM-killed mid-read
+    """
+    import jax
+
+    datastores = getattr(vault, '_all_datastores', None)
+    if datastores is not None:
+        return jax.tree.map(
+            lambda store: VaultField(store, vault.vault_index, chunk_size), datastores)
+
+    available = available_memory()
+    if full_read_bytes and available is not None and full_read_bytes > available:
+        raise MemoryError(
+            f"this flashbax version must read the whole vault (~{full_read_bytes / 1e9:.1f} GB) "
+            f"but only {available / 1e9:.1f} GB is available")
+
+    experience = vault.read().experience
+    return jax.tree.map(lambda x: VaultField(x, x.shape[1], chunk_size), experience)
+
+
+def to_bfloat16_bits(x):
+    """Round float32 values to bfloat16, returned as raw uint16 bits (NumPy has no bf16)"""
+    bits = np.ascontiguousarray(x, dtype=np.float32).view(np.uint32)
+    # Round to nearest even on the 16 dropped mantissa bits
+    rounded = ((bits + (((bits >> 16) & 1) + 0x7FFF)) >> 16).astype(np.uint16)
+    return np.where(np.isnan(x), np.uint16(0x7FC0), rounded)
+
+
+def from_bfloat16_bits(bits):
+    """Expand raw bfloat16 uint16 bits back to float32"""
+    return (bits.astype(np.uint32) << 16).view(np.float32)
+
+
+def dequantize_arrays(data):
+    """
+    Restore float32 observations/actions from a file saved with --dtype
+
+    Handles fp16, bf16 (uint16 bits) and int8, either symmetric (a
+    '<field>_scale' array) or affine (plus '<field>_zero_point').
+
+    Args:
+        data: Loaded arrays (np.load, load_zstd_npz, load_compressed_tar or
+            load_hdf5 result)
+
+    Returns:
+        Dict of arrays with quantized fields expanded back to float32
+    """
+    arrays = {key: data[key] for key in data}
+    storage_dtype = str(arrays.get('storage_dtype', 'keep'))
+    agent_major = str(arrays.get('axis_order', 'tax')) == 'axt'
+
+    for field in QUANTIZED_FIELDS:
+        if storage_dtype == 'fp16' and arrays[field].dtype == np.float16:
+            arrays[field] = arrays[field].astype(np.float32)
+        elif storage_dtype == 'bf16' and arrays[field].dtype == np.uint16:
+            arrays[field] = from_bfloat16_bits(arrays[field])
+        elif storage_dtype == 'int8' and f'{field}_scale' in arrays:
+            scale = np.asarray(arrays.pop(f'{field}_scale'), dtype=np.float32)
+            zero_point = np.asarray(arrays.pop(f'{field}_zero_point', np.zeros_like(scale)),
+                                    dtype=np.float32)
+            if agent_major:
+                # Per agent/feature parameters, broadcast over the time axis
+                scale, zero_point = np.expand_dims(scale, 1), np.expand_dims(zero_point, 1)
+            arrays[field] = (arrays[field].astype(np.float32) - zero_point) * scale
+
+    return arrays
+
+
+def write_npy_stream(f, value):
+    """Write a field as .npy to a writable stream, slab by slab for a VaultField"""
+    if not isinstance(value, VaultField):
+        np.lib.format.write_array(f, np.asanyarray(value), allow_pickle=False)
+        return
+
+    np.lib.format.write_array_header_2_0(f, {
+        'descr': np.lib.format.dtype_to_descr(value.dtype),
+        'fortran_order': False,
+        'shape': value.shape,
+    })
+    for slab in value.iter_slabs():
+        f.write(memoryview(np.ascontiguousarray(slab)).cast('B'))
+
+
+def save_npz_streaming(path, arrays, compressed=True):
+    """
+    Write arrays to an .npz one member at a time
+
+    Produces the same file as np.savez_compressed (or np.savez when
+    compressed=False), but consumes an iterator and streams VaultFields slab
+    by slab, so no field is ever materialized.
+
+    Args:
+        path: Output .npz file
+        arrays: Iterable of (name, array) pairs
+        compressed: DEFLATE the members
+    """
+    compression = zipfile.ZIP_DEFLATED if compressed else zipfile.ZIP_STORED
+    with zipfile.ZipFile(path, mode='w', compression=compression, allowZip64=True) as zf:
+        for name, value in arrays:
+            with zf.open(f"{name}.npy", mode='w', force_zip64=True) as f:
+                write_npy_stream(f, value)
+            del value
+
+
+# Alignment of the .npy data payloads written by save_npy_aligned (one page)
+NPY_ALIGN = 4096
+
+
+def save_npy_aligned(path, array, align=NPY_ALIGN):
+    """
+    Save an array as .npy with its data payload starting on a page boundary
+
+    The (version 2.0) header is padded with spaces so the raw bytes begin at
+    a multiple of `align`, which lets mmap/direct-I/O loaders read them
+    without an extra copy. Readable with plain np.load.
+
+    Args:
+        path: Output .npy file
+        array: Array to save
+        align: Payload alignment in bytes
+    """
+    if not isinstance(array, VaultField):
+        array = np.asanyarray(array)
+    header = "{'descr': %r, 'fortran_order': False, 'shape': %r, }" % (
+        np.lib.format.dtype_to_descr(array.dtype), array.shape
+    )
+    # magic (8 bytes) + header length (4 bytes) + header + trailing newline
+    pad = -(12 + len(header) + 1) % align
+    header = (header + ' ' * pad + '\n').encode('latin1')
+
+    with open(path, 'w+b') as f:
+        f.write(b'\x93NUMPY\x02\x00')
+        f.write(struct.pack('<I', len(header)))
+        f.write(header)
+        if not getattr(array, 'agent_major', False):
+            for slab in array.iter_slabs() if isinstance(array, VaultField) else (array,):
+                np.ascontiguousarray(slab).tofile(f)
+            return
+
+        # Agent-major: place each time slab in one pass through a memory map
+        offset = f.tell()
+        f.truncate(offset + int(np.prod(array.shape)) * array.dtype.itemsize)
+        out = np.memmap(f, dtype=array.dtype, mode='r+', offset=offset, shape=array.shape)
+        for index, block in array.iter_blocks():
+            out[index] = block
+        out.flush()
+        del out
+
+
+def save_npy_dir(path, arrays):
+    """
+    Save each array as a page-aligned .npy file in a directory
+
+    Scalars are collected into metadata.json next to the arrays. Load the
+    result back with load_npy_dir().
+
+    Args:
+        path: Output directory
+        arrays: Iterable of (name, array) pairs
+    """
+    path = Path(path)
+    path.mkdir(parents=True, exist_ok=True)
+    metadata = {}
+
+    for name, value in arrays:
+        if not isinstance(value, VaultField):
+            value = np.asanyarray(value)
+        if value.ndim == 0:
+            metadata[name] = value.tolist()
+        else:
+            save_npy_aligned(path / f"{name}.npy", value)
+        del value
+
+    with open(path / 'metadata.json', 'w') as f:
+        json.dump(metadata, f, indent=2)
+
+
+def load_npy_dir(path, mmap_mode='r'):
+    """
+    Load arrays written by save_npy_dir(), memory-mapped by default
+
+    Args:
+        path: Directory written by save_npy_dir()
+        mmap_mode: Passed to np.load (None to read into memory)
+
+    Returns:
+        Dict mapping array name to np.ndarray (metadata included)
+    """
+    path = Path(path)
+    arrays = {f.stem: np.load(f, mmap_mode=mmap_mode) for f in sorted(path.glob('*.npy'))}
+
+    with open(path / 'metadata.json', 'r') as f:
+        for name, value in json.load(f).items():
+            arrays[name] = np.asarray(value)
+
+    return arrays
+
+
+def load_hdf5(path, quality=None):
+    """
+    Load arrays written by save_hdf5() or one quality written by save_hdf5_group()
+
+    Args:
+        path: .h5 file
+        quality: Group (quality) name, or None for a file with the arrays at the root
+
+    Returns:
+        Dict mapping array name to np.ndarray (root and group attributes included)
+    """
+    import h5py
+
+    with h5py.File(path, 'r') as f:
+        group = f if quality is None else f[quality]
+        arrays = {name: group[name][()] for name in group}
+        for name, value in (*f.attrs.items(), *group.attrs.items()):
+            arrays[name] = np.asarray(value)
+
+    return arrays
+
+
+def to_arrow_column(array):
+    """Wrap a (rows, ...) array as a nested FixedSizeList Arrow column without copying"""
+    import pyarrow as pa
+
+    column = pa.array(np.ascontiguousarray(array).reshape(-1))
+    for size in reversed(array.shape[1:]):
+        column = pa.FixedSizeListArray.from_arrays(column, size)
+    return column
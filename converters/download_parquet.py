@@ -7,6 +7,8 @@ No vault conversion needed - works with pandas directly
 import sys
 from pathlib import Path
 
+ROW_GROUP_SIZE = 10000
+
 def list_available_data():
     """List what's available in the Parquet dataset"""
     try:
@@ -70,7 +72,8 @@ def download_scenario(scenario_name, output_dir, max_rows=None):
     """
     try:
         from datasets import load_dataset
-        import pandas as pd
+        import pyarrow as pa
+        import pyarrow.parquet as pq
     except ImportError:
         print("Error: Install dependencies:")
         print("  pip install datasets pyarrow pandas")
@@ -86,39 +89,40 @@ def download_scenario(scenario_name, output_dir, max_rows=None):
     print()
 
     try:
-        # Load dataset
-        dataset = load_dataset(
-            "InstaDeepAI/og-marl",
-            split="train",
-            streaming=max_rows is not None  # Stream if limiting rows
-        )
-
         if max_rows:
-            # Take first N rows
-            rows = []
-            for i, item in enumerate(dataset):
-                if i >= max_rows:
+            # Stream Arrow record batches and keep only the first N rows
+            dataset = load_dataset(
+                "InstaDeepAI/og-marl",
+                split="train",
+                streaming=True
+            ).with_format("arrow")
+
+            batches = []
+            n_rows = 0
+            for batch in dataset.iter(batch_size=min(max_rows, ROW_GROUP_SIZE)):
+                batch = batch.slice(0, max_rows - n_rows)
+                batches.append(batch)
+                n_rows += len(batch)
+                print(f"  Downloaded {n_rows:,} rows...")
+                if n_rows >= max_rows:
                     break
-                rows.append(item)
-                if (i + 1) % 100 == 0:
-                    print(f"  Downloaded {i+1:,} rows...")
 
-            # Convert to DataFrame
-            df = pd.DataFrame(rows)
+            table = pa.concat_tables(batches)
         else:
-            # Download all
+            # Download all; the Arrow table is memory-mapped from the HF cache
             print("  Downloading full dataset...")
-            dataset_dict = load_dataset("InstaDeepAI/og-marl", split="train")
-            df = dataset_dict.to_pandas()
+            dataset = load_dataset("InstaDeepAI/og-marl", split="train")
+            table = dataset.data.table
 
         # Save as parquet (compressed)
         output_file = output_path / f"{scenario_name}.parquet"
-        df.to_parquet(output_file, compression='snappy')
+        pq.write_table(table, output_file, compression='zstd', compression_level=3,
+                       row_group_size=ROW_GROUP_SIZE)
 
         size_mb = output_file.stat().st_size / (1024 * 1024)
         print(f"\n✓ Saved: {output_file.name} ({size_mb:.1f} MB)")
-        print(f"  Rows: {len(df):,}")
-        print(f"  Columns: {list(df.columns)}")
+        print(f"  Rows: {table.num_rows:,}")
+        print(f"  Columns: {table.column_names}")
 
         print("\nTo load:")
         print(f"  import pandas as pd")
@@ -10,15 +10,74 @@ import json
 import numpy as np
 from pathlib import Path
 
-def convert_vault_to_json(vault_path, output_dir, quality=None, max_timesteps=10000):
+from _vault_common import discover_qualities, dumps_line, json_rows, to_arrow_column
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def _iter_steps(fields):
+    """Yield one {'t', 'obs', 'act', 'rew'[, 'state']} dict per timestep"""
+    names = list(fields)
+    rows = [json_rows(fields[name]) for name in names]
+    for t, values in enumerate(zip(*rows)):
+        step = {'t': t}
+        step.update(zip(names, values))
+        yield step
+
+
+def save_ndjson(path, metadata, fields):
+    """
+    Stream fields as NDJSON: a metadata header line, then one line per timestep
+
+    Args:
+        path: Output .ndjson file
+        metadata: Dict written as the first line
+        fields: Dict mapping step key to a (timesteps, ...) array
+    """
+    # Lines for wide observations run to tens of KB; a large buffer turns
+    # them into a few big writes instead of one syscall per line
+    with open(path, 'wb', buffering=4 << 20) as f:
+        f.write(dumps_line({'metadata': metadata}))
+        f.writelines(dumps_line(step) for step in _iter_steps(fields))
+
+
+def save_parquet(path, metadata, fields):
+    """
+    Save fields as a Zstandard-compressed Parquet file, one row per timestep
+
+    Args:
+        path: Output .parquet file
+        metadata: Dict stored as JSON under the 'og_marl' schema metadata key
+        fields: Dict mapping column name to a (timesteps, ...) array
+    """
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        print("Error: Parquet output needs pyarrow. Install with:")
+        print("  pip install pyarrow")
+        sys.exit(1)
+
+    table = pa.table({name: to_arrow_column(array) for name, array in fields.items()})
+    table = table.replace_schema_metadata({'og_marl': json.dumps(metadata)})
+    pq.write_table(table, path, compression='zstd')
+
+
+def convert_vault_to_json(vault_path, output_dir, quality=None, max_timesteps=10000,
+                          output_format='json'):
     """
     Convert vault to JSON format
 
     Args:
         vault_path: Path to .vlt directory
-        output_dir: Output directory for .json files
+        output_dir: Output directory
         quality: Specific quality to convert (None = auto-detect first)
         max_timesteps: Maximum timesteps to export (to keep file size reasonable)
+        output_format: 'json' (one indented document), 'ndjson' (streamed,
+            one line per timestep) or 'parquet' (columnar, zstd)
     """
 
     try:
@@ -45,10 +104,7 @@ def convert_vault_to_json(vault_path, output_dir, quality=None, max_timesteps=10
     print()
 
     # Find available qualities
-    available_qualities = []
-    for item in vault_dir.iterdir():
-        if item.is_dir() and (item / 'metadata.json').exists():
-            available_qualities.append(item.name)
+    available_qualities = discover_qualities(vault_dir)
 
     if not available_qualities:
         print("Error: No quality directories found in vault!")
@@ -72,13 +128,12 @@ def convert_vault_to_json(vault_path, output_dir, quality=None, max_timesteps=10
         print(f"  Loading vault data...")
         vault = Vault(str(vault_dir), vault_uid=quality_to_convert)
         experience = vault.read().experience
-        data = jax.tree.map(lambda x: np.array(x), experience)
 
         # Extract metadata
-        n_timesteps_total = data['observations'].shape[1]
-        n_agents = data['observations'].shape[2]
-        obs_dim = data['observations'].shape[-1]
-        act_dim = data['actions'].shape[-1]
+        n_timesteps_total = experience['observations'].shape[1]
+        n_agents = experience['observations'].shape[2]
+        obs_dim = experience['observations'].shape[-1]
+        act_dim = experience['actions'].shape[-1]
 
         print(f"  Total timesteps: {n_timesteps_total:,}")
         print(f"  Agents: {n_agents}")
@@ -91,48 +146,49 @@ def convert_vault_to_json(vault_path, output_dir, quality=None, max_timesteps=10
         else:
             print(f"  Exporting all {n_timesteps:,} timesteps")
 
-        # Build trajectories
-        print(f"  Building trajectory data...")
-        trajectories = []
+        # Bring only the exported window to the host; np.asarray shares the
+        # buffer of CPU-backed arrays instead of copying it
+        data = jax.tree.map(lambda x: np.asarray(x[:, :n_timesteps]), experience)
 
-        for t in range(n_timesteps):
-            step = {
-                't': t,
-                'obs': data['observations'][0, t].tolist(),
-                'act': data['actions'][0, t].tolist(),
-                'rew': data['rewards'][0, t].tolist()
-            }
+        fields = {
+            'obs': data['observations'][0, :n_timesteps],
+            'act': data['actions'][0, :n_timesteps],
+            'rew': data['rewards'][0, :n_timesteps],
+        }
 
-            # Add state if available
-            if 'infos' in data and 'state' in data['infos']:
-                step['state'] = data['infos']['state'][0, t].tolist()
-
-            trajectories.append(step)
-
-            # Progress indicator
-            if (t + 1) % 1000 == 0:
-                print(f"    Progress: {t+1:,}/{n_timesteps:,}")
-
-        # Create output structure
-        output_data = {
-            'metadata': {
-                'scenario': scenario_name,
-                'quality': quality_to_convert,
-                'n_agents': int(n_agents),
-                'n_timesteps': int(n_timesteps),
-                'n_timesteps_total': int(n_timesteps_total),
-                'obs_dim': int(obs_dim),
-                'act_dim': int(act_dim)
-            },
-            'trajectories': trajectories
+        # Add state if available
+        if 'infos' in data and 'state' in data['infos']:
+            fields['state'] = data['infos']['state'][0, :n_timesteps]
+
+        metadata = {
+            'scenario': scenario_name,
+            'quality': quality_to_convert,
+            'n_agents': int(n_agents),
+            'n_timesteps': int(n_timesteps),
+            'n_timesteps_total': int(n_timesteps_total),
+            'obs_dim': int(obs_dim),
+            'act_dim': int(act_dim)
         }
 
-        # Save JSON
-        output_file = output_path / f"{scenario_name}_{quality_to_convert}.json"
+        output_file = output_path / f"{scenario_name}_{quality_to_convert}.{output_format}"
         print(f"  Saving to {output_file.name}...")
 
-        with open(output_file, 'w') as f:
-            json.dump(output_data, f, indent=2)
+        if output_format == 'ndjson':
+            save_ndjson(output_file, metadata, fields)
+        elif output_format == 'parquet':
+            save_parquet(output_file, metadata, fields)
+        else:
+            output_data = {
+                'metadata': metadata,
+                'trajectories': list(_iter_steps(fields))
+            }
+
+            if orjson is not None:
+                with open(output_file, 'wb') as f:
+                    f.write(orjson.dumps(output_data, option=orjson.OPT_INDENT_2 | orjson.OPT_SERIALIZE_NUMPY))
+            else:
+                with open(output_file, 'w') as f:
+                    json.dump(output_data, f, indent=2)
 
         size_mb = output_file.stat().st_size / (1024 * 1024)
         print(f"  ✓ Saved: {output_file.name} ({size_mb:.1f} MB)")
@@ -163,6 +219,10 @@ Examples:
 
   # Convert first 1k timesteps for quick testing
   python vault_to_json.py data/2halfcheetah.vlt outputs/converted/ --max-timesteps 1000
+
+  # Stream 100k timesteps as NDJSON, or write them as Parquet
+  python vault_to_json.py data/2halfcheetah.vlt outputs/converted/ --max-timesteps 100000 --format ndjson
+  python vault_to_json.py data/2halfcheetah.vlt outputs/converted/ --max-timesteps 100000 --format parquet
         """
     )
 
@@ -171,6 +231,9 @@ Examples:
     parser.add_argument('--quality', help='Specific quality to convert')
     parser.add_argument('--max-timesteps', type=int, default=10000,
                        help='Maximum timesteps to export (default: 10000)')
+    parser.add_argument('--format', choices=['json', 'ndjson', 'parquet'], default='json',
+                       help='json: one indented document (default); ndjson: one line per '
+                            'timestep, streamed; parquet: zstd-compressed columns')
 
     args = parser.parse_args()
 
@@ -178,5 +241,6 @@ Examples:
         args.vault_path,
         args.output_dir,
         quality=args.quality,
-        max_timesteps=args.max_timesteps
+        max_timesteps=args.max_timesteps,
+        output_format=args.format
     )
@@ -4,12 +4,530 @@ Convert OG-MARL vault to compressed NumPy format (.npz)
 Efficient storage for full datasets
 """
 
+import os
+import json
 import sys
+import mmap
+import errno
 import argparse
+import tarfile
+import tempfile
 import numpy as np
 from pathlib import Path
 
-def convert_vault_to_npz(vault_path, output_dir, quality=None, all_qualities=False):
+from _vault_common import (QUANTIZED_FIELDS, VaultField, discover_qualities, drop_from_page_cache,
+                           open_vault_fields, save_npy_dir, save_npz_streaming, to_arrow_column,
+                           to_bfloat16_bits, write_npy_stream)
+# Loaders for the converted files, re-exported so they can be imported from here (see README)
+from _vault_common import dequantize_arrays, load_hdf5, load_npy_dir  # noqa: F401
+
+DIRECT_IO_ALIGN = 4096
+DIRECT_IO_CHUNK = 16 * 1024 * 1024
+# Chunks in flight at once, which also bounds the writer's memory
+DIRECT_IO_QUEUE_DEPTH = 4
+
+
+class DirectFileWriter:
+    """
+    Writable binary stream that writes to disk with O_DIRECT, bypassing the page cache
+
+    Writes are staged in 16 MiB page-aligned buffers; each full buffer is
+    pwritten from a thread pool while the next one fills, so a few requests
+    stay in flight and the SSD queue stays busy, but memory is bounded by
+    the queue depth rather than the file size. The padded tail is truncated
+    away on close. Falls back to a normal buffered file where O_DIRECT is
+    unavailable (Windows/macOS) or rejected by the filesystem (e.g. tmpfs).
+
+    Args:
+        path: Output file
+    """
+
+    def __init__(self, path):
+        self._file = None
+        self._fd = None
+        o_direct = getattr(os, 'O_DIRECT', 0)
+        if o_direct:
+            try:
+                self._fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC | o_direct, 0o644)
+            except OSError as e:
+                if e.errno != errno.EINVAL:
+                    raise
+        if self._fd is None:
+            self._file = open(path, 'wb')
+            return
+
+        from collections import deque
+        from concurrent.futures import ThreadPoolExecutor
+
+        # os.pwrite releases the GIL, so threads give real I/O parallelism
+        self._pool = ThreadPoolExecutor(max_workers=DIRECT_IO_QUEUE_DEPTH)
+        self._pending = deque()
+        self._offset = 0
+        self._fill = 0
+        # Anonymous mmaps are page-aligned and zero-filled, as O_DIRECT requires
+        self._buf = mmap.mmap(-1, DIRECT_IO_CHUNK)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def tell(self):
+        if self._file is not None:
+            return self._file.tell()
+        return self._offset + self._fill
+
+    def write(self, data):
+        if self._file is not None:
+            return self._file.write(data)
+
+        data = memoryview(data).cast('B')
+        pos = 0
+        while pos < len(data):
+            n = min(DIRECT_IO_CHUNK - self._fill, len(data) - pos)
+            self._buf[self._fill:self._fill + n] = data[pos:pos + n]
+            self._fill += n
+            pos += n
+            if self._fill == DIRECT_IO_CHUNK:
+                self._submit()
+        return len(data)
+
+    def _pwrite(self, buf, length, offset):
+        """pwrite one staged buffer, dropping O_DIRECT if the filesystem rejects it"""
+        try:
+            with memoryview(buf) as view:
+                try:
+                    os.pwrite(self._fd, view[:length], offset)
+                except OSError as e:
+                    if e.errno != errno.EINVAL:
+                        raise
+                    import fcntl
+                    flags = fcntl.fcntl(self._fd, fcntl.F_GETFL)
+                    fcntl.fcntl(self._fd, fcntl.F_SETFL, flags & ~os.O_DIRECT)
+                    os.pwrite(self._fd, view[:length], offset)
+        finally:
+            buf.close()
+
+    def _submit(self):
+        """Queue the staged buffer for writing, padded to a page multiple"""
+        padded = -(-self._fill // DIRECT_IO_ALIGN) * DIRECT_IO_ALIGN
+        self._pending.append(self._pool.submit(self._pwrite, self._buf, padded, self._offset))
+        self._offset += self._fill
+        self._fill = 0
+        self._buf = mmap.mmap(-1, DIRECT_IO_CHUNK)
+        while len(self._pending) >= DIRECT_IO_QUEUE_DEPTH:
+            self._pending.popleft().result()
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            return
+        if self._fd is None:
+            return
+
+        try:
+            if self._fill:
+                self._submit()
+            while self._pending:
+                self._pending.popleft().result()
+            os.ftruncate(self._fd, self._offset)
+        finally:
+            self._pool.shutdown()
+            self._buf.close()
+            os.close(self._fd)
+            self._fd = None
+
+
+# Per-agent fields reordered by --axis-order axt
+AGENT_FIELDS = ('observations', 'actions', 'rewards')
+
+
+def _iter_slabs(value):
+    """Yield a field in time slabs (a plain array is a single slab)"""
+    if isinstance(value, VaultField):
+        yield from value.iter_slabs()
+    else:
+        yield value
+
+
+def _iter_blocks(value):
+    """Yield (index, block) pairs for writers that can place blocks anywhere"""
+    if isinstance(value, VaultField):
+        yield from value.iter_blocks()
+    else:
+        yield (slice(None),), value
+
+
+def to_agent_major(value):
+    """(timesteps, agents, ...) -> (agents, timesteps, ...), lazily for a VaultField"""
+    if isinstance(value, VaultField):
+        return value.to_agent_major()
+    return np.ascontiguousarray(np.swapaxes(value, 0, 1))
+
+
+def _read_rows(value, start, stop):
+    """Rows [start, stop) of a field"""
+    return value.read(start, stop) if isinstance(value, VaultField) else value[start:stop]
+
+
+def _map_slabs(value, fn, dtype):
+    """Apply fn to a field, lazily for a VaultField"""
+    return value.map(fn, dtype) if isinstance(value, VaultField) else fn(value)
+
+
+def _int8_scale(value):
+    """Per-agent/feature symmetric int8 scale (one pass over the field's slabs)"""
+    max_abs = None
+    for slab in _iter_slabs(value):
+        slab_max = np.abs(slab).max(axis=0)
+        max_abs = slab_max if max_abs is None else np.maximum(max_abs, slab_max)
+
+    scale = max_abs.astype(np.float32) / 127
+    scale[scale == 0] = 1.0
+    return scale
+
+
+def quantize_int8(x):
+    """
+    Symmetric int8 quantization with one scale per agent/feature
+
+    Accepts a NumPy array or a VaultField (quantized lazily, slab by slab).
+
+    Returns:
+        (int8 array, float32 scale) where x ~= q * scale
+    """
+    scale = _int8_scale(x)
+    q = _map_slabs(x, lambda slab: np.round(slab / scale).astype(np.int8), np.int8)
+    return q, scale
+
+
+def iter_save_arrays(fields, metadata, dtype='fp32', axis_order='tax'):
+    """
+    Yield (name, array) pairs to save, one vault field at a time
+
+    Fields opened with open_vault_fields() are VaultFields, which the
+    writers stream to disk slab by slab.
+
+    Args:
+        fields: Batch-0 vault fields (see open_vault_fields)
+        metadata: Dict of scalar metadata saved after the arrays
+        dtype: Storage dtype for floating observations/actions: 'fp32' (as
+            stored in the vault), 'bf16' (uint16 bits) or 'int8' (plus a
+            per-agent/feature '<field>_scale' array)
+        axis_order: 'tax' (timesteps, agents, ...) as stored in the vault, or
+            'axt' (agents, timesteps, ...) so each agent's data is contiguous;
+            states have no agent axis and stay (timesteps, state_dim)
+    """
+    reorder = to_agent_major if axis_order == 'axt' else (lambda array: array)
+
+    for field in QUANTIZED_FIELDS:
+        array = fields[field]  # (timesteps, agents, dim)
+
+        if dtype == 'fp32' or not np.issubdtype(array.dtype, np.floating):
+            yield field, reorder(array)
+        elif dtype == 'bf16':
+            yield field, reorder(_map_slabs(array, to_bfloat16_bits, np.uint16))
+        elif dtype == 'int8':
+            q, scale = quantize_int8(array)
+            yield field, reorder(q)
+            yield f'{field}_scale', scale
+        del array
+
+    yield 'rewards', reorder(fields['rewards'])       # (timesteps, agents)
+
+    if 'infos' in fields and 'state' in fields['infos']:
+        yield 'states', fields['infos']['state']      # (timesteps, state_dim)
+
+    yield 'storage_dtype', dtype
+    yield 'axis_order', axis_order
+    yield from metadata.items()
+
+
+def save_zstd_npz(path, arrays, level=3):
+    """
+    Save arrays as a tar of Zstandard-compressed .npy members
+
+    Much faster than the DEFLATE used by np.savez_compressed at a similar
+    ratio. Load the result back with load_zstd_npz().
+
+    Args:
+        path: Output .tar file
+        arrays: Iterable of (name, array) pairs
+        level: Zstandard compression level (1-22)
+    """
+    try:
+        import zstandard as zstd
+    except ImportError:
+        print("Error: Zstandard compression requires the zstandard package:")
+        print("  pip install zstandard")
+        sys.exit(1)
+
+    compressor = zstd.ZstdCompressor(level=level, threads=-1)
+
+    # Each member is compressed slab by slab into a temporary file (a tar
+    # header needs the member size up front), then copied into the archive,
+    # which is streamed to disk with direct I/O
+    with DirectFileWriter(path) as out, tarfile.open(fileobj=out, mode='w') as tar:
+        for name, value in arrays:
+            with tempfile.TemporaryFile() as buf:
+                with compressor.stream_writer(buf, closefd=False) as writer:
+                    write_npy_stream(writer, value)
+                del value
+
+                info = tarfile.TarInfo(f"{name}.npy.zst")
+                info.size = buf.tell()
+                buf.seek(0)
+                tar.addfile(info, buf)
+
+
+def load_zstd_npz(path):
+    """
+    Load arrays written by save_zstd_npz()
+
+    Args:
+        path: .tar file written by save_zstd_npz()
+
+    Returns:
+        Dict mapping array name to np.ndarray
+    """
+    import zstandard as zstd
+
+    decompressor = zstd.ZstdDecompressor()
+    arrays = {}
+
+    with tarfile.open(path, 'r') as tar:
+        for member in tar.getmembers():
+            name = member.name[:-len('.npy.zst')]
+            with tar.extractfile(member) as f:
+                with decompressor.stream_reader(f) as reader:
+                    arrays[name] = np.lib.format.read_array(reader)
+
+    return arrays
+
+
+HDF5_CHUNK_TIMESTEPS = 1024
+HDF5_SHARED_ATTRS = ('scenario', 'n_agents', 'obs_dim', 'act_dim')
+
+
+def save_hdf5_group(path, group_name, arrays, axis_order='tax'):
+    """
+    Save one quality as a group of a multi-quality HDF5 file
+
+    Arrays become gzip-compressed datasets chunked along time, so a single
+    quality (or time range) can be read without decompressing the rest.
+    Attributes shared by all qualities (scenario, shapes) live on the root,
+    the remaining metadata on the group. Re-running replaces the group.
+
+    Args:
+        path: Output .h5 file (created if missing)
+        group_name: Group to write, i.e. the quality name
+        arrays: Iterable of (name, array) pairs
+        axis_order: 'axt' if per-agent fields are (agents, timesteps, ...);
+            they are then chunked one agent at a time
+    """
+    try:
+        import h5py
+    except ImportError:
+        print("Error: HDF5 output requires h5py:")
+        print("  pip install h5py")
+        sys.exit(1)
+
+    with h5py.File(path, 'a', libver='latest') as f:
+        if group_name in f:
+            del f[group_name]
+        group = f.create_group(group_name)
+
+        for name, value in arrays:
+            if not isinstance(value, VaultField):
+                value = np.asanyarray(value)
+
+            if value.ndim == 0:
+                target = f if name in HDF5_SHARED_ATTRS else group
+                target.attrs[name] = value.item()
+            elif name.endswith('_scale'):
+                group.create_dataset(name, data=value)
+            else:
+                if axis_order == 'axt' and name in AGENT_FIELDS:
+                    chunks = (1, max(min(HDF5_CHUNK_TIMESTEPS, value.shape[1]), 1), *value.shape[2:])
+                else:
+                    chunks = (max(min(HDF5_CHUNK_TIMESTEPS, value.shape[0]), 1), *value.shape[1:])
+                dataset = group.create_dataset(name, shape=value.shape, dtype=value.dtype,
+                                               chunks=chunks, compression='gzip', shuffle=True)
+                for index, block in _iter_blocks(value):
+                    dataset[index] = block
+            del value
+
+
+PARQUET_ROW_GROUP = 10000
+
+
+def save_parquet(path, arrays, level=3):
+    """
+    Save arrays as a Zstandard-compressed Parquet file, one row per timestep
+
+    Per-timestep arrays become (nested fixed-size list) columns written in
+    10k-row row groups; scalars and per-field scales go into the schema
+    metadata. Load the result back with load_parquet().
+
+    Args:
+        path: Output .parquet file
+        arrays: Iterable of (name, array) pairs
+        level: Zstandard compression level
+    """
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        print("Error: Parquet output requires pyarrow:")
+        print("  pip install pyarrow")
+        sys.exit(1)
+
+    columns = {}
+    metadata = {}
+    for name, value in arrays:
+        if not isinstance(value, VaultField):
+            value = np.asanyarray(value)
+        if value.ndim == 0 or name.endswith('_scale'):
+            metadata[name] = np.asanyarray(value).tolist()
+        else:
+            columns[name] = value
+
+    n_rows = next(iter(columns.values())).shape[0]
+    first = {name: to_arrow_column(np.empty((0, *col.shape[1:]), dtype=col.dtype))
+             for name, col in columns.items()}
+    schema = pa.schema([pa.field(name, col.type) for name, col in first.items()],
+                       metadata={'og_marl': json.dumps(metadata)})
+
+    with pq.ParquetWriter(path, schema, compression='zstd', compression_level=level,
+                          use_dictionary=False, data_page_version='2.0') as writer:
+        for start in range(0, n_rows, PARQUET_ROW_GROUP):
+            stop = start + PARQUET_ROW_GROUP
+            batch = pa.record_batch(
+                [to_arrow_column(_read_rows(col, start, stop)) for col in columns.values()],
+                schema=schema
+            )
+            writer.write_table(pa.Table.from_batches([batch]))
+
+
+def load_parquet(path):
+    """
+    Load arrays written by save_parquet()
+
+    Args:
+        path: .parquet file written by save_parquet()
+
+    Returns:
+        Dict mapping array name to np.ndarray (metadata included)
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    table = pq.read_table(path)
+    arrays = {}
+
+    for name in table.column_names:
+        column = table.column(name).combine_chunks()
+        shape = [len(column)]
+        while pa.types.is_fixed_size_list(column.type):
+            shape.append(column.type.list_size)
+            column = column.flatten()
+        arrays[name] = column.to_numpy(zero_copy_only=False).reshape(shape)
+
+    metadata = json.loads(table.schema.metadata[b'og_marl'])
+    for name, value in metadata.items():
+        arrays[name] = np.asarray(value)
+
+    return arrays
+
+
+def _convert_one(vault_dir, output_path, scenario_name, q, compression='deflate',
+                 dtype='fp32', output_format='npz', axis_order='tax'):
+    """
+    Convert a single quality of a vault (runs in a worker process for --all-qualities)
+
+    Returns:
+        True on success, False if the conversion failed
+    """
+    from flashbax.vault import Vault
+
+    print(f"Converting quality: {q}")
+
+    try:
+        # Load vault
+        print(f"  Loading vault data...")
+        vault = Vault(str(vault_dir), vault_uid=q)
+        fields = open_vault_fields(vault)
+
+        # Extract metadata
+        n_timesteps = fields['observations'].shape[0]
+        n_agents = fields['observations'].shape[1]
+        obs_dim = fields['observations'].shape[-1]
+        act_dim = fields['actions'].shape[-1]
+
+        print(f"  Timesteps: {n_timesteps:,}")
+        print(f"  Agents: {n_agents}")
+        print(f"  Obs dim: {obs_dim}, Act dim: {act_dim}")
+
+        if 'infos' in fields and 'state' in fields['infos']:
+            print(f"  State dim: {fields['infos']['state'].shape[-1]}")
+
+        metadata = {
+            'n_timesteps': n_timesteps,
+            'n_agents': n_agents,
+            'obs_dim': obs_dim,
+            'act_dim': act_dim,
+            'scenario': scenario_name,
+            'quality': q,
+        }
+
+        # Stream fields to disk slab by slab, straight from the vault's tensorstores
+        arrays = iter_save_arrays(fields, metadata, dtype=dtype, axis_order=axis_order)
+
+        if output_format == 'hdf5':
+            output_file = output_path / f"{scenario_name}.h5"
+            print(f"  Saving to {output_file.name}:/{q}...")
+            save_hdf5_group(output_file, q, arrays, axis_order=axis_order)
+        elif output_format == 'npy-aligned':
+            output_file = output_path / f"{scenario_name}_{q}"
+            print(f"  Saving to {output_file.name}/...")
+            save_npy_dir(output_file, arrays)
+        elif output_format == 'parquet':
+            output_file = output_path / f"{scenario_name}_{q}.parquet"
+            print(f"  Saving to {output_file.name}...")
+            save_parquet(output_file, arrays)
+        elif compression == 'zstd':
+            output_file = output_path / f"{scenario_name}_{q}_zstd.tar"
+            print(f"  Saving to {output_file.name}...")
+            save_zstd_npz(output_file, arrays)
+        else:
+            output_file = output_path / f"{scenario_name}_{q}.npz"
+            print(f"  Saving to {output_file.name}...")
+            save_npz_streaming(output_file, arrays)
+
+        del fields, vault
+        drop_from_page_cache(output_file)
+
+        if output_file.is_dir():
+            size_bytes = sum(f.stat().st_size for f in output_file.iterdir())
+        else:
+            size_bytes = output_file.stat().st_size
+        size_mb = size_bytes / (1024 * 1024)
+        print(f"  ✓ Saved: {output_file.name} ({size_mb:.1f} MB)")
+        print()
+        return True
+
+    except Exception as e:
+        print(f"  ✗ Failed: {e}")
+        import traceback
+        traceback.print_exc()
+        print()
+        return False
+
+
+def convert_vault_to_npz(vault_path, output_dir, quality=None, all_qualities=False,
+                         compression='deflate', dtype='fp32', output_format='npz',
+                         workers=None, axis_order='tax'):
     """
     Convert vault to NPZ format
 
@@ -18,11 +536,20 @@ def convert_vault_to_npz(vault_path, output_dir, quality=None, all_qualities=Fal
         output_dir: Output directory for .npz files
         quality: Specific quality to convert (None = auto-detect first)
         all_qualities: Convert all available qualities
+        compression: 'deflate' (standard .npz) or 'zstd' (.tar of .npy.zst, see load_zstd_npz)
+        dtype: Storage dtype for observations/actions: 'fp32', 'bf16' or 'int8'
+            (see dequantize_arrays)
+        output_format: 'npz', 'parquet' (Zstandard row groups, see load_parquet) or
+            'npy-aligned' (directory of uncompressed page-aligned .npy, see load_npy_dir)
+            or 'hdf5' (one {scenario}.h5 with a group per quality, see load_hdf5)
+        workers: Max worker processes for --all-qualities (None = one per CPU;
+            always 1 for hdf5)
+        axis_order: 'tax' (timesteps, agents, ...) or 'axt' (agents, timesteps, ...)
+            for observations/actions/rewards; parquet needs 'tax'
     """
 
     try:
         from flashbax.vault import Vault
-        import jax
     except ImportError as e:
         print(f"Error: Missing dependencies. Install with:")
         print(f"  pip install flashbax jax numpy")
@@ -42,6 +569,10 @@ def convert_vault_to_npz(vault_path, output_dir, quality=None, all_qualities=Fal
         print("   Continuing anyway (will likely fail)...")
         print()
 
+    if output_format == 'parquet' and axis_order == 'axt':
+        print("Error: Parquet output has one row per timestep; use --axis-order tax")
+        return
+
     vault_dir = Path(vault_path).resolve()  # Get absolute path
     output_path = Path(output_dir).resolve()
     output_path.mkdir(parents=True, exist_ok=True)
@@ -57,10 +588,7 @@ def convert_vault_to_npz(vault_path, output_dir, quality=None, all_qualities=Fal
     print()
 
     # Find available qualities
-    available_qualities = []
-    for item in vault_dir.iterdir():
-        if item.is_dir() and (item / 'metadata.json').exists():
-            available_qualities.append(item.name)
+    available_qualities = discover_qualities(vault_dir)
 
     if not available_qualities:
         print("Error: No quality directories found in vault!")
@@ -83,69 +611,44 @@ def convert_vault_to_npz(vault_path, output_dir, quality=None, all_qualities=Fal
 
     print()
 
-    # Convert each quality
-    for q in qualities_to_convert:
-        print(f"Converting quality: {q}")
+    # Convert each quality; qualities are independent, so convert them in parallel
+    convert_kwargs = dict(compression=compression, dtype=dtype, output_format=output_format,
+                          axis_order=axis_order)
+    n_workers = min(workers or os.cpu_count() or 1, len(qualities_to_convert))
+    if output_format == 'hdf5':
+        # All qualities share one HDF5 file, which only one process may write
+        n_workers = 1
 
-        try:
-            # Load vault
-            print(f"  Loading vault data...")
-            vault = Vault(str(vault_dir), vault_uid=q)
-            experience = vault.read().experience
-            data = jax.tree.map(lambda x: np.array(x), experience)
-
-            # Extract metadata
-            n_timesteps = data['observations'].shape[1]
-            n_agents = data['observations'].shape[2]
-            obs_dim = data['observations'].shape[-1]
-            act_dim = data['actions'].shape[-1]
-
-            print(f"  Timesteps: {n_timesteps:,}")
-            print(f"  Agents: {n_agents}")
-            print(f"  Obs dim: {obs_dim}, Act dim: {act_dim}")
-
-            # Prepare data dictionary (remove batch dimension)
-            save_dict = {
-                'observations': data['observations'][0],  # (timesteps, agents, obs_dim)
-                'actions': data['actions'][0],            # (timesteps, agents, act_dim)
-                'rewards': data['rewards'][0],            # (timesteps, agents)
-                'n_timesteps': n_timesteps,
-                'n_agents': n_agents,
-                'obs_dim': obs_dim,
-                'act_dim': act_dim,
-                'scenario': scenario_name,
-                'quality': q,
-            }
-
-            # Add state if available
-            if 'infos' in data and 'state' in data['infos']:
-                save_dict['states'] = data['infos']['state'][0]
-                print(f"  State dim: {data['infos']['state'].shape[-1]}")
-
-            # Save as compressed NPZ
-            output_file = output_path / f"{scenario_name}_{q}.npz"
-            print(f"  Saving to {output_file.name}...")
+    if n_workers > 1:
+        import multiprocessing
+        from concurrent.futures import ProcessPoolExecutor
 
-            np.savez_compressed(output_file, **save_dict)
-
-            size_mb = output_file.stat().st_size / (1024 * 1024)
-            print(f"  ✓ Saved: {output_file.name} ({size_mb:.1f} MB)")
-            print()
+        print(f"Converting {len(qualities_to_convert)} qualities with {n_workers} worker processes")
+        print()
 
-        except Exception as e:
-            print(f"  ✗ Failed: {e}")
-            import traceback
-            traceback.print_exc()
-            print()
-            continue
+        # spawn rather than fork: forking after JAX has started its threads can deadlock
+        with ProcessPoolExecutor(max_workers=n_workers,
+                                 mp_context=multiprocessing.get_context('spawn')) as pool:
+            futures = [pool.submit(_convert_one, vault_dir, output_path, scenario_name, q,
+                                   **convert_kwargs)
+                       for q in qualities_to_convert]
+            for future in futures:
+                future.result()
+    else:
+        for q in qualities_to_convert:
+            _convert_one(vault_dir, output_path, scenario_name, q, **convert_kwargs)
 
     print(f"\n✓ Conversion complete!")
     print(f"\nConverted files saved to: {output_path}")
     print(f"\nTo load the data:")
     print(f"  import numpy as np")
     print(f"  data = np.load('path/to/file.npz')")
-    print(f"  observations = data['observations']  # Shape: (timesteps, agents, obs_dim)")
-    print(f"  actions = data['actions']            # Shape: (timesteps, agents, act_dim)")
+    if axis_order == 'axt':
+        print(f"  observations = data['observations']  # Shape: (agents, timesteps, obs_dim)")
+        print(f"  actions = data['actions']            # Shape: (agents, timesteps, act_dim)")
+    else:
+        print(f"  observations = data['observations']  # Shape: (timesteps, agents, obs_dim)")
+        print(f"  actions = data['actions']            # Shape: (timesteps, agents, act_dim)")
 
 
 if __name__ == "__main__":
@@ -162,6 +665,24 @@ Examples:
 
   # Convert all qualities
   python vault_to_npz.py data/2halfcheetah.vlt outputs/converted/ --all-qualities
+
+  # Faster Zstandard compression (requires: pip install zstandard)
+  python vault_to_npz.py data/2halfcheetah.vlt outputs/converted/ --compression zstd
+
+  # Halve file size by storing observations/actions as bfloat16
+  python vault_to_npz.py data/2halfcheetah.vlt outputs/converted/ --dtype bf16
+
+  # Columnar Parquet with one row per timestep (requires: pip install pyarrow)
+  python vault_to_npz.py data/2halfcheetah.vlt outputs/converted/ --format parquet
+
+  # Uncompressed page-aligned .npy per field, for mmap loading
+  python vault_to_npz.py data/2halfcheetah.vlt outputs/converted/ --format npy-aligned
+
+  # All qualities in a single HDF5 file, one group per quality (requires: pip install h5py)
+  python vault_to_npz.py data/2halfcheetah.vlt outputs/converted/ --all-qualities --format hdf5
+
+  # Agent-major (agents, timesteps, ...) arrays for per-agent training
+  python vault_to_npz.py data/2halfcheetah.vlt outputs/converted/ --format npy-aligned --axis-order axt
         """
     )
 
@@ -170,6 +691,21 @@ Examples:
     parser.add_argument('--quality', help='Specific quality to convert')
     parser.add_argument('--all-qualities', action='store_true',
                        help='Convert all available qualities')
+    parser.add_argument('--workers', type=int,
+                       help='Worker processes for --all-qualities (default: one per CPU; '
+                            'always 1 for --format hdf5)')
+    parser.add_argument('--compression', choices=['deflate', 'zstd'], default='deflate',
+                       help='deflate: standard .npz (default), zstd: faster .tar of .npy.zst')
+    parser.add_argument('--dtype', choices=['fp32', 'bf16', 'int8'], default='fp32',
+                       help='Storage dtype for observations/actions (default: fp32)')
+    parser.add_argument('--format', choices=['npz', 'parquet', 'npy-aligned', 'hdf5'], default='npz',
+                       help='Output format (default: npz); parquet is always Zstandard-compressed, '
+                            'npy-aligned is an uncompressed directory of page-aligned .npy files, '
+                            'hdf5 puts every quality in one {scenario}.h5 file')
+    parser.add_argument('--axis-order', choices=['tax', 'axt'], default='tax',
+                       help='tax: (timesteps, agents, ...) as in the vault (default); '
+                            'axt: (agents, timesteps, ...) so each agent is contiguous '
+                            '(observations, actions, rewards; not for parquet)')
 
     args = parser.parse_args()
 
@@ -177,5 +713,10 @@ Examples:
         args.vault_path,
         args.output_dir,
         quality=args.quality,
-        all_qualities=args.all_qualities
+        all_qualities=args.all_qualities,
+        compression=args.compression,
+        dtype=args.dtype,
+        output_format=args.format,
+        workers=args.workers,
+        axis_order=args.axis_order
     )
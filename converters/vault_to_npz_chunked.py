@@ -3,30 +3,351 @@
 Convert OG-MARL vault to NPZ format with chunked loading for large datasets
 """
 
+import os
 import sys
+import json
 import argparse
+import importlib
+import tarfile
+import tempfile
 import numpy as np
 from pathlib import Path
 
-def convert_vault_chunked(vault_path, output_dir, quality=None, chunk_size=10000):
+from _vault_common import (QUANTIZED_FIELDS, VaultField, discover_qualities, drop_from_page_cache,
+                           load_metadata, open_vault_fields, parse_shapes, save_npz_streaming,
+                           to_arrow_column, to_bfloat16_bits, write_npy_stream)
+# Loaders for the converted files, re-exported so they can be imported from here
+from _vault_common import dequantize_arrays, load_hdf5  # noqa: F401
+
+# Member suffix inside the .tar for each streaming codec
+TAR_CODECS = {'zstd': '.npy.zst', 'lz4': '.npy.lz4'}
+
+# Module each streaming codec imports, and the pip package that provides it
+CODEC_MODULES = {'zstd': ('zstandard', 'zstandard'), 'lz4': ('lz4.frame', 'lz4')}
+
+# Per-agent fields reordered by --axis-order axt
+AGENT_FIELDS = ('observations', 'actions', 'rewards')
+
+
+def _astype(field, dtype):
+    return field.map(lambda chunk: chunk.astype(dtype), dtype)
+
+
+def _value_range(field):
+    """Per-agent/feature (min, max) over all chunks of a field"""
+    lo = hi = None
+    for chunk in field.iter_slabs():
+        chunk_lo, chunk_hi = chunk.min(axis=0), chunk.max(axis=0)
+        lo = chunk_lo if lo is None else np.minimum(lo, chunk_lo)
+        hi = chunk_hi if hi is None else np.maximum(hi, chunk_hi)
+    return lo, hi
+
+
+def quantize_int8_affine(field):
+    """
+    Asymmetric int8 quantization with one scale/zero point per agent/feature
+
+    Returns:
+        (int8 field, float32 scale, float32 zero_point) where
+        x ~= (q - zero_point) * scale
+    """
+    lo, hi = (v.astype(np.float32) for v in _value_range(field))
+    scale = (hi - lo) / 255
+    scale[scale == 0] = 1.0
+    zero_point = -128 - lo / scale
+
+    def quantize(chunk):
+        return np.clip(np.round((chunk - lo) / scale) - 128, -128, 127).astype(np.int8)
+
+    return field.map(quantize, np.int8), scale, zero_point
+
+
+def narrow_integer(field):
+    """Downcast an integer (discrete) field to the smallest signed type holding its range"""
+    if field.n_timesteps == 0:
+        return field
+    lo, hi = _value_range(field)
+    for dtype in (np.int8, np.int16):
+        info = np.iinfo(dtype)
+        if lo.min() >= info.min and hi.max() <= info.max:
+            return _astype(field, dtype)
+    return field
+
+
+def quantize_fields(save_dict, dtype):
+    """
+    Narrow observations/actions in save_dict in place (lazily, per chunk)
+
+    Args:
+        save_dict: Fields and metadata about to be saved
+        dtype: 'keep', 'fp16', 'bf16' (uint16 bits) or 'int8' (plus
+            '<field>_scale' and '<field>_zero_point' arrays)
+    """
+    save_dict['storage_dtype'] = dtype
+    if dtype == 'keep':
+        return
+
+    for field in QUANTIZED_FIELDS:
+        array = save_dict[field]
+        if np.issubdtype(array.dtype, np.integer):
+            save_dict[field] = narrow_integer(array)
+        elif dtype == 'fp16':
+            save_dict[field] = _astype(array, np.float16)
+        elif dtype == 'bf16':
+            save_dict[field] = array.map(to_bfloat16_bits, np.uint16)
+        elif dtype == 'int8':
+            q, scale, zero_point = quantize_int8_affine(array)
+            save_dict[field] = q
+            save_dict[f'{field}_scale'] = scale
+            save_dict[f'{field}_zero_point'] = zero_point
+
+
+def resolve_compression(compression):
+    """
+    Check that the codec for compression is installed, falling back to zip if not
+
+    Run once before any vault is read, so a missing zstandard/lz4 package
+    is reported up front rather than at save time in every worker.
+
+    Args:
+        compression: Requested --compression value
+
+    Returns:
+        compression, or 'zip' (DEFLATE .npz) when its codec is missing
+    """
+    if compression not in CODEC_MODULES:
+        return compression
+
+    module, package = CODEC_MODULES[compression]
+    try:
+        importlib.import_module(module)
+    except ImportError:
+        print(f"Warning: --compression {compression} requires the {package} package "
+              f"(pip install {package}); writing a DEFLATE .npz (--compression zip) instead")
+        return 'zip'
+    return compression
+
+
+def _open_compressor(compression, buf):
+    """Return a writable stream that compresses into buf (codec checked by resolve_compression)"""
+    if compression == 'zstd':
+        import zstandard as zstd
+        return zstd.ZstdCompressor(level=3, threads=-1).stream_writer(buf, closefd=False)
+
+    import lz4.frame
+    return lz4.frame.open(buf, mode='wb')
+
+
+def save_compressed_tar(path, arrays, compression='zstd'):
+    """
+    Save arrays as a tar of Zstandard- or LZ4-compressed .npy members
+
+    Zstandard is multithreaded and several times faster than the DEFLATE
+    used by np.savez_compressed at a similar ratio; LZ4 is faster still at
+    a lower ratio. Each member is compressed chunk by chunk into a temporary
+    file, so only one chunk is held in memory. Load the result
+    back with load_compressed_tar().
+
+    Args:
+        path: Output .tar file
+        arrays: Dict mapping name to VaultField, array or scalar/string
+        compression: 'zstd' or 'lz4'
+    """
+    suffix = TAR_CODECS[compression]
+
+    with tarfile.open(path, mode='w') as tar:
+        for name, value in arrays.items():
+            with tempfile.TemporaryFile() as buf:
+                with _open_compressor(compression, buf) as writer:
+                    write_npy_stream(writer, value)
+
+                info = tarfile.TarInfo(f"{name}{suffix}")
+                info.size = buf.tell()
+                buf.seek(0)
+                tar.addfile(info, buf)
+
+
+def load_compressed_tar(path):
+    """
+    Load arrays written by save_compressed_tar()
+
+    Args:
+        path: .tar file written by save_compressed_tar()
+
+    Returns:
+        Dict mapping array name to np.ndarray
+    """
+    arrays = {}
+
+    with tarfile.open(path, 'r') as tar:
+        for member in tar.getmembers():
+            with tar.extractfile(member) as f:
+                if member.name.endswith(TAR_CODECS['zstd']):
+                    import zstandard as zstd
+                    name = member.name[:-len(TAR_CODECS['zstd'])]
+                    with zstd.ZstdDecompressor().stream_reader(f) as reader:
+                        arrays[name] = np.lib.format.read_array(reader)
+                else:
+                    import lz4.frame
+                    name = member.name[:-len(TAR_CODECS['lz4'])]
+                    with lz4.frame.open(f, mode='rb') as reader:
+                        arrays[name] = np.lib.format.read_array(reader)
+
+    return arrays
+
+
+def save_hdf5(path, arrays):
+    """
+    Save arrays to a chunked, LZF-compressed HDF5 file
+
+    Each field is one dataset chunked along time in `chunk_size` steps (and
+    one agent at a time for agent-major fields) and written in a single pass;
+    scalars and strings become root attributes. Load the result back with
+    load_hdf5().
+
+    Args:
+        path: Output .h5 file
+        arrays: Dict mapping name to VaultField, array or scalar/string
+    """
+    try:
+        import h5py
+    except ImportError:
+        print("Error: HDF5 output requires h5py:")
+        print("  pip install h5py")
+        sys.exit(1)
+
+    with h5py.File(path, 'w') as f:
+        for name, value in arrays.items():
+            if isinstance(value, VaultField):
+                time_chunk = max(1, min(value.chunk_size, value.n_timesteps))
+                if value.agent_major:
+                    chunks = (1, time_chunk, *value.shape[2:])
+                else:
+                    chunks = (time_chunk, *value.shape[1:])
+                dataset = f.create_dataset(name, shape=value.shape, dtype=value.dtype,
+                                           chunks=chunks, compression='lzf')
+                for index, block in value.iter_blocks():
+                    dataset[index] = block
+            elif np.ndim(value) > 0:
+                f.create_dataset(name, data=value)
+            else:
+                f.attrs[name] = value
+
+
+def save_arrow(path, arrays):
+    """
+    Save arrays as an LZ4-compressed Arrow IPC file, one row per timestep
+
+    Time-major fields become (nested fixed-size list) columns written one
+    record batch per chunk; scalars, strings and the int8 scale/zero-point
+    arrays go into the schema metadata. Load the result back with
+    load_arrow().
+
+    Args:
+        path: Output .arrow file
+        arrays: Dict mapping name to VaultField, array or scalar/string
+    """
+    try:
+        import pyarrow as pa
+    except ImportError:
+        print("Error: Arrow output requires pyarrow:")
+        print("  pip install pyarrow")
+        sys.exit(1)
+
+    columns = {}
+    metadata = {}
+    for name, value in arrays.items():
+        if isinstance(value, VaultField):
+            columns[name] = value
+        else:
+            metadata[name] = np.asarray(value).tolist()
+
+    first = next(iter(columns.values()))
+    schema = pa.schema([pa.field(name, to_arrow_column(np.empty((0, *col.shape[1:]),
+                                                                  dtype=col.dtype)).type)
+                        for name, col in columns.items()],
+                       metadata={'og_marl': json.dumps(metadata)})
+    options = pa.ipc.IpcWriteOptions(compression='lz4')
+
+    with pa.OSFile(str(path), 'wb') as sink:
+        with pa.ipc.new_file(sink, schema, options=options) as writer:
+            for start in range(0, first.n_timesteps, first.chunk_size):
+                stop = start + first.chunk_size
+                writer.write_batch(pa.record_batch(
+                    [to_arrow_column(col.read(start, stop)) for col in columns.values()],
+                    schema=schema))
+
+
+def load_arrow(path):
+    """
+    Load arrays written by save_arrow()
+
+    The file is memory-mapped, so only the LZ4-compressed buffers being
+    decoded are read from disk.
+
+    Args:
+        path: .arrow file written by save_arrow()
+
+    Returns:
+        Dict mapping array name to np.ndarray (metadata included)
+    """
+    import pyarrow as pa
+
+    with pa.memory_map(str(path), 'r') as source:
+        table = pa.ipc.open_file(source).read_all()
+
+    arrays = {}
+    for name in table.column_names:
+        column = table.column(name).combine_chunks()
+        shape = [len(column)]
+        while pa.types.is_fixed_size_list(column.type):
+            shape.append(column.type.list_size)
+            column = column.flatten()
+        arrays[name] = column.to_numpy(zero_copy_only=False).reshape(shape)
+
+    metadata = json.loads(table.schema.metadata[b'og_marl'])
+    for name, value in metadata.items():
+        arrays[name] = np.asarray(value)
+
+    return arrays
+
+
+def convert_vault_chunked(vault_path, output_dir, quality=None, chunk_size=10000,
+                          compression='zstd', dtype='keep', axis_order='tax', dry_run=False):
     """
     Convert vault to NPZ in chunks to avoid memory issues
 
+    Every field is read and written `chunk_size` timesteps at a time, so
+    peak memory scales with the chunk size rather than the dataset.
+
     Args:
         vault_path: Path to .vlt directory
         output_dir: Output directory
         quality: Quality level to convert
         chunk_size: Number of timesteps per chunk
+        compression: 'zstd' or 'lz4' (tar of compressed .npy members),
+            'zip' (DEFLATE .npz), 'none' (uncompressed .npz), 'lzf'
+            (chunked HDF5) or 'arrow' (LZ4 Arrow IPC, needs axis_order 'tax')
+        dtype: Storage dtype for observations/actions: 'keep' (as stored in
+            the vault), 'fp16', 'bf16' or 'int8' (see quantize_fields);
+            integer actions are narrowed to int8/int16 in every mode but 'keep'
+        axis_order: 'tax' (timesteps, agents, ...) as in the vault, or 'axt'
+            (agents, timesteps, ...) for observations/actions/rewards
+        dry_run: Only print the dataset info from metadata.json; the vault
+            itself is never opened
     """
 
     try:
         from flashbax.vault import Vault
-        import jax
     except ImportError:
         print("Error: Missing dependencies. Install with:")
         print("  pip install flashbax jax numpy")
         sys.exit(1)
 
+    if compression == 'arrow' and axis_order == 'axt':
+        print("Error: Arrow output has one row per timestep; use --axis-order tax")
+        return
+
     vault_dir = Path(vault_path).resolve()
     output_path = Path(output_dir).resolve()
     output_path.mkdir(parents=True, exist_ok=True)
@@ -38,8 +359,7 @@ def convert_vault_chunked(vault_path, output_dir, quality=None, chunk_size=10000
     scenario_name = vault_dir.stem.replace('.vlt', '')
 
     # Find qualities
-    available_qualities = [d.name for d in vault_dir.iterdir()
-                          if d.is_dir() and (d / 'metadata.json').exists()]
+    available_qualities = discover_qualities(vault_dir)
 
     if not available_qualities:
         print("Error: No quality directories found!")
@@ -53,36 +373,16 @@ def convert_vault_chunked(vault_path, output_dir, quality=None, chunk_size=10000
     print()
 
     try:
-        # First pass: get metadata without loading all data
+        # First pass: get metadata without opening the vault
         print("Reading vault metadata...")
-        vault = Vault(str(vault_dir), vault_uid=quality_to_convert)
 
-        # Read metadata from JSON
-        import json
-        with open(vault_dir / quality_to_convert / 'metadata.json', 'r') as f:
-            metadata = json.load(f)
-
-        # Parse shapes
-        import re
-        shapes = metadata['structure_shape']
-        obs_shape = shapes['observations']
-        match = re.search(r'\(1, (\d+), (\d+), (\d+)\)', obs_shape)
-        if not match:
+        # Parse shapes from metadata.json
+        shapes = parse_shapes(load_metadata(vault_dir / quality_to_convert))
+        if shapes is None:
             print("Error: Could not parse observation shape")
             return
 
-        total_timesteps, n_agents, obs_dim = map(int, match.groups())
-
-        # Get action dim
-        act_shape = shapes['actions']
-        if '(' in act_shape:
-            act_match = re.search(r'\(1, \d+, \d+(?:, (\d+))?\)', act_shape)
-            if act_match and act_match.group(1):
-                act_dim = int(act_match.group(1))
-            else:
-                act_dim = 1  # Discrete
-        else:
-            act_dim = 1
+        total_timesteps, n_agents, obs_dim, act_dim = shapes
 
         print(f"Dataset info:")
         print(f"  Total timesteps: {total_timesteps:,}")
@@ -91,19 +391,23 @@ def convert_vault_chunked(vault_path, output_dir, quality=None, chunk_size=10000
         print(f"  Act dim: {act_dim}")
         print()
 
-        # Load full data (hoping it fits in memory)
-        print("Loading vault data... (this may take a while)")
-        experience = vault.read().experience
-        data = jax.tree.map(lambda x: np.array(x), experience)
+        if dry_run:
+            print("Dry run: vault not opened, nothing written")
+            return
+
+        print("Opening vault fields...")
+        vault = Vault(str(vault_dir), vault_uid=quality_to_convert)
+        full_read_bytes = 4 * total_timesteps * n_agents * (obs_dim + act_dim + 1)
+        fields = open_vault_fields(vault, chunk_size, full_read_bytes)
 
         print("Converting to NPZ format...")
 
         # Save
         save_dict = {
-            'observations': data['observations'][0],
-            'actions': data['actions'][0],
-            'rewards': data['rewards'][0],
-            'n_timesteps': total_timesteps,
+            'observations': fields['observations'],
+            'actions': fields['actions'],
+            'rewards': fields['rewards'],
+            'n_timesteps': fields['observations'].shape[0],
             'n_agents': n_agents,
             'obs_dim': obs_dim,
             'act_dim': act_dim,
@@ -111,21 +415,47 @@ def convert_vault_chunked(vault_path, output_dir, quality=None, chunk_size=10000
             'quality': quality_to_convert,
         }
 
-        if 'infos' in data and 'state' in data['infos']:
-            save_dict['states'] = data['infos']['state'][0]
+        if 'infos' in fields and 'state' in fields['infos']:
+            save_dict['states'] = fields['infos']['state']
             print(f"  Including state data")
 
-        output_file = output_path / f"{scenario_name}_{quality_to_convert}.npz"
-        print(f"Saving to {output_file.name}...")
+        quantize_fields(save_dict, dtype)
+        if dtype != 'keep':
+            print(f"  Observations/actions stored as {dtype} (restore with dequantize_arrays())")
+
+        save_dict['axis_order'] = axis_order
+        if axis_order == 'axt':
+            for field in AGENT_FIELDS:
+                save_dict[field] = save_dict[field].to_agent_major()
+            print(f"  Observations/actions/rewards stored agent-major (agents, timesteps, ...)")
+
+        if compression in TAR_CODECS:
+            output_file = output_path / f"{scenario_name}_{quality_to_convert}_{compression}.tar"
+        elif compression == 'lzf':
+            output_file = output_path / f"{scenario_name}_{quality_to_convert}.h5"
+        elif compression == 'arrow':
+            output_file = output_path / f"{scenario_name}_{quality_to_convert}.arrow"
+        else:
+            output_file = output_path / f"{scenario_name}_{quality_to_convert}.npz"
+        print(f"Saving to {output_file.name} ({compression})...")
 
-        np.savez_compressed(output_file, **save_dict)
+        if compression in TAR_CODECS:
+            save_compressed_tar(output_file, save_dict, compression)
+        elif compression == 'lzf':
+            save_hdf5(output_file, save_dict)
+        elif compression == 'arrow':
+            save_arrow(output_file, save_dict)
+        else:
+            save_npz_streaming(output_file, save_dict.items(), compressed=(compression == 'zip'))
+        drop_from_page_cache(output_file)
 
         size_mb = output_file.stat().st_size / (1024 * 1024)
         print(f"✓ Success! ({size_mb:.1f} MB)")
 
-    except MemoryError:
-        print("✗ Out of memory! Dataset too large.")
-        print("Try using vault_to_json.py with --max-timesteps instead:")
+    except MemoryError as e:
+        print(f"✗ Out of memory! {e}")
+        print("Try a smaller --chunk-size.")
+        print("Or use vault_to_json.py with --max-timesteps instead:")
         print(f"  python converters/vault_to_json.py {vault_path} {output_dir} --max-timesteps 10000")
 
     except Exception as e:
@@ -134,12 +464,79 @@ def convert_vault_chunked(vault_path, output_dir, quality=None, chunk_size=10000
         traceback.print_exc()
 
 
+def convert_all_qualities(vault_path, output_dir, workers=None, **convert_kwargs):
+    """
+    Convert every quality of a vault, one worker process per quality
+
+    Qualities are independent (separate stores, separate output files), so
+    their reads and compression overlap across processes.
+
+    Args:
+        vault_path: Path to .vlt directory
+        output_dir: Output directory
+        workers: Max worker processes (None = one per CPU)
+        **convert_kwargs: Passed to convert_vault_chunked()
+    """
+    qualities = discover_qualities(Path(vault_path).resolve())
+    if not qualities:
+        print("Error: No quality directories found!")
+        return
+
+    n_workers = min(workers or os.cpu_count() or 1, len(qualities))
+    print(f"Converting {len(qualities)} qualities with {n_workers} worker process(es): {qualities}")
+    print()
+
+    if n_workers == 1:
+        for q in qualities:
+            convert_vault_chunked(vault_path, output_dir, quality=q, **convert_kwargs)
+        return
+
+    import multiprocessing
+    from concurrent.futures import ProcessPoolExecutor
+
+    # spawn rather than fork: forking after JAX has started its threads can deadlock
+    with ProcessPoolExecutor(max_workers=n_workers,
+                             mp_context=multiprocessing.get_context('spawn')) as pool:
+        futures = [pool.submit(convert_vault_chunked, vault_path, output_dir, quality=q,
+                               **convert_kwargs)
+                   for q in qualities]
+        for future in futures:
+            future.result()
+
+
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description='Convert vault to NPZ (memory-aware)')
     parser.add_argument('vault_path', help='Path to .vlt directory')
     parser.add_argument('output_dir', help='Output directory')
     parser.add_argument('--quality', help='Quality to convert')
-    parser.add_argument('--chunk-size', type=int, default=10000, help='Chunk size')
+    parser.add_argument('--all-qualities', action='store_true',
+                        help='Convert every quality, in parallel worker processes')
+    parser.add_argument('--workers', type=int,
+                        help='Worker processes for --all-qualities (default: one per CPU)')
+    parser.add_argument('--chunk-size', type=int, default=10000,
+                        help='Timesteps read and written at a time (default: 10000)')
+    parser.add_argument('--compression', choices=['zstd', 'lz4', 'zip', 'none', 'lzf', 'arrow'],
+                        default='zstd',
+                        help='zstd (default) / lz4: .tar of compressed .npy members, read back '
+                             'with load_compressed_tar() (falls back to zip if the zstandard / lz4 '
+                             'package is missing); zip / none: DEFLATE / uncompressed .npz; '
+                             'lzf: chunked HDF5 (.h5), read back with load_hdf5(); '
+                             'arrow: LZ4 Arrow IPC (.arrow), memory-mapped by load_arrow()')
+    parser.add_argument('--dtype', choices=['keep', 'fp16', 'bf16', 'int8'], default='keep',
+                        help='Storage dtype for observations/actions (default: keep); '
+                             'int8 adds per-agent/feature scale and zero-point arrays')
+    parser.add_argument('--axis-order', choices=['tax', 'axt'], default='tax',
+                        help='tax: (timesteps, agents, ...) as in the vault (default); '
+                             'axt: (agents, timesteps, ...) so each agent is contiguous')
+    parser.add_argument('--dry-run', action='store_true',
+                        help='Print dataset info from metadata.json without opening the vault')
 
     args = parser.parse_args()
-    convert_vault_chunked(args.vault_path, args.output_dir, args.quality, args.chunk_size)
+    compression = resolve_compression(args.compression)
+    convert_kwargs = dict(chunk_size=args.chunk_size, compression=compression,
+                          dtype=args.dtype, axis_order=args.axis_order, dry_run=args.dry_run)
+    if args.all_qualities:
+        convert_all_qualities(args.vault_path, args.output_dir, workers=args.workers,
+                              **convert_kwargs)
+    else:
+        convert_vault_chunked(args.vault_path, args.output_dir, args.quality, **convert_kwargs)
@@ -9,7 +9,38 @@ import argparse
 import numpy as np
 from pathlib import Path
 
-def convert_vault_sample(vault_path, output_dir, quality=None, max_timesteps=10000):
+from _vault_common import discover_qualities, drop_from_page_cache, load_metadata, parse_shapes, save_npy_dir
+# Loader for --layout sharded, re-exported so it can be imported from here
+from _vault_common import load_npy_dir  # noqa: F401
+
+
+def save_hdf5(path, arrays):
+    """
+    Save arrays as uncompressed HDF5 datasets (scalars as root attributes)
+
+    Contiguous datasets can be sliced straight from disk with h5py.
+
+    Args:
+        path: Output .h5 file
+        arrays: Dict mapping name to array or scalar/string
+    """
+    try:
+        import h5py
+    except ImportError:
+        print("Error: HDF5 output requires h5py:")
+        print("  pip install h5py")
+        sys.exit(1)
+
+    with h5py.File(path, 'w') as f:
+        for name, value in arrays.items():
+            if np.ndim(value) > 0:
+                f.create_dataset(name, data=value)
+            else:
+                f.attrs[name] = value
+
+
+def convert_vault_sample(vault_path, output_dir, quality=None, max_timesteps=10000,
+                         layout='npz', axis_order='tax'):
     """
     Sample subset of vault data
 
@@ -18,6 +49,10 @@ def convert_vault_sample(vault_path, output_dir, quality=None, max_timesteps=100
         output_dir: Output directory
         quality: Quality level
         max_timesteps: Maximum timesteps to sample
+        layout: 'npz' (one compressed file), 'sharded' (directory of
+            page-aligned .npy files, see load_npy_dir) or 'hdf5'
+        axis_order: 'tax' (timesteps, agents, ...) as in the vault, or 'axt'
+            (agents, timesteps, ...) for observations/actions/rewards
     """
 
     try:
@@ -34,8 +69,7 @@ def convert_vault_sample(vault_path, output_dir, quality=None, max_timesteps=100
     scenario_name = vault_dir.stem.replace('.vlt', '')
 
     # Find quality
-    available_qualities = [d.name for d in vault_dir.iterdir()
-                          if d.is_dir() and (d / 'metadata.json').exists()]
+    available_qualities = discover_qualities(vault_dir)
 
     quality_to_convert = quality if quality in available_qualities else available_qualities[0]
 
@@ -45,50 +79,54 @@ def convert_vault_sample(vault_path, output_dir, quality=None, max_timesteps=100
     print()
 
     try:
-        # Read metadata to get total size
-        import json
-        with open(vault_dir / quality_to_convert / 'metadata.json', 'r') as f:
-            metadata = json.load(f)
+        # Total timesteps from the metadata shape string, before touching the data
+        shapes = parse_shapes(load_metadata(vault_dir / quality_to_convert))
+        if shapes:
+            print(f"Total timesteps in vault: {shapes[0]:,}")
 
         print("Attempting to sample data...")
         vault = Vault(str(vault_dir), vault_uid=quality_to_convert)
 
-        # Try to sample using flashbax's sample method
-        try:
-            # Sample max_timesteps using random indices
-            total_timesteps = vault.read().experience['observations'].shape[1]
-            print(f"Total timesteps in vault: {total_timesteps:,}")
+        # Read the vault exactly once
+        experience = vault.read().experience
+        total_timesteps = experience['observations'].shape[1]
 
+        try:
             if max_timesteps >= total_timesteps:
                 print("Requested timesteps >= total, loading all...")
-                sampled_data = vault.read().experience
+                sampled_data = experience
             else:
                 print(f"Sampling {max_timesteps:,} timesteps from {total_timesteps:,}...")
                 # Create sample indices (evenly spaced)
                 indices = np.linspace(0, total_timesteps-1, max_timesteps, dtype=np.int32)
 
-                # This will still load everything unfortunately
-                full_data = vault.read().experience
+                # With an integer stride the indices are a plain strided slice:
+                # no gather, and a view where the array backend allows it
+                stride = int(indices[1] - indices[0]) if max_timesteps > 1 else 1
+                if stride > 0 and np.array_equal(indices, np.arange(max_timesteps) * stride):
+                    index = slice(0, stride * max_timesteps, stride)
+                else:
+                    index = indices
 
                 # Manually subsample
                 sampled_data = {
-                    'observations': full_data['observations'][:, indices],
-                    'actions': full_data['actions'][:, indices],
-                    'rewards': full_data['rewards'][:, indices],
+                    'observations': experience['observations'][:, index],
+                    'actions': experience['actions'][:, index],
+                    'rewards': experience['rewards'][:, index],
                 }
 
-                if 'infos' in full_data:
+                if 'infos' in experience:
                     sampled_data['infos'] = {}
-                    if 'state' in full_data['infos']:
-                        sampled_data['infos']['state'] = full_data['infos']['state'][:, indices]
+                    if 'state' in experience['infos']:
+                        sampled_data['infos']['state'] = experience['infos']['state'][:, index]
 
         except Exception as e:
             print(f"Sampling failed: {e}")
-            print("Trying full load...")
-            sampled_data = vault.read().experience
+            print("Using full data...")
+            sampled_data = experience
 
-        # Convert to numpy
-        data = jax.tree.map(lambda x: np.array(x), sampled_data)
+        # Convert to numpy after subsampling, so only the sampled rows are copied
+        data = jax.tree.map(np.asarray, sampled_data)
 
         # Get shapes
         n_timesteps = data['observations'].shape[1]
@@ -111,13 +149,36 @@ def convert_vault_sample(vault_path, output_dir, quality=None, max_timesteps=100
         if 'infos' in data and 'state' in data['infos']:
             save_dict['states'] = data['infos']['state'][0]
 
-        output_file = output_path / f"{scenario_name}_{quality_to_convert}_sample{n_timesteps}.npz"
+        # Agent-major: each agent's samples contiguous for per-agent training
+        save_dict['axis_order'] = axis_order
+        if axis_order == 'axt':
+            for field in ('observations', 'actions', 'rewards'):
+                save_dict[field] = np.ascontiguousarray(np.swapaxes(save_dict[field], 0, 1))
+
+        output_name = f"{scenario_name}_{quality_to_convert}_sample{n_timesteps}"
+        if layout == 'sharded':
+            output_file = output_path / output_name
+        elif layout == 'hdf5':
+            output_file = output_path / f"{output_name}.h5"
+        else:
+            output_file = output_path / f"{output_name}.npz"
         print(f"Saving to {output_file.name}...")
 
-        np.savez_compressed(output_file, **save_dict)
+        if layout == 'sharded':
+            save_npy_dir(output_file, save_dict.items())
+            size_bytes = sum(f.stat().st_size for f in output_file.iterdir())
+        else:
+            if layout == 'hdf5':
+                save_hdf5(output_file, save_dict)
+            else:
+                np.savez_compressed(output_file, **save_dict)
+            size_bytes = output_file.stat().st_size
+        drop_from_page_cache(output_file)
 
-        size_mb = output_file.stat().st_size / (1024 * 1024)
+        size_mb = size_bytes / (1024 * 1024)
         print(f"✓ Success! ({size_mb:.1f} MB)")
+        if layout == 'sharded':
+            print(f"  Load with: np.load('{output_file / 'observations.npy'}', mmap_mode='r')")
 
     except Exception as e:
         print(f"✗ Failed: {e}")
@@ -132,6 +193,13 @@ if __name__ == "__main__":
     parser.add_argument('--quality', help='Quality level')
     parser.add_argument('--max-timesteps', type=int, default=10000,
                        help='Max timesteps to sample (default: 10000)')
+    parser.add_argument('--layout', choices=['npz', 'sharded', 'hdf5'], default='npz',
+                       help='npz: one compressed file (default); sharded: directory with one '
+                            'memory-mappable .npy per field; hdf5: one .h5 file')
+    parser.add_argument('--axis-order', choices=['tax', 'axt'], default='tax',
+                       help='tax: (timesteps, agents, ...) as in the vault (default); '
+                            'axt: (agents, timesteps, ...) so each agent is contiguous')
 
     args = parser.parse_args()
-    convert_vault_sample(args.vault_path, args.output_dir, args.quality, args.max_timesteps)
+    convert_vault_sample(args.vault_path, args.output_dir, args.quality, args.max_timesteps,
+                         args.layout, args.axis_order)
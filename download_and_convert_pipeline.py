@@ -7,10 +7,22 @@ Simplified version that works correctly in Linux environment
 import os
 import sys
 import json
+import argparse
+import queue
 import shutil
+import platform
+import threading
+import subprocess
+import importlib.util
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
 import zipfile
 
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
 # Configuration
 ENVIRONMENTS = {
     # 'smac_v2': {
@@ -25,6 +37,18 @@ ENVIRONMENTS = {
     }
 }
 
+# Scenario ZIPs downloaded at the same time
+DOWNLOAD_WORKERS = 4
+
+# Timesteps read from the vault and written out at a time
+CHUNK_TIMESTEPS = 65536
+
+# Output buffer, so the small JSON envelope/separator writes coalesce
+WRITE_BUFFER = 4 << 20
+
+# Windows Python (e.g. launched from WSL) needs /mnt/<drive>/ paths converted
+_IS_WIN = platform.system() == "Windows"
+
 # COMMENTED OUT - Add back after testing:
 # 'smac_v1': {
 #     'scenarios': ['3m', '2s3z'],  # WARNING: 3m is 1.39 GB, 2s3z is also large
@@ -39,28 +63,161 @@ ENVIRONMENTS = {
 
 def wsl_to_windows_path(wsl_path):
     """Convert WSL path to Windows path if running Windows Python"""
-    import platform
-
-    # If we're running Windows Python, convert the path
-    if platform.system() == "Windows":
-        wsl_path = str(wsl_path)
-        # Convert /mnt/d/... to D:\...
-        if wsl_path.startswith("/mnt/"):
-            drive_letter = wsl_path[5].upper()
-            rest_of_path = wsl_path[6:].replace("/", "\\")
-            return f"{drive_letter}:{rest_of_path}"
+    if not _IS_WIN:
+        return wsl_path
+
+    # Convert /mnt/d/... to D:\...
+    wsl_path = str(wsl_path)
+    if wsl_path.startswith("/mnt/"):
+        drive_letter = wsl_path[5].upper()
+        rest_of_path = wsl_path[6:].replace("/", "\\")
+        return f"{drive_letter}:{rest_of_path}"
     return wsl_path
 
-def download_and_convert(output_dir="/mnt/d/og_marl_data"):
-    """Main function for WSL"""
+def extract_zip_parallel(zip_path, extract_dir, workers=None):
+    """
+    Extract a ZIP with several threads, each reading through its own handle
+
+    Members are deflated independently and zlib releases the GIL while
+    decompressing, so threads extract in parallel. ZipFile objects are not
+    thread-safe, hence one per worker.
+
+    Returns:
+        Member names in archive order
+    """
+    with zipfile.ZipFile(zip_path, 'r') as zf:
+        members = zf.infolist()
+
+    # Create the directory tree first so workers don't race on makedirs
+    for member in members:
+        parts = [p for p in member.filename.split('/')[:-1] if p not in ('', '.', '..')]
+        if parts:
+            os.makedirs(os.path.join(extract_dir, *parts), exist_ok=True)
+
+    workers = max(1, min(workers or os.cpu_count() or 1, len(members)))
+    # Largest members first, dealt round-robin, to even out the work
+    by_size = sorted(members, key=lambda m: m.file_size, reverse=True)
+    groups = [by_size[i::workers] for i in range(workers)]
+
+    def extract(group):
+        with zipfile.ZipFile(zip_path, 'r') as zf:
+            for member in group:
+                zf.extract(member, extract_dir)
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        list(pool.map(extract, groups))
+
+    return [member.filename for member in members]
+
+def _iter_chunks(fields):
+    """Yield (start, {name: chunk}) for CHUNK_TIMESTEPS timesteps of every field at a time"""
+    n_timesteps = next(iter(fields.values())).shape[0]
+    # An empty vault still yields one (empty) chunk so every writer emits a file
+    for start in range(0, max(n_timesteps, 1), CHUNK_TIMESTEPS):
+        stop = start + CHUNK_TIMESTEPS
+        yield start, {name: field.read(start, stop) for name, field in fields.items()}
+
+def _dumps(obj, pretty=False):
+    """Encode obj as JSON bytes, compact unless pretty"""
+    if orjson is not None:
+        option = orjson.OPT_SERIALIZE_NUMPY | (orjson.OPT_INDENT_2 if pretty else 0)
+        return orjson.dumps(obj, option=option)
+    if pretty:
+        return json.dumps(obj, indent=2).encode()
+    return json.dumps(obj, separators=(',', ':')).encode()
+
+def save_json(path, metadata, fields, pretty=False):
+    """
+    Stream fields as one JSON document with a {'t', 'obs', 'act', 'rew'[, 'state']} dict per timestep
+
+    Timesteps are encoded CHUNK_TIMESTEPS at a time, so memory holds one
+    chunk of step dicts rather than the whole trajectory list. Output is
+    compact unless pretty is set, which indents it for reading.
+    """
+    keys = ('t', *fields)
+    newline = b'\n' if pretty else b''
+    space = b' ' if pretty else b''
+    # The encoded list opens with "[" + newline and closes with newline + "]"
+    strip = 1 + len(newline)
+
+    from converters._vault_common import json_rows
+
+    with open(path, 'wb', buffering=WRITE_BUFFER) as f:
+        f.write(b'{' + newline + b'"metadata":' + space + _dumps(metadata, pretty) +
+                b',' + newline + b'"trajectories":' + space + b'[' + newline)
+        for start, chunk in _iter_chunks(fields):
+            # orjson encodes the NumPy rows directly; otherwise one bulk
+            # .tolist() per field instead of a slice + .tolist() per step
+            rows = [json_rows(values) for values in chunk.values()]
+            steps = [dict(zip(keys, (t, *values))) for t, values in enumerate(zip(*rows), start)]
+            if not steps:
+                continue
+            if start:
+                f.write(b',' + newline)
+            # Encode the whole chunk in one call and drop the list's own brackets
+            f.write(_dumps(steps, pretty)[strip:-strip])
+        f.write(newline + b']' + newline + b'}\n')
+
+def save_npz(path, metadata, fields):
+    """
+    Write fields to a compressed .npz with the same keys as export_vault_to_npz.py
+
+    Each field is streamed CHUNK_TIMESTEPS at a time; np.load reads the
+    result like any other .npz.
+    """
+    from converters._vault_common import save_npz_streaming
+
+    arrays = {'observations': fields['obs'], 'actions': fields['act'], 'rewards': fields['rew']}
+    if 'state' in fields:
+        arrays['states'] = fields['state']
+
+    save_npz_streaming(path, [*arrays.items(), *metadata.items()])
+
+def save_parquet(path, metadata, fields):
+    """Save fields as a Zstandard-compressed Parquet file, one row per timestep and one row group per chunk"""
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        print("Error: Parquet output needs pyarrow. Install with:")
+        print("  pip install pyarrow")
+        sys.exit(1)
+
+    # Imported here rather than at the top, as it needs numpy, which this
+    # script may only just have installed
+    from converters._vault_common import to_arrow_column
+
+    writer = None
+    for _, chunk in _iter_chunks(fields):
+        table = pa.table({name: to_arrow_column(array) for name, array in chunk.items()})
+        if writer is None:
+            schema = table.schema.with_metadata({'og_marl': json.dumps(metadata)})
+            writer = pq.ParquetWriter(path, schema, compression='zstd')
+        writer.write_table(table.cast(schema))
+    writer.close()
+
+def download_and_convert(output_dir="/mnt/d/og_marl_data", output_format='npz', pretty=False):
+    """
+    Main function for WSL
+
+    Args:
+        output_dir: Where converted files are written
+        output_format: 'npz' (compressed NumPy, default), 'parquet' (one row
+            per timestep, zstd) or 'json' (readable, much larger and slower)
+        pretty: Indent JSON output (compact by default)
+    """
+    # Multi-connection downloads when hf_transfer is installed (huggingface_hub
+    # refuses to download if the flag is set without it)
+    if importlib.util.find_spec('hf_transfer') is not None:
+        os.environ.setdefault('HF_HUB_ENABLE_HF_TRANSFER', '1')
+
     from huggingface_hub import hf_hub_download
     from flashbax.vault import Vault
-    import jax
-    import numpy as np
-    import platform
+
+    from converters._vault_common import open_vault_fields
 
     # Convert to Windows path if using Windows Python
-    if platform.system() == "Windows":
+    if _IS_WIN:
         output_dir = wsl_to_windows_path(output_dir)
         print(f"🪟 Detected Windows Python - converted path to: {output_dir}")
 
@@ -71,31 +228,55 @@ def download_and_convert(output_dir="/mnt/d/og_marl_data"):
 
     print(f"📁 Output directory: {output_path}")
     
-    for env_name, config in ENVIRONMENTS.items():
-        print(f"\n📦 Processing {env_name}")
-        
-        for scenario in config['scenarios']:
-            # Download ZIP
-            zip_file = f"{config['folder']}/{scenario}.zip"
-            print(f"  📥 Downloading {zip_file}...")
-            
-            try:
-                local_zip = hf_hub_download(
+    # Download every scenario ZIP concurrently; download, extraction and
+    # conversion of different scenarios overlap
+    with ThreadPoolExecutor(max_workers=DOWNLOAD_WORKERS) as pool:
+        futures = {}
+        for env_name, config in ENVIRONMENTS.items():
+            for scenario in config['scenarios']:
+                zip_file = f"{config['folder']}/{scenario}.zip"
+                print(f"  📥 Downloading {zip_file}...")
+                future = pool.submit(
+                    hf_hub_download,
                     repo_id="InstaDeepAI/og-marl",
                     repo_type="dataset",
                     filename=zip_file,
                     local_dir=str(temp_dir)
                 )
-                print(f"  ✅ Downloaded to: {local_zip}")
+                futures[future] = (env_name, config, scenario)
 
-                # Extract ZIP
-                extract_dir = temp_dir / scenario
-                extract_dir.mkdir(exist_ok=True)
-                print(f"  📂 Extracting to: {extract_dir}")
+        # Extract in a background thread while this one converts; the bounded
+        # queue caps how many extracted scenarios wait on disk
+        extracted_queue = queue.Queue(maxsize=2)
 
-                with zipfile.ZipFile(local_zip, 'r') as zf:
-                    zf.extractall(extract_dir)
-                    print(f"  📂 Extracted files: {zf.namelist()[:5]}...")  # Show first 5 files
+        def extract_stage():
+            for future in as_completed(futures):
+                env_name, config, scenario = futures[future]
+                try:
+                    local_zip = future.result()
+                    print(f"  ✅ Downloaded to: {local_zip}")
+
+                    # Extract ZIP
+                    extract_dir = temp_dir / scenario
+                    extract_dir.mkdir(exist_ok=True)
+                    print(f"  📂 Extracting to: {extract_dir}")
+
+                    extracted = extract_zip_parallel(local_zip, extract_dir)
+                    print(f"  📂 Extracted files: {extracted[:5]}...")  # Show first 5 files
+                    extracted_queue.put((env_name, config, scenario, extract_dir, None))
+                except Exception as e:
+                    extracted_queue.put((env_name, config, scenario, None, e))
+            extracted_queue.put(None)
+
+        threading.Thread(target=extract_stage, daemon=True).start()
+
+        while (item := extracted_queue.get()) is not None:
+            env_name, config, scenario, extract_dir, error = item
+            print(f"\n📦 Processing {env_name}/{scenario}")
+
+            try:
+                if error is not None:
+                    raise error
 
                 # Find vault directory
                 print(f"  🔍 Looking for .vlt directories in {extract_dir}")
@@ -129,54 +310,47 @@ def download_and_convert(output_dir="/mnt/d/og_marl_data"):
                     if quality_path.exists():
                         print(f"  🔄 Converting {scenario}/{quality}...")
 
-                        # Load vault - works directly in Linux/WSL
+                        # Open vault - works directly in Linux/WSL; data is read chunk by chunk
                         vault = Vault(str(vault_dir), vault_uid=quality)
-                        experience = vault.read().experience
-                        data = jax.tree.map(lambda x: np.array(x), experience)
+                        data = open_vault_fields(vault, CHUNK_TIMESTEPS)
 
                         # Extract metadata
-                        n_timesteps = data['observations'].shape[1]
-                        n_agents = data['observations'].shape[2]
+                        n_timesteps = data['observations'].shape[0]
+                        n_agents = data['observations'].shape[1]
 
                         print(f"    📊 {n_timesteps} timesteps, {n_agents} agents")
-                        print(f"    📊 Data shapes:")
+                        print(f"    📊 Data shapes (batch 0):")
                         print(f"       Observations: {data['observations'].shape}")
                         print(f"       Actions: {data['actions'].shape}")
                         print(f"       Rewards: {data['rewards'].shape}")
 
                         # Export ALL timesteps
-                        max_t = n_timesteps
-                        print(f"    💾 Exporting all {max_t} timesteps (this may take a while)...")
-                        trajectories = []
-
-                        for t in range(max_t):
-                            step = {
-                                't': t,
-                                'obs': data['observations'][0, t].tolist(),
-                                'act': data['actions'][0, t].tolist(),
-                                'rew': data['rewards'][0, t].tolist()
-                            }
-                            if 'infos' in data and 'state' in data['infos']:
-                                step['state'] = data['infos']['state'][0, t].tolist()
-                            trajectories.append(step)
-
-                        # Save JSON
-                        output_file = output_path / f"{env_name}_{scenario}_{quality}.json"
-                        output = {
-                            'metadata': {
-                                'env': env_name,
-                                'scenario': scenario,
-                                'quality': quality,
-                                'n_agents': int(n_agents),
-                                'n_timesteps': int(n_timesteps),
-                                'obs_dim': int(data['observations'].shape[-1]),
-                                'act_dim': int(data['actions'].shape[-1]) if 'actions' in data else None
-                            },
-                            'trajectories': trajectories
+                        metadata = {
+                            'env': env_name,
+                            'scenario': scenario,
+                            'quality': quality,
+                            'n_agents': int(n_agents),
+                            'n_timesteps': int(n_timesteps),
+                            'obs_dim': int(data['observations'].shape[-1]),
+                            'act_dim': int(data['actions'].shape[-1])
+                        }
+                        fields = {
+                            'obs': data['observations'],
+                            'act': data['actions'],
+                            'rew': data['rewards'],
                         }
+                        if 'infos' in data and 'state' in data['infos']:
+                            fields['state'] = data['infos']['state']
 
-                        with open(output_file, 'w') as f:
-                            json.dump(output, f, indent=2)
+                        output_file = output_path / f"{env_name}_{scenario}_{quality}.{output_format}"
+                        print(f"    💾 Exporting all {n_timesteps} timesteps to {output_file.name}...")
+
+                        if output_format == 'npz':
+                            save_npz(output_file, metadata, fields)
+                        elif output_format == 'parquet':
+                            save_parquet(output_file, metadata, fields)
+                        else:
+                            save_json(output_file, metadata, fields, pretty)
 
                         size_mb = output_file.stat().st_size / (1024*1024)
                         print(f"    ✅ Saved {output_file.name} ({size_mb:.1f} MB)")
@@ -194,9 +368,18 @@ def download_and_convert(output_dir="/mnt/d/og_marl_data"):
     print(f"\n✅ Done! Data saved to {output_path}")
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Download OG-MARL vaults and convert them')
+    parser.add_argument('output_dir', nargs='?', help='Output directory (default: first usable drive)')
+    parser.add_argument('--format', choices=['npz', 'parquet', 'json'], default='npz',
+                        help='npz: compressed NumPy (default); parquet: one zstd row per timestep; '
+                             'json: readable but many times larger')
+    parser.add_argument('--pretty', action='store_true',
+                        help='Indent JSON output for inspection (compact by default)')
+    args = parser.parse_args()
+
     # Get output directory with smart defaults
-    if len(sys.argv) > 1:
-        output_dir = sys.argv[1]
+    if args.output_dir:
+        output_dir = args.output_dir
     else:
         # Try multiple fallback locations
         candidates = [
@@ -222,8 +405,11 @@ if __name__ == "__main__":
     print("📊 OG-MARL WSL Downloader")
     print(f"Will save to: {output_dir}")
     
-    # Install requirements
-    os.system("pip install -q huggingface-hub flashbax jax numpy")
+    # Install requirements only if one is missing; find_spec checks without
+    # paying for the (slow) jax import here
+    if any(importlib.util.find_spec(m) is None for m in ('huggingface_hub', 'flashbax', 'jax', 'numpy')):
+        subprocess.check_call([sys.executable, '-m', 'pip', 'install', '-q', '--disable-pip-version-check',
+                               'huggingface-hub', 'hf_transfer', 'flashbax', 'jax', 'numpy'])
     
     # Run
-    download_and_convert(output_dir)
\ No newline at end of file
+    download_and_convert(output_dir, args.format, args.pretty)
\ No newline at end of file
@@ -12,45 +12,68 @@ import warnings
 
 import numpy as np
 
+from converters._vault_common import json_rows, reduce_precision
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
 # Suppress warnings
 warnings.filterwarnings('ignore')
 
 
+def _list_arrays(vault_path: str) -> dict:
+    """Map each array name in the vault (e.g., 'actions') to its directory."""
+    # Each top-level directory is one array; list only that level rather
+    # than walking every chunk file below it
+    with os.scandir(vault_path) as entries:
+        return {
+            entry.name: Path(entry.path)
+            for entry in entries
+            if entry.is_dir() and not entry.name.startswith('.')
+        }
+
+
+def _zarr_spec(data_dir: Path) -> dict:
+    """Tensorstore spec for one vault array."""
+    # Use POSIX path for tensorstore
+    return {
+        'driver': 'zarr',
+        'kvstore': {
+            'driver': 'file',
+            'path': str(data_dir).replace('\\', '/')
+        }
+    }
+
+
 def load_vault_data_direct(vault_path: str):
     """Load vault data using direct tensorstore access."""
     import tensorstore as ts
 
-    # Find all data files
-    replay_dir = Path(vault_path)
-
-    # Look for the structure
-    data_files = {}
+    data_files = _list_arrays(vault_path)
 
-    # Navigate the vault structure
-    for item in replay_dir.rglob('*'):
-        if item.is_file() and not item.name.startswith('.'):
-            # Get relative path from vault root
-            rel_path = item.relative_to(replay_dir)
-            parts = list(rel_path.parts)
-            if len(parts) >= 2:
-                key = parts[0]  # e.g., 'actions', 'observations'
-                data_files[key] = item.parent
-
-    # Load each data array
+    # Load each data array. Every open, then every read, is submitted before
+    # blocking on any result, so tensorstore decodes all arrays concurrently
     vault_data = {}
+    pending = {}
 
     for key, data_dir in data_files.items():
         try:
-            # Use POSIX path for tensorstore
-            spec = {
-                'driver': 'zarr',
-                'kvstore': {
-                    'driver': 'file',
-                    'path': str(data_dir).replace('\\', '/')
-                }
-            }
-            dataset = ts.open(spec).result()
-            vault_data[key] = np.array(dataset.read().result())
+            pending[key] = ts.open(_zarr_spec(data_dir))
+        except Exception as e:
+            print(f"Warning: Could not load {key}: {e}")
+
+    for key, future in list(pending.items()):
+        try:
+            pending[key] = future.result().read()
+        except Exception as e:
+            del pending[key]
+            print(f"Warning: Could not load {key}: {e}")
+
+    for key, future in pending.items():
+        try:
+            vault_data[key] = np.asarray(future.result())
             print(f"Loaded {key}: shape {vault_data[key].shape}")
         except Exception as e:
             print(f"Warning: Could not load {key}: {e}")
@@ -58,6 +81,146 @@ def load_vault_data_direct(vault_path: str):
     return vault_data
 
 
+# Arrays the exporters use, and therefore the ones worth caching
+EXPORT_KEYS = ('actions', 'terminals', 'rewards')
+
+# Timesteps copied from tensorstore into the cache at a time
+CACHE_CHUNK_TIMESTEPS = 65536
+
+# Timesteps formatted per call by the text export
+TEXT_BLOCK_TIMESTEPS = 4096
+
+
+# Per-array metadata files, which change whenever an array is recreated
+ARRAY_METADATA_FILES = ('.zarray', '.zattrs', 'zarr.json')
+
+
+def _vault_mtime_ns(vault_path: str) -> int:
+    """
+    Newest modification time of the vault's directories and metadata files.
+
+    Tensorstore's file kvstore writes every chunk to a temporary file and
+    renames it into place, which bumps the array directory's mtime, so the
+    chunk files themselves never need to be visited.
+    """
+    newest = os.stat(vault_path).st_mtime_ns
+    with os.scandir(vault_path) as entries:
+        for entry in entries:
+            newest = max(newest, entry.stat().st_mtime_ns)
+            if not entry.is_dir():
+                continue
+            for name in ARRAY_METADATA_FILES:
+                try:
+                    newest = max(newest, os.stat(os.path.join(entry.path, name)).st_mtime_ns)
+                except FileNotFoundError:
+                    pass
+    return newest
+
+
+def _read_to_npy(store, path: Path):
+    """
+    Copy a tensorstore array into a .npy file a block of timesteps at a time.
+
+    The file is written through a memory map and the next block is read
+    while the current one is copied, so at most two blocks are in memory
+    however large the array is. Returns the file memory-mapped read-only.
+    """
+    out = np.lib.format.open_memmap(
+        path, mode='w+', dtype=store.dtype.numpy_dtype, shape=tuple(store.shape)
+    )
+    # Vault arrays are (1, timesteps, ...): block along the timestep axis,
+    # clamping the last block, as tensorstore rejects slices past the end
+    axis = 1 if out.ndim > 1 else 0
+    n = out.shape[axis]
+    blocks = [
+        (slice(None),) * axis + (slice(start, min(start + CACHE_CHUNK_TIMESTEPS, n)),)
+        for start in range(0, n, CACHE_CHUNK_TIMESTEPS)
+    ]
+
+    future = store[blocks[0]].read() if blocks else None
+    for i, block in enumerate(blocks):
+        data = future.result()
+        if i + 1 < len(blocks):
+            future = store[blocks[i + 1]].read()
+        out[block] = data
+    out.flush()
+    del out
+
+    return np.load(path, mmap_mode='r')
+
+
+def load_vault_data_cached(vault_path: str):
+    """
+    Load the exported arrays, cached as memory-mapped .npy files.
+
+    The arrays are saved to a hidden directory next to the vault and reused,
+    without decoding the vault again, for as long as nothing in the vault
+    has changed since. On a cache miss they are streamed from tensorstore
+    straight into the cache files, so vaults larger than RAM can be exported
+    and only the pages an exporter touches are ever resident.
+    """
+    vault = Path(vault_path)
+    cache_dir = vault.parent / f'.{vault.name}_export_cache'
+    stamp_file = cache_dir / 'vault_mtime'
+    stamp = str(_vault_mtime_ns(vault_path))
+
+    try:
+        if stamp_file.read_text() == stamp:
+            vault_data = {f.stem: np.load(f, mmap_mode='r') for f in cache_dir.glob('*.npy')}
+            print(f"Loaded {', '.join(vault_data)} from cache {cache_dir}")
+            return vault_data
+    except OSError:
+        pass
+
+    import tensorstore as ts
+
+    data_files = _list_arrays(vault_path)
+    if 'actions' not in data_files:
+        return load_vault_data_direct(vault_path)
+
+    # Open the exported arrays concurrently, then stream them one at a time
+    pending = {}
+    for key in EXPORT_KEYS:
+        if key in data_files:
+            try:
+                pending[key] = ts.open(_zarr_spec(data_files[key]))
+            except Exception as e:
+                print(f"Warning: Could not load {key}: {e}")
+
+    try:
+        cache_dir.mkdir(exist_ok=True)
+        stamp_file.unlink(missing_ok=True)
+        for old in cache_dir.glob('*.npy'):
+            old.unlink()
+    except OSError as e:
+        print(f"Warning: Could not cache vault data: {e}")
+        return load_vault_data_direct(vault_path)
+
+    vault_data = {}
+    for key, future in pending.items():
+        npy_path = cache_dir / f'{key}.npy'
+        try:
+            vault_data[key] = _read_to_npy(future.result(), npy_path)
+            print(f"Loaded {key}: shape {vault_data[key].shape}")
+        except OSError as e:
+            print(f"Warning: Could not cache vault data: {e}")
+            return load_vault_data_direct(vault_path)
+        except Exception as e:
+            npy_path.unlink(missing_ok=True)
+            print(f"Warning: Could not load {key}: {e}")
+
+    if 'actions' not in vault_data:
+        return vault_data
+
+    # Stamp last, so an interrupted write is never mistaken for a valid cache
+    try:
+        stamp_file.write_text(stamp)
+    except OSError as e:
+        print(f"Warning: Could not cache vault data: {e}")
+
+    return vault_data
+
+
 def load_vault_data_simple(vault_path: str):
     """Try loading vault with simpler approach."""
     from flashbax.vault import Vault
@@ -82,51 +245,81 @@ def load_vault_data_simple(vault_path: str):
     return all_data.experience
 
 
-def export_actions_to_json(vault_data: dict, output_path: str) -> None:
-    """Export actions to JSON format."""
-    # Handle different possible structures
-    if isinstance(vault_data, dict):
-        if 'actions' in vault_data:
-            actions = np.array(vault_data['actions'])
-            terminals = np.array(vault_data.get('terminals', None))
-        else:
-            print("Available keys:", list(vault_data.keys()))
-            return
+def _prepare(vault_data: dict) -> dict:
+    """
+    Convert actions/terminals/rewards to arrays once for every exporter.
+
+    A leading batch dimension of size 1 is dropped by indexing, so the
+    arrays are views of the loaded data rather than copies. Missing keys
+    are left out.
+    """
+    prepared = {}
+    for key in ('actions', 'terminals', 'rewards'):
+        if vault_data.get(key) is None:
+            continue
+        array = np.asarray(vault_data[key])
+        # Remove batch dimension if present
+        if array.ndim >= 3 and array.shape[0] == 1:
+            array = array[0]
+        prepared[key] = array
+    return prepared
+
+
+def _episode_bounds(terminals, num_timesteps: int):
+    """
+    Split timesteps into episodes with one vectorized pass over terminals.
+
+    Returns:
+        (ends_episode, bounds): a bool array marking timesteps where any agent
+        terminated, and a (start, stop, terminated) tuple per episode, the last
+        one possibly unterminated
+    """
+    if terminals is None:
+        ends_episode = np.zeros(num_timesteps, dtype=bool)
     else:
-        actions = np.array(vault_data)
-        terminals = None
+        ends_episode = terminals.reshape(num_timesteps, -1).any(axis=1)
+
+    stops = (np.flatnonzero(ends_episode) + 1).tolist()
+    if not stops or stops[-1] != num_timesteps:
+        stops.append(num_timesteps)
+    starts = [0] + stops[:-1]
 
-    # Remove batch dimension if present
-    if len(actions.shape) == 3 and actions.shape[0] == 1:
-        actions = actions[0]
-    if terminals is not None and len(terminals.shape) == 3 and terminals.shape[0] == 1:
-        terminals = terminals[0]
+    bounds = [(start, stop, bool(ends_episode[stop - 1]))
+              for start, stop in zip(starts, stops) if stop > start]
+    return ends_episode, bounds
+
+
+def export_actions_to_json(vault_data: dict, output_path: str, episodes: tuple = None,
+                           precision: str = 'full') -> None:
+    """
+    Export actions to JSON format.
+
+    vault_data is as returned by _prepare; episodes is the (ends_episode,
+    bounds) pair returned by _episode_bounds (computed if omitted);
+    precision is 'full', 'half' or 'int8' (see reduce_precision).
+    """
+    actions = vault_data['actions']
 
     print(f"Processing actions with shape: {actions.shape}")
+    actions, scale = reduce_precision(actions, precision)
 
-    # Split into episodes
+    # Split into episodes; the episode arrays are handed to orjson as-is
+    # (or converted with one .tolist() per episode)
+    if episodes is None:
+        episodes = _episode_bounds(vault_data.get('terminals'), len(actions))
+    _, bounds = episodes
     episodes = []
-    episode_actions = []
-
-    for t in range(len(actions)):
-        episode_actions.append(actions[t].tolist())
-
-        if terminals is not None and terminals[t].any():
-            episodes.append({
-                'episode_num': len(episodes),
-                'length': len(episode_actions),
-                'actions': episode_actions
-            })
-            episode_actions = []
-
-    # Add remaining actions if episode didn't terminate
-    if episode_actions:
-        episodes.append({
+
+    for start, stop, terminated in bounds:
+        episode = {
             'episode_num': len(episodes),
-            'length': len(episode_actions),
-            'actions': episode_actions,
-            'incomplete': True
-        })
+            'length': stop - start,
+            'actions': json_rows(actions[start:stop])
+        }
+        # Mark remaining actions if episode didn't terminate
+        if not terminated:
+            episode['incomplete'] = True
+        episodes.append(episode)
 
     output_data = {
         'total_timesteps': len(actions),
@@ -134,25 +327,31 @@ def export_actions_to_json(vault_data: dict, output_path: str) -> None:
         'num_episodes': len(episodes),
         'episodes': episodes
     }
+    if scale is not None:
+        output_data['action_scale'] = scale
 
-    with open(output_path, 'w') as f:
-        json.dump(output_data, f, indent=2)
+    if orjson is not None:
+        with open(output_path, 'wb') as f:
+            f.write(orjson.dumps(output_data, option=orjson.OPT_INDENT_2 | orjson.OPT_SERIALIZE_NUMPY))
+    else:
+        with open(output_path, 'w') as f:
+            json.dump(output_data, f, indent=2)
 
     print(f"✓ Exported {len(episodes)} episodes to {output_path}")
 
 
-def export_actions_to_csv(vault_data: dict, output_path: str) -> None:
-    """Export actions to CSV format."""
-    import csv
+def export_actions_to_csv(vault_data: dict, output_path: str, episodes: tuple = None,
+                          precision: str = 'full') -> None:
+    """
+    Export actions to CSV format.
 
-    actions = np.array(vault_data['actions'])
-    terminals = np.array(vault_data.get('terminals', None))
+    Arguments are as for export_actions_to_json; with precision 'int8' the
+    per-agent scales go to a .scale.json file next to the CSV.
+    """
+    import csv
 
-    # Remove batch dimension if present
-    if len(actions.shape) == 3 and actions.shape[0] == 1:
-        actions = actions[0]
-    if terminals is not None and len(terminals.shape) == 3 and terminals.shape[0] == 1:
-        terminals = terminals[0]
+    actions = vault_data['actions']
+    terminals = vault_data.get('terminals')
 
     num_timesteps = len(actions)
     num_agents = actions.shape[1] if len(actions.shape) > 1 else 1
@@ -167,73 +366,100 @@ def export_actions_to_csv(vault_data: dict, output_path: str) -> None:
             header.append('episode_end')
         writer.writerow(header)
 
-        # Write data
-        episode_num = 0
-        for t in range(num_timesteps):
-            row = [t, episode_num]
-            if len(actions.shape) > 1:
-                row.extend(actions[t].tolist())
-            else:
-                row.append(float(actions[t]))
-
-            if terminals is not None:
-                is_terminal = bool(terminals[t].any())
-                row.append(is_terminal)
-                if is_terminal:
-                    episode_num += 1
-            writer.writerow(row)
+        # Write data; a timestep's episode number counts the terminals before it
+        if episodes is None:
+            episodes = _episode_bounds(terminals, num_timesteps)
+        ends_episode, _ = episodes
+        episode_nums = (np.cumsum(ends_episode) - ends_episode).tolist()
+        ends_episode = ends_episode.tolist()
+        actions, scale = reduce_precision(actions, precision)
+        if scale is not None:
+            with open(Path(output_path).with_suffix('.scale.json'), 'w') as scale_file:
+                json.dump({'action_scale': scale}, scale_file, indent=2)
+        if len(actions.shape) > 1:
+            action_rows = actions.tolist()
+        else:
+            action_rows = [[float(a)] for a in actions.tolist()]
+
+        # All rows in one writerows() call: the C csv writer formats them in bulk
+        if terminals is not None:
+            writer.writerows([t, episode_nums[t], *action_rows[t], ends_episode[t]]
+                             for t in range(num_timesteps))
+        else:
+            writer.writerows([t, episode_nums[t], *action_rows[t]] for t in range(num_timesteps))
 
     print(f"✓ Exported {num_timesteps} timesteps to {output_path}")
 
 
-def export_actions_to_txt(vault_data: dict, output_path: str) -> None:
-    """Export actions to human-readable text format."""
-    actions = np.array(vault_data['actions'])
-    terminals = np.array(vault_data.get('terminals', None))
-    rewards = np.array(vault_data.get('rewards', None))
+def _row_format(shape: tuple, spec: str) -> str:
+    """printf template for one array of the given shape, bracketed like str(list)."""
+    if not shape:
+        return spec
+    inner = _row_format(shape[1:], spec)
+    return '[' + ', '.join([inner] * shape[0]) + ']'
+
 
-    # Remove batch dimension if present
-    if len(actions.shape) == 3 and actions.shape[0] == 1:
-        actions = actions[0]
-    if terminals is not None and len(terminals.shape) == 3 and terminals.shape[0] == 1:
-        terminals = terminals[0]
-    if rewards is not None and len(rewards.shape) == 3 and rewards.shape[0] == 1:
-        rewards = rewards[0]
+def export_actions_to_txt(vault_data: dict, output_path: str, episodes: tuple = None) -> None:
+    """Export actions to human-readable text format (episodes as for export_actions_to_json)."""
+    actions = vault_data['actions']
+    terminals = vault_data.get('terminals')
+    rewards = vault_data.get('rewards')
+
+    # One printf template per timestep, applied to a block of timesteps in a
+    # single % call rather than a .tolist() and repr() per float. Floats are
+    # written with 4 decimals
+    integer_actions = actions.dtype == bool or np.issubdtype(actions.dtype, np.integer)
+    step_format = ("\nTimestep %d (Episode step %d):\n  Joint Action: " +
+                   _row_format(actions.shape[1:], '%d' if integer_actions else '%.4f') + "\n")
+    if rewards is not None:
+        return_format = _row_format(rewards.shape[1:], '%.4f')
+        step_format += "  Rewards: " + return_format + "\n"
 
     with open(output_path, 'w') as f:
         f.write("=" * 80 + "\n")
         f.write("JOINT ACTION TRAJECTORIES\n")
         f.write("=" * 80 + "\n\n")
 
-        episode_num = 0
-        episode_start = 0
-        episode_return = np.zeros(actions.shape[1] if len(actions.shape) > 1 else 1)
-
-        for t in range(len(actions)):
-            if t == episode_start:
-                f.write(f"\n{'=' * 80}\n")
-                f.write(f"EPISODE {episode_num}\n")
-                f.write(f"{'=' * 80}\n")
-
-            f.write(f"\nTimestep {t} (Episode step {t - episode_start}):\n")
-            f.write(f"  Joint Action: {actions[t].tolist()}\n")
-
-            if rewards is not None:
-                f.write(f"  Rewards: {rewards[t].tolist()}\n")
-                episode_return += rewards[t]
+        if episodes is None:
+            episodes = _episode_bounds(terminals, len(actions))
+        _, bounds = episodes
+
+        # Every episode's return in one reduceat over the episode starts
+        if rewards is not None and bounds:
+            starts = [episode_start for episode_start, _, _ in bounds]
+            returns = np.add.reduceat(rewards[:len(actions)], starts, axis=0, dtype=np.float64)
+
+        for episode_num, (episode_start, episode_stop, terminated) in enumerate(bounds):
+            f.write(f"\n{'=' * 80}\n")
+            f.write(f"EPISODE {episode_num}\n")
+            f.write(f"{'=' * 80}\n")
+
+            for start in range(episode_start, episode_stop, TEXT_BLOCK_TIMESTEPS):
+                stop = min(start + TEXT_BLOCK_TIMESTEPS, episode_stop)
+                n = stop - start
+                columns = [np.arange(start, stop), np.arange(start, stop) - episode_start,
+                           actions[start:stop].reshape(n, -1)]
+                if rewards is not None:
+                    columns.append(rewards[start:stop].reshape(n, -1))
+                values = np.column_stack(columns).ravel().tolist()
+                f.write((step_format * n) % tuple(values))
 
-            if terminals is not None and terminals[t].any():
+            if terminated:
                 f.write(f"\n  >>> EPISODE END <<<\n")
-                f.write(f"  Episode Length: {t - episode_start + 1}\n")
+                f.write(f"  Episode Length: {episode_stop - episode_start}\n")
                 if rewards is not None:
-                    f.write(f"  Episode Return: {episode_return.tolist()}\n")
-                episode_num += 1
-                episode_start = t + 1
-                episode_return = np.zeros(actions.shape[1] if len(actions.shape) > 1 else 1)
+                    f.write(f"  Episode Return: {return_format % tuple(returns[episode_num].ravel().tolist())}\n")
 
     print(f"✓ Exported readable text format to {output_path}")
 
 
+def export_actions_to_npz(vault_data: dict, output_path: str) -> None:
+    """Export actions (plus terminals/rewards when present) to compressed NumPy format."""
+    np.savez_compressed(output_path, **vault_data)
+
+    print(f"✓ Exported {len(vault_data['actions'])} timesteps to {output_path}")
+
+
 def main():
     parser = argparse.ArgumentParser(
         description='Export joint action trajectories from vaults to readable formats'
@@ -253,9 +479,9 @@ def main():
     parser.add_argument(
         '--format',
         type=str,
-        choices=['csv', 'json', 'txt', 'all'],
+        choices=['csv', 'json', 'txt', 'npz', 'all'],
         default='json',
-        help='Export format'
+        help='Export format (npz keeps the arrays binary: far smaller and faster to load)'
     )
     parser.add_argument(
         '--method',
@@ -264,6 +490,19 @@ def main():
         default='direct',
         help='Loading method (direct uses tensorstore, flashbax uses Vault API)'
     )
+    parser.add_argument(
+        '--no-cache',
+        action='store_true',
+        help='Always decode the vault instead of reusing the cached arrays of a direct load'
+    )
+    parser.add_argument(
+        '--precision',
+        type=str,
+        choices=['full', 'half', 'int8'],
+        default='full',
+        help='Action precision for csv/json: full (default), half (float16, 4 decimals) '
+             'or int8 (quantized, with per-agent scales)'
+    )
 
     args = parser.parse_args()
 
@@ -273,9 +512,11 @@ def main():
     # Load vault
     print(f"Loading vault from {args.vault_path}...")
 
+    load_direct = load_vault_data_direct if args.no_cache else load_vault_data_cached
+
     try:
         if args.method == 'direct':
-            vault_data = load_vault_data_direct(args.vault_path)
+            vault_data = load_direct(args.vault_path)
         else:
             vault_data = load_vault_data_simple(args.vault_path)
             # Convert to dict if needed
@@ -289,7 +530,7 @@ def main():
         print(f"Error loading vault: {e}")
         print("\nTrying alternative method...")
         try:
-            vault_data = load_vault_data_direct(args.vault_path)
+            vault_data = load_direct(args.vault_path)
         except Exception as e2:
             print(f"Failed with alternative method too: {e2}")
             return
@@ -298,30 +539,40 @@ def main():
         print("Error: Could not load action data from vault")
         return
 
+    # Convert once; every exporter below shares these arrays
+    vault_data = _prepare(vault_data)
+
     # Print summary
-    actions = np.array(vault_data['actions'])
-    if len(actions.shape) == 3:
-        actions = actions[0]
+    actions = vault_data['actions']
     print(f"\nVault Summary:")
     print(f"  Total timesteps: {actions.shape[0]}")
     print(f"  Number of agents: {actions.shape[1] if len(actions.shape) > 1 else 1}")
     print(f"  Action shape: {actions.shape}")
     print()
 
+    # Episode boundaries are shared by every exporter: scan terminals once
+    episodes = _episode_bounds(vault_data.get('terminals'), actions.shape[0])
+
     # Export to requested format(s)
     base_name = Path(args.vault_path).parent.stem + "_" + Path(args.vault_path).stem
 
     if args.format in ['csv', 'all']:
         csv_path = os.path.join(args.output_dir, f'{base_name}_actions.csv')
-        export_actions_to_csv(vault_data, csv_path)
+        export_actions_to_csv(vault_data, csv_path, episodes=episodes,
+                              precision=args.precision)
 
     if args.format in ['json', 'all']:
         json_path = os.path.join(args.output_dir, f'{base_name}_actions.json')
-        export_actions_to_json(vault_data, json_path)
+        export_actions_to_json(vault_data, json_path, episodes=episodes,
+                               precision=args.precision)
 
     if args.format in ['txt', 'all']:
         txt_path = os.path.join(args.output_dir, f'{base_name}_actions.txt')
-        export_actions_to_txt(vault_data, txt_path)
+        export_actions_to_txt(vault_data, txt_path, episodes=episodes)
+
+    if args.format in ['npz', 'all']:
+        npz_path = os.path.join(args.output_dir, f'{base_name}_actions.npz')
+        export_actions_to_npz(vault_data, npz_path)
 
     print(f"\n✓ All exports completed! Files saved to: {args.output_dir}")
 
@@ -13,8 +13,27 @@ import warnings
 import numpy as np
 import tensorstore as ts
 
+from converters._vault_common import json_rows, reduce_precision
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
 warnings.filterwarnings('ignore')
 
+# Timesteps formatted per call by the text export
+TEXT_BLOCK_TIMESTEPS = 4096
+
+# Rows formatted per write by the CSV export
+CSV_BLOCK_ROWS = 8192
+
+# Cache shared by every array opened from one vault
+TS_CACHE_BYTES = 1 << 30
+
+# Arrays the exporters use; observations, the largest, are never read
+EXPORT_KEYS = ('actions', 'terminals', 'rewards')
+
 
 def load_vault_metadata(vault_path: str):
     """Load vault metadata to understand structure."""
@@ -36,47 +55,99 @@ def parse_shape_string(shape_str: str):
     return tuple(int(x.strip()) for x in shape_str.split(','))
 
 
-def load_tensorstore_array(base_path: str, key_path: list):
-    """Load a single array from tensorstore using OCDBT format."""
-    # Construct the tensorstore path
-    ts_path = str(Path(base_path)).replace('\\', '/')
-
-    # Build the key path for nested structures
-    full_key = '/'.join(key_path)
-
-    # Tensorstore spec for OCDBT format
-    spec = {
+def _ocdbt_spec(ts_path: str, full_key: str, alternative: bool = False) -> dict:
+    """Tensorstore spec for one array of an OCDBT vault (two equivalent spellings)."""
+    if alternative:
+        return {
+            'driver': 'ocdbt',
+            'kvstore': {
+                'driver': 'file',
+                'path': ts_path
+            },
+            'path': full_key,
+        }
+    return {
         'driver': 'ocdbt',
         'base': f'file://{ts_path}/',
         'path': full_key,
     }
 
+
+def _open(spec: dict, context):
+    """Open a tensorstore in the shared context; vault metadata never changes while loading."""
+    return ts.open(spec, context=context, recheck_cached_metadata=False)
+
+
+def _load_alternative(ts_path: str, full_key: str, context):
+    """Retry loading one array with the alternative spec."""
     try:
-        dataset = ts.open(spec).result()
-        data = np.array(dataset.read().result())
-        return data
-    except Exception as e:
-        print(f"Error loading {full_key}: {e}")
-        # Try alternative spec
+        dataset = _open(_ocdbt_spec(ts_path, full_key, alternative=True), context).result()
+        return np.asarray(dataset.read().result())
+    except Exception as e2:
+        print(f"Alternative method also failed for {full_key}: {e2}")
+        return None
+
+
+def load_tensorstore_arrays(base_path: str, key_paths: list) -> dict:
+    """
+    Load several arrays from tensorstore using OCDBT format.
+
+    Every open, then every read, is submitted before blocking on any result,
+    so the arrays load concurrently rather than one after another. All of
+    them share one tensorstore context, so the OCDBT manifest and B-tree
+    nodes are read once and then served from its cache.
+
+    Returns:
+        Dict mapping each '/'-joined key path to its array (None if it failed)
+    """
+    # Construct the tensorstore path
+    ts_path = str(Path(base_path)).replace('\\', '/')
+
+    # Build the key paths for nested structures
+    full_keys = ['/'.join(key_path) for key_path in key_paths]
+
+    context = ts.Context({'cache_pool': {'total_bytes_limit': TS_CACHE_BYTES}})
+    arrays = {}
+    pending = {}
+    failed = []
+
+    for full_key in full_keys:
         try:
-            spec = {
-                'driver': 'ocdbt',
-                'kvstore': {
-                    'driver': 'file',
-                    'path': ts_path
-                },
-                'path': full_key,
-            }
-            dataset = ts.open(spec).result()
-            data = np.array(dataset.read().result())
-            return data
-        except Exception as e2:
-            print(f"Alternative method also failed for {full_key}: {e2}")
-            return None
-
-
-def load_vault_data(vault_path: str):
-    """Load all data from vault."""
+            pending[full_key] = _open(_ocdbt_spec(ts_path, full_key), context)
+        except Exception as e:
+            print(f"Error loading {full_key}: {e}")
+            failed.append(full_key)
+
+    for full_key, future in list(pending.items()):
+        try:
+            pending[full_key] = future.result().read()
+        except Exception as e:
+            del pending[full_key]
+            print(f"Error loading {full_key}: {e}")
+            failed.append(full_key)
+
+    for full_key, future in pending.items():
+        try:
+            arrays[full_key] = np.asarray(future.result())
+        except Exception as e:
+            print(f"Error loading {full_key}: {e}")
+            failed.append(full_key)
+
+    # Arrays that failed are retried with the alternative spec
+    for full_key in failed:
+        arrays[full_key] = _load_alternative(ts_path, full_key, context)
+
+    return {full_key: arrays[full_key] for full_key in full_keys}
+
+
+def load_vault_data(vault_path: str, keys=None):
+    """
+    Load data from vault.
+
+    Args:
+        vault_path: Path to the vault directory
+        keys: Top-level keys to load (default: all of them)
+    """
     metadata = load_vault_metadata(vault_path)
 
     print(f"\nVault metadata:")
@@ -84,31 +155,49 @@ def load_vault_data(vault_path: str):
     print(f"  Structure: {json.dumps(metadata['structure_shape'], indent=4)}")
 
     vault_data = {}
+    key_paths = []
 
-    # Load flat keys
     for key, shape_str in metadata['structure_shape'].items():
+        if keys is not None and key not in keys:
+            continue
         if isinstance(shape_str, str):
             # Simple array
-            print(f"Loading {key}...")
-            data = load_tensorstore_array(vault_path, [key])
-            if data is not None:
-                vault_data[key] = data
-                print(f"  ✓ Loaded {key}: shape {data.shape}")
+            key_paths.append([key])
         elif isinstance(shape_str, dict):
             # Nested structure (like 'infos')
             vault_data[key] = {}
-            for subkey, subshape_str in shape_str.items():
-                print(f"Loading {key}/{subkey}...")
-                data = load_tensorstore_array(vault_path, [key, subkey])
-                if data is not None:
-                    vault_data[key][subkey] = data
-                    print(f"  ✓ Loaded {key}/{subkey}: shape {data.shape}")
+            key_paths.extend([key, subkey] for subkey in shape_str)
+
+    print(f"Loading {', '.join('/'.join(key_path) for key_path in key_paths)}...")
+    arrays = load_tensorstore_arrays(vault_path, key_paths)
+
+    for key_path in key_paths:
+        full_key = '/'.join(key_path)
+        data = arrays[full_key]
+        if data is not None:
+            parent = vault_data if len(key_path) == 1 else vault_data[key_path[0]]
+            parent[key_path[-1]] = data
+            print(f"  ✓ Loaded {full_key}: shape {data.shape}")
 
     return vault_data
 
 
-def export_actions_to_json(vault_data: dict, output_path: str) -> None:
-    """Export actions to JSON format."""
+def _episode_ends(terminals, num_timesteps: int) -> np.ndarray:
+    """Flag, in one pass over terminals, the timesteps where any agent's episode ended."""
+    if terminals is None:
+        return np.zeros(num_timesteps, dtype=bool)
+    terminals = terminals[:num_timesteps]
+    return terminals.any(axis=tuple(range(1, terminals.ndim)))
+
+
+def export_actions_to_json(vault_data: dict, output_path: str, ends_episode: np.ndarray = None,
+                           precision: str = 'full') -> None:
+    """
+    Export actions to JSON format.
+
+    ends_episode is as returned by _episode_ends (computed if omitted);
+    precision is 'full', 'half' or 'int8' (see reduce_precision).
+    """
     actions = vault_data['actions']
     terminals = vault_data.get('terminals', None)
 
@@ -119,28 +208,27 @@ def export_actions_to_json(vault_data: dict, output_path: str) -> None:
         terminals = terminals[0]
 
     print(f"\nProcessing actions with shape: {actions.shape}")
+    num_timesteps = len(actions)
+    actions, scale = reduce_precision(actions, precision)
 
-    # Split into episodes
-    episodes = []
-    episode_actions = []
-
-    for t in range(len(actions)):
-        episode_actions.append(actions[t].tolist())
+    # Split into episodes after each terminal step: one np.split, and the
+    # episode arrays handed to orjson as-is (or one .tolist() per episode)
+    if ends_episode is None:
+        ends_episode = _episode_ends(terminals, num_timesteps)
+    ends = np.flatnonzero(ends_episode)
+    *complete, remainder = np.split(actions, ends + 1)
 
-        if terminals is not None and terminals[t].any():
-            episodes.append({
-                'episode_num': len(episodes),
-                'length': len(episode_actions),
-                'actions': episode_actions
-            })
-            episode_actions = []
+    episodes = [
+        {'episode_num': i, 'length': len(chunk), 'actions': json_rows(chunk)}
+        for i, chunk in enumerate(complete)
+    ]
 
     # Add remaining actions if episode didn't terminate
-    if episode_actions:
+    if len(remainder):
         episodes.append({
             'episode_num': len(episodes),
-            'length': len(episode_actions),
-            'actions': episode_actions,
+            'length': len(remainder),
+            'actions': json_rows(remainder),
             'incomplete': True
         })
 
@@ -151,17 +239,27 @@ def export_actions_to_json(vault_data: dict, output_path: str) -> None:
         'num_episodes': len(episodes),
         'episodes': episodes
     }
+    if scale is not None:
+        output_data['action_scale'] = scale
 
-    with open(output_path, 'w') as f:
-        json.dump(output_data, f, indent=2)
+    if orjson is not None:
+        with open(output_path, 'wb') as f:
+            f.write(orjson.dumps(output_data, option=orjson.OPT_INDENT_2 | orjson.OPT_SERIALIZE_NUMPY))
+    else:
+        with open(output_path, 'w') as f:
+            json.dump(output_data, f, indent=2)
 
     print(f"✓ Exported {len(episodes)} episodes to {output_path}")
 
 
-def export_actions_to_csv(vault_data: dict, output_path: str) -> None:
-    """Export actions to CSV format."""
-    import csv
+def export_actions_to_csv(vault_data: dict, output_path: str, ends_episode: np.ndarray = None,
+                          precision: str = 'full') -> None:
+    """
+    Export actions to CSV format.
 
+    Arguments are as for export_actions_to_json; with precision 'int8' the
+    per-agent scales go to a .scale.json file next to the CSV.
+    """
     actions = vault_data['actions']
     terminals = vault_data.get('terminals', None)
 
@@ -175,45 +273,67 @@ def export_actions_to_csv(vault_data: dict, output_path: str) -> None:
     num_agents = actions.shape[1]
     action_dim = actions.shape[2] if len(actions.shape) > 2 else 1
 
-    with open(output_path, 'w', newline='') as f:
-        writer = csv.writer(f)
-
-        # Write header
-        header = ['timestep', 'episode']
-        for agent_idx in range(num_agents):
-            if action_dim > 1:
-                for action_idx in range(action_dim):
-                    header.append(f'agent_{agent_idx}_action_{action_idx}')
-            else:
-                header.append(f'agent_{agent_idx}_action')
-        if terminals is not None:
-            header.append('episode_end')
-        writer.writerow(header)
-
-        # Write data
-        episode_num = 0
-        for t in range(num_timesteps):
-            row = [t, episode_num]
-
-            # Flatten actions for all agents
-            for agent_idx in range(num_agents):
-                if action_dim > 1:
-                    row.extend(actions[t, agent_idx].tolist())
-                else:
-                    row.append(float(actions[t, agent_idx]))
-
+    # Header
+    header = ['timestep', 'episode']
+    for agent_idx in range(num_agents):
+        if action_dim > 1:
+            for action_idx in range(action_dim):
+                header.append(f'agent_{agent_idx}_action_{action_idx}')
+        else:
+            header.append(f'agent_{agent_idx}_action')
+    if terminals is not None:
+        header.append('episode_end')
+
+    # Episode number and end flag of every timestep, from one terminal scan
+    if ends_episode is None:
+        ends_episode = _episode_ends(terminals, num_timesteps)
+    episode_nums = (np.cumsum(ends_episode) - ends_episode).tolist()
+    ends_episode = ends_episode.tolist()
+
+    actions, scale = reduce_precision(actions, precision)
+    if scale is not None:
+        with open(Path(output_path).with_suffix('.scale.json'), 'w') as f:
+            json.dump({'action_scale': scale}, f, indent=2)
+
+    # Flatten actions for all agents: one row of floats/values per timestep
+    action_rows = actions.reshape(num_timesteps, num_agents * action_dim)
+    if action_dim == 1 and scale is None:
+        action_rows = action_rows.astype(np.float64)
+    action_rows = action_rows.tolist()
+
+    # The row shape is fixed, so every row is one printf template; %r writes
+    # the same text the csv module would. Rows are formatted and written in
+    # blocks of CSV_BLOCK_ROWS
+    row_format = '%d,%d,' + ','.join(['%r'] * (num_agents * action_dim))
+    if terminals is not None:
+        row_format += ',%r'
+    row_format += '\r\n'
+
+    with open(output_path, 'w', newline='', buffering=1 << 20) as f:
+        f.write(','.join(header) + '\r\n')
+        for start in range(0, num_timesteps, CSV_BLOCK_ROWS):
+            stop = min(start + CSV_BLOCK_ROWS, num_timesteps)
             if terminals is not None:
-                is_terminal = bool(terminals[t].any())
-                row.append(is_terminal)
-                if is_terminal:
-                    episode_num += 1
-            writer.writerow(row)
+                f.write(''.join(row_format % (t, episode_nums[t], *action_rows[t], ends_episode[t])
+                                for t in range(start, stop)))
+            else:
+                f.write(''.join(row_format % (t, episode_nums[t], *action_rows[t])
+                                for t in range(start, stop)))
 
     print(f"✓ Exported {num_timesteps} timesteps to {output_path}")
 
 
-def export_actions_to_txt(vault_data: dict, output_path: str, max_episodes: int = 10) -> None:
-    """Export actions to human-readable text format."""
+def _row_format(shape: tuple, spec: str) -> str:
+    """printf template for one array of the given shape, bracketed like str(list)."""
+    if not shape:
+        return spec
+    inner = _row_format(shape[1:], spec)
+    return '[' + ', '.join([inner] * shape[0]) + ']'
+
+
+def export_actions_to_txt(vault_data: dict, output_path: str, max_episodes: int = 10,
+                          ends_episode: np.ndarray = None) -> None:
+    """Export actions to human-readable text format (ends_episode as for export_actions_to_json)."""
     actions = vault_data['actions']
     terminals = vault_data.get('terminals', None)
     rewards = vault_data.get('rewards', None)
@@ -229,6 +349,18 @@ def export_actions_to_txt(vault_data: dict, output_path: str, max_episodes: int
     num_agents = actions.shape[1]
     action_dim = actions.shape[2] if len(actions.shape) > 2 else 1
 
+    # One printf template per timestep, applied to a block of timesteps in a
+    # single % call rather than a .tolist() and repr() per float. Floats are
+    # written with 4 decimals
+    integer_actions = actions.dtype == bool or np.issubdtype(actions.dtype, np.integer)
+    agent_format = _row_format(actions.shape[2:], '%d' if integer_actions else '%.4f')
+    step_format = "\nTimestep %d (Episode step %d):\n" + "".join(
+        f"  Agent {agent_idx} action: {agent_format}\n" for agent_idx in range(num_agents)
+    )
+    if rewards is not None:
+        return_format = _row_format(rewards.shape[1:], '%.4f')
+        step_format += "  Rewards: " + return_format + "\n"
+
     with open(output_path, 'w') as f:
         f.write("=" * 80 + "\n")
         f.write("JOINT ACTION TRAJECTORIES\n")
@@ -238,41 +370,45 @@ def export_actions_to_txt(vault_data: dict, output_path: str, max_episodes: int
         f.write(f"Total timesteps: {len(actions)}\n")
         f.write("=" * 80 + "\n\n")
 
-        episode_num = 0
-        episode_start = 0
-        episode_return = np.zeros(num_agents)
-        episodes_written = 0
-
-        for t in range(len(actions)):
-            if t == episode_start:
-                if episodes_written >= max_episodes:
-                    f.write(f"\n... (showing first {max_episodes} episodes only) ...\n")
-                    break
-
-                f.write(f"\n{'=' * 80}\n")
-                f.write(f"EPISODE {episode_num}\n")
-                f.write(f"{'=' * 80}\n")
-
-            if episodes_written < max_episodes:
-                f.write(f"\nTimestep {t} (Episode step {t - episode_start}):\n")
-                for agent_idx in range(num_agents):
-                    f.write(f"  Agent {agent_idx} action: {actions[t, agent_idx].tolist()}\n")
-
+        # Episode boundaries from one terminal scan; a trailing unterminated
+        # episode runs to the last timestep
+        if ends_episode is None:
+            ends_episode = _episode_ends(terminals, len(actions))
+        stops = (np.flatnonzero(ends_episode) + 1).tolist()
+        if not stops or stops[-1] != len(actions):
+            stops.append(len(actions))
+        starts = [0] + stops[:-1]
+
+        # Every episode's return in one reduceat over the episode starts
+        if rewards is not None and len(actions):
+            returns = np.add.reduceat(rewards[:len(actions)], starts, axis=0, dtype=np.float64)
+
+        for episode_num, (episode_start, episode_stop) in enumerate(zip(starts, stops)):
+            if episode_start == episode_stop:
+                continue
+            if episode_num >= max_episodes:
+                f.write(f"\n... (showing first {max_episodes} episodes only) ...\n")
+                break
+
+            f.write(f"\n{'=' * 80}\n")
+            f.write(f"EPISODE {episode_num}\n")
+            f.write(f"{'=' * 80}\n")
+
+            for start in range(episode_start, episode_stop, TEXT_BLOCK_TIMESTEPS):
+                stop = min(start + TEXT_BLOCK_TIMESTEPS, episode_stop)
+                n = stop - start
+                columns = [np.arange(start, stop), np.arange(start, stop) - episode_start,
+                           actions[start:stop].reshape(n, -1)]
                 if rewards is not None:
-                    f.write(f"  Rewards: {rewards[t].tolist()}\n")
-                    episode_return += rewards[t]
-
-            if terminals is not None and terminals[t].any():
-                if episodes_written < max_episodes:
-                    f.write(f"\n  >>> EPISODE END <<<\n")
-                    f.write(f"  Episode Length: {t - episode_start + 1}\n")
-                    if rewards is not None:
-                        f.write(f"  Episode Return: {episode_return.tolist()}\n")
+                    columns.append(rewards[start:stop].reshape(n, -1))
+                values = np.column_stack(columns).ravel().tolist()
+                f.write((step_format * n) % tuple(values))
 
-                episode_num += 1
-                episodes_written += 1
-                episode_start = t + 1
-                episode_return = np.zeros(num_agents)
+            if ends_episode[episode_stop - 1]:
+                f.write(f"\n  >>> EPISODE END <<<\n")
+                f.write(f"  Episode Length: {episode_stop - episode_start}\n")
+                if rewards is not None:
+                    f.write(f"  Episode Return: {return_format % tuple(returns[episode_num].ravel().tolist())}\n")
 
     print(f"✓ Exported readable text format to {output_path}")
 
@@ -300,6 +436,14 @@ def main():
         default='json',
         help='Export format'
     )
+    parser.add_argument(
+        '--precision',
+        type=str,
+        choices=['full', 'half', 'int8'],
+        default='full',
+        help='Action precision for csv/json: full (default), half (float16, 4 decimals) '
+             'or int8 (quantized, with per-agent scales)'
+    )
 
     args = parser.parse_args()
 
@@ -310,7 +454,7 @@ def main():
     print(f"Loading vault from {args.vault_path}...")
 
     try:
-        vault_data = load_vault_data(args.vault_path)
+        vault_data = load_vault_data(args.vault_path, keys=EXPORT_KEYS)
     except Exception as e:
         print(f"Error loading vault: {e}")
         import traceback
@@ -335,6 +479,12 @@ def main():
     print(f"  Full action shape: {actions.shape}")
     print()
 
+    # Episode boundaries are shared by every exporter: scan terminals once
+    terminals = vault_data.get('terminals')
+    if terminals is not None and len(terminals.shape) == 3 and terminals.shape[0] == 1:
+        terminals = terminals[0]
+    ends_episode = _episode_ends(terminals, actions.shape[0])
+
     # Export to requested format(s)
     vault_name = Path(args.vault_path).parent.stem
     dataset_name = Path(args.vault_path).stem
@@ -342,15 +492,17 @@ def main():
 
     if args.format in ['csv', 'all']:
         csv_path = os.path.join(args.output_dir, f'{base_name}_actions.csv')
-        export_actions_to_csv(vault_data, csv_path)
+        export_actions_to_csv(vault_data, csv_path, ends_episode=ends_episode,
+                              precision=args.precision)
 
     if args.format in ['json', 'all']:
         json_path = os.path.join(args.output_dir, f'{base_name}_actions.json')
-        export_actions_to_json(vault_data, json_path)
+        export_actions_to_json(vault_data, json_path, ends_episode=ends_episode,
+                               precision=args.precision)
 
     if args.format in ['txt', 'all']:
         txt_path = os.path.join(args.output_dir, f'{base_name}_actions.txt')
-        export_actions_to_txt(vault_data, txt_path)
+        export_actions_to_txt(vault_data, txt_path, ends_episode=ends_episode)
 
     print(f"\n{'=' * 80}")
     print(f"✓ All exports completed!")
@@ -4,7 +4,8 @@ Export OG-MARL vault data to efficient NumPy format
 """
 
 import os
-import sys
+import json
+import argparse
 import shutil
 from pathlib import Path
 import zipfile
@@ -19,11 +20,73 @@ ENVIRONMENTS = {
     }
 }
 
-def export_vault_to_npz(output_dir="/mnt/c/Users/dbehl/og_marl_data"):
-    """Export vault to NumPy format (much more efficient than JSON)"""
+# Timesteps per chunk of the Zarr output: a 500-step segment read decodes at
+# most two chunks per array
+ZARR_CHUNK_TIMESTEPS = 4096
+
+def save_zarr(path, arrays):
+    """
+    Save arrays as a directory of Zarr arrays chunked along the timestep axis
+
+    Readers such as create_progression_videos then decode only the chunks a
+    [start:end] window touches instead of whole arrays. Chunks are Blosc
+    (Zstandard, bit-shuffled) compressed; scalars go into metadata.json.
+
+    Args:
+        path: Output .zarr directory
+        arrays: Dict mapping name to array or scalar/string
+    """
+    import tensorstore as ts
+
+    path = Path(path)
+    path.mkdir(parents=True, exist_ok=True)
+    metadata = {}
+    writes = []
+
+    for name, value in arrays.items():
+        value = np.asarray(value)
+        if value.ndim == 0:
+            metadata[name] = value.tolist()
+            continue
+
+        store = ts.open({
+            'driver': 'zarr',
+            'kvstore': {
+                'driver': 'file',
+                'path': str(path / name).replace('\\', '/')
+            },
+            'metadata': {
+                'shape': list(value.shape),
+                'chunks': [max(1, min(ZARR_CHUNK_TIMESTEPS, len(value))), *value.shape[1:]],
+                'dtype': value.dtype.str,
+                'compressor': {'id': 'blosc', 'cname': 'zstd', 'clevel': 3, 'shuffle': 2},
+            },
+            'create': True,
+            'delete_existing': True,
+        }).result()
+        # Every write is started before waiting on any, so they encode concurrently
+        writes.append(store.write(value))
+
+    for write in writes:
+        write.result()
+
+    with open(path / 'metadata.json', 'w') as f:
+        json.dump(metadata, f, indent=2)
+
+def export_vault_to_npz(output_dir="/mnt/c/Users/dbehl/og_marl_data", compression='none',
+                        output_format='npz'):
+    """
+    Export vault to NumPy format (much more efficient than JSON)
+
+    Args:
+        output_dir: Where the .npz files are written
+        compression: NPZ output only: 'none' (np.savez, default) or 'deflate' (np.savez_compressed).
+            Dense float32 trajectories shrink little under DEFLATE, which runs
+            single-threaded and dominates the export time
+        output_format: 'npz' (default) or 'zarr' (chunked directory, see save_zarr)
+    """
     from huggingface_hub import hf_hub_download
     from flashbax.vault import Vault
-    import jax
 
     output_path = Path(output_dir)
     output_path.mkdir(parents=True, exist_ok=True)
@@ -71,23 +134,23 @@ def export_vault_to_npz(output_dir="/mnt/c/Users/dbehl/og_marl_data"):
                     # Load vault
                     vault = Vault(str(vault_dir), vault_uid=quality)
                     experience = vault.read().experience
-                    data = jax.tree.map(lambda x: np.array(x), experience)
 
                     # Get shapes
-                    n_timesteps = data['observations'].shape[1]
-                    n_agents = data['observations'].shape[2]
+                    n_timesteps = experience['observations'].shape[1]
+                    n_agents = experience['observations'].shape[2]
 
                     print(f"    📊 {n_timesteps} timesteps, {n_agents} agents")
-                    print(f"    💾 Saving to NumPy format...")
+                    print(f"    💾 Saving to {output_format.upper()} format...")
 
-                    # Save as NPZ (compressed NumPy format)
-                    output_file = output_path / f"{env_name}_{scenario}_{quality}.npz"
+                    output_file = output_path / f"{env_name}_{scenario}_{quality}.{output_format}"
 
-                    # Prepare data dictionary
+                    # Prepare data dictionary. Only the saved leaves are brought
+                    # to the host, batch dimension removed first; terminals,
+                    # truncations and the other infos are never copied
                     save_dict = {
-                        'observations': data['observations'][0],  # Remove batch dimension
-                        'actions': data['actions'][0],
-                        'rewards': data['rewards'][0],
+                        'observations': np.asarray(experience['observations'][0]),
+                        'actions': np.asarray(experience['actions'][0]),
+                        'rewards': np.asarray(experience['rewards'][0]),
                         'n_timesteps': n_timesteps,
                         'n_agents': n_agents,
                         'env': env_name,
@@ -96,13 +159,20 @@ def export_vault_to_npz(output_dir="/mnt/c/Users/dbehl/og_marl_data"):
                     }
 
                     # Add state if available
-                    if 'infos' in data and 'state' in data['infos']:
-                        save_dict['states'] = data['infos']['state'][0]
-
-                    # Save compressed
-                    np.savez_compressed(output_file, **save_dict)
-
-                    size_mb = output_file.stat().st_size / (1024*1024)
+                    if 'infos' in experience and 'state' in experience['infos']:
+                        save_dict['states'] = np.asarray(experience['infos']['state'][0])
+
+                    if output_format == 'zarr':
+                        save_zarr(output_file, save_dict)
+                        size_bytes = sum(f.stat().st_size for f in output_file.rglob('*') if f.is_file())
+                    else:
+                        if compression == 'deflate':
+                            np.savez_compressed(output_file, **save_dict)
+                        else:
+                            np.savez(output_file, **save_dict)
+                        size_bytes = output_file.stat().st_size
+
+                    size_mb = size_bytes / (1024*1024)
                     print(f"    ✅ Saved {output_file.name} ({size_mb:.1f} MB)")
 
             except Exception as e:
@@ -115,9 +185,18 @@ def export_vault_to_npz(output_dir="/mnt/c/Users/dbehl/og_marl_data"):
     print(f"\n✅ Done! Data saved to {output_path}")
 
 if __name__ == "__main__":
-    output_dir = sys.argv[1] if len(sys.argv) > 1 else "/mnt/c/Users/dbehl/og_marl_data"
+    parser = argparse.ArgumentParser(description='Download OG-MARL vaults and export them to NumPy format')
+    parser.add_argument('output_dir', nargs='?', default="/mnt/c/Users/dbehl/og_marl_data",
+                        help='Output directory')
+    parser.add_argument('--compression', choices=['none', 'deflate'], default='none',
+                        help='none: plain np.savez, fastest (default); deflate: np.savez_compressed, '
+                             'somewhat smaller but much slower')
+    parser.add_argument('--format', choices=['npz', 'zarr'], default='npz',
+                        help='npz: one file per quality (default); zarr: directory of arrays '
+                             'chunked by timestep, so readers can load just a window')
+    args = parser.parse_args()
 
     print("📊 OG-MARL Vault to NumPy Exporter")
-    print(f"Will save to: {output_dir}")
+    print(f"Will save to: {args.output_dir}")
 
-    export_vault_to_npz(output_dir)
+    export_vault_to_npz(args.output_dir, args.compression, args.format)
@@ -0,0 +1,70 @@
+"""
+NumPy helpers shared by the verification scripts: loading exported .npz
+files member by member and preparing rows for JSON output
+"""
+
+import struct
+import zipfile
+
+import numpy as np
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def _memmap_member(f, path, info):
+    """Memory-map one uncompressed .npy member of an .npz (None if it cannot be)"""
+    # Array data starts after the member's local file header: 30 fixed bytes,
+    # then its file name and extra field
+    f.seek(info.header_offset)
+    header = f.read(30)
+    name_length, extra_length = struct.unpack('<HH', header[26:30])
+    f.seek(info.header_offset + 30 + name_length + extra_length)
+
+    read_header = {(1, 0): np.lib.format.read_array_header_1_0,
+                   (2, 0): np.lib.format.read_array_header_2_0}.get(np.lib.format.read_magic(f))
+    if read_header is None:
+        return None
+    shape, fortran_order, dtype = read_header(f)
+    if not shape or dtype.hasobject:
+        return None
+    return np.memmap(path, dtype=dtype, mode='r', offset=f.tell(), shape=shape,
+                     order='F' if fortran_order else 'C')
+
+
+def load_npz(path):
+    """
+    Load an .npz as a dict, reading each member once
+
+    np.load ignores mmap_mode for .npz files, and NpzFile re-reads (and
+    re-decompresses) a member on every data[key]. Members stored
+    uncompressed, as export_vault_to_npz.py writes by default and as replay
+    caches and episode files are, are memory-mapped instead, so only the
+    parts that get used are paged in.
+
+    Args:
+        path: .npz file
+
+    Returns:
+        Dict mapping member name to np.ndarray (or np.memmap)
+    """
+    data = {}
+    with np.load(path) as npz, zipfile.ZipFile(path) as archive, open(path, 'rb') as f:
+        for name in npz.files:
+            info = archive.getinfo(f'{name}.npy')
+            array = _memmap_member(f, path, info) if info.compress_type == zipfile.ZIP_STORED else None
+            data[name] = array if array is not None else npz[name]
+    return data
+
+
+def json_rows(array):
+    """
+    Rows of an array in the form the JSON encoder takes
+
+    orjson serializes NumPy arrays natively; the stdlib json needs nested
+    lists, made with one bulk .tolist() instead of one per row.
+    """
+    array = np.ascontiguousarray(array)
+    return array if orjson is not None else array.tolist()
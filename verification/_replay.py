@@ -0,0 +1,54 @@
+"""
+Replay stored multi-agent actions in a MAMuJoCo environment, shared by the
+verification scripts
+"""
+
+
+def _any_value(flags):
+    """True if any agent's flag is set"""
+    return any(flags.values())
+
+
+def done_reducer(flags):
+    """
+    Pick the function reducing a terminated/truncated result to one bool
+
+    The result type is fixed for an environment, so this is resolved once
+    from the first step instead of checked every step.
+
+    Args:
+        flags: terminated (or truncated) as returned by env.step, either a
+            per-agent dict or a single bool
+    """
+    return _any_value if isinstance(flags, dict) else bool
+
+
+def replay(env, actions_arr, agent_keys, render=False, reset_on_end=True):
+    """
+    Step an environment through stored actions
+
+    Args:
+        env: Reset environment taking a dict of per-agent actions
+        actions_arr: (steps, n_agents, act_dim) array of stored actions
+        agent_keys: Environment agent names, in the order of the agent axis
+        render: Whether to render a frame after every step
+        reset_on_end: Reset and keep replaying when an episode ends; if
+            False, stop after the step that ended it
+
+    Yields:
+        (i, frame_or_none, reward, ended) for every replayed step, where
+        ended is True on the step that terminated or truncated the episode
+    """
+    reduce_done = None
+    for i in range(len(actions_arr)):
+        _, reward, terminated, truncated, _ = env.step(dict(zip(agent_keys, actions_arr[i])))
+        if reduce_done is None:
+            reduce_done = done_reducer(terminated)
+        ended = reduce_done(terminated) or reduce_done(truncated)
+
+        yield i, env.render() if render else None, reward, ended
+
+        if ended:
+            if not reset_on_end:
+                return
+            env.reset()
@@ -4,17 +4,81 @@
 Batch record videos from existing JSON files
 """
 
+import os
 import sys
+import json
 import subprocess
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
 
-def batch_record(json_pattern, fps=30):
+# Seconds one video may take before its worker is killed
+RECORD_TIMEOUT = 300
+
+_local = threading.local()
+
+def _worker(record_script, workers):
+    """This thread's record_mamujoco.py --worker process, started on first use"""
+    proc = getattr(_local, 'proc', None)
+    if proc is None or proc.poll() is not None:
+        proc = subprocess.Popen(
+            [sys.executable, str(record_script), '--worker'],
+            stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+            text=True, encoding='utf-8'
+        )
+        _local.proc = proc
+        workers.append(proc)
+    return proc
+
+def _record_one(record_script, json_file, video_file, fps, workers):
+    """Record one JSON file on this thread's worker; returns a status message"""
+    try:
+        # Get num_steps from the metadata sidecar written next to the JSON,
+        # parsing the whole file only when there is none
+        meta_file = json_file.with_suffix('.meta.json')
+        if meta_file.exists():
+            metadata = json.loads(meta_file.read_bytes())
+        else:
+            with open(json_file, 'r') as f:
+                metadata = json.load(f)['metadata']
+        num_steps = metadata['n_timesteps']
+
+        # Send the job to the worker; a recording that hangs is killed, and
+        # the next job on this thread starts a fresh worker
+        proc = _worker(record_script, workers)
+        job = {'json_file': str(json_file), 'output_video': str(video_file),
+               'num_steps': num_steps, 'fps': fps}
+        watchdog = threading.Timer(RECORD_TIMEOUT, proc.kill)
+        watchdog.start()
+        try:
+            proc.stdin.write(json.dumps(job) + "\n")
+            proc.stdin.flush()
+            line = proc.stdout.readline()
+        finally:
+            watchdog.cancel()
+        status = json.loads(line) if line else {'ok': False, 'error': 'worker exited or timed out'}
+
+        if status['ok']:
+            size_mb = video_file.stat().st_size / (1024*1024)
+            return f"✅ {video_file.name} created ({size_mb:.1f} MB)"
+
+        return f"❌ {video_file.name} failed!\n    Error: {status['error'][:200]}"
+
+    except Exception as e:
+        return f"❌ {video_file.name}: {e}"
+
+def batch_record(json_pattern, fps=30, workers=None):
     """
     Record videos for all matching JSON files
 
+    Videos are rendered by long-lived record_mamujoco.py --worker processes,
+    by default one per two CPU cores, each recording its share of the files
+    so the simulator is imported once per worker rather than once per video.
+
     Args:
         json_pattern: Pattern to match JSON files (e.g., "*_segment*.json")
         fps: Frames per second
+        workers: Videos recorded in parallel (default: half the CPU cores)
     """
 
     # Find all matching JSON files
@@ -27,6 +91,9 @@ def batch_record(json_pattern, fps=30):
         # It's a directory
         json_files = sorted(Path(json_pattern).glob("*_segment*.json"))
 
+    # Skip the metadata sidecars that sit next to each segment
+    json_files = [f for f in json_files if not f.name.endswith('.meta.json')]
+
     if not json_files:
         print(f"No JSON files found matching: {json_pattern}")
         return
@@ -36,6 +103,7 @@ def batch_record(json_pattern, fps=30):
     script_dir = Path(__file__).parent
     record_script = script_dir / "record_mamujoco.py"
 
+    jobs = []
     for i, json_file in enumerate(json_files, 1):
         video_file = json_file.with_suffix('.mp4')
 
@@ -43,44 +111,32 @@ def batch_record(json_pattern, fps=30):
             print(f"[{i}/{len(json_files)}] Skipping {video_file.name} (already exists)")
             continue
 
-        print(f"[{i}/{len(json_files)}] Recording {video_file.name}...")
+        jobs.append((json_file, video_file))
 
-        try:
-            # Get num_steps from JSON metadata
-            import json
-            with open(json_file, 'r') as f:
-                metadata = json.load(f)['metadata']
-                num_steps = metadata['n_timesteps']
-
-            # Run record script
-            cmd = [
-                sys.executable,
-                str(record_script),
-                str(json_file),
-                str(video_file),
-                str(num_steps),
-                str(fps)
-            ]
-
-            result = subprocess.run(cmd, capture_output=True, text=True, timeout=300)
-
-            if result.returncode == 0:
-                size_mb = video_file.stat().st_size / (1024*1024)
-                print(f"    ✅ Video created ({size_mb:.1f} MB)")
-            else:
-                print(f"    ❌ Failed!")
-                if result.stderr:
-                    print(f"    Error: {result.stderr[:200]}")
-
-        except Exception as e:
-            print(f"    ❌ Error: {e}")
+    if jobs:
+        workers = workers or max(1, (os.cpu_count() or 2) // 2)
+        print(f"Recording {len(jobs)} videos, {min(workers, len(jobs))} at a time...")
+
+        # Threads only wait on the worker processes, which do the work
+        procs = []
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            futures = [pool.submit(_record_one, record_script, json_file, video_file, fps, procs)
+                       for json_file, video_file in jobs]
+            for done, future in enumerate(as_completed(futures), 1):
+                print(f"[{done}/{len(jobs)}] {future.result()}")
+
+        # Closing stdin ends each worker's job loop
+        for proc in procs:
+            if proc.poll() is None:
+                proc.stdin.close()
+            proc.wait()
 
     print(f"\n✅ Done! Processed {len(json_files)} files")
 
 
 if __name__ == "__main__":
     if len(sys.argv) < 2:
-        print("Usage: python batch_record_videos.py <json_pattern> [fps]")
+        print("Usage: python batch_record_videos.py <json_pattern> [fps] [workers]")
         print("\nExamples:")
         print("  python batch_record_videos.py \"C:/Users/dbehl/og_marl_data/*_segment*.json\" 30")
         print("  python batch_record_videos.py \"C:/Users/dbehl/og_marl_data\" 30")
@@ -88,5 +144,6 @@ if __name__ == "__main__":
 
     json_pattern = sys.argv[1]
     fps = int(sys.argv[2]) if len(sys.argv) > 2 else 30
+    workers = int(sys.argv[3]) if len(sys.argv) > 3 else None
 
-    batch_record(json_pattern, fps)
+    batch_record(json_pattern, fps, workers)
@@ -3,18 +3,56 @@
 Create videos from different parts of the training run to show progression
 """
 
+import importlib.util
 import json
 import numpy as np
 from pathlib import Path
 import sys
 import subprocess
 
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+from _npz import json_rows, load_npz
+
+def load_dataset(path):
+    """
+    Open an exported dataset: an .npz file, or a .zarr directory written by
+    export_vault_to_npz.py --format zarr
+
+    Zarr arrays come back as TensorStore handles, so nothing is read until a
+    window of them is requested (see _window).
+    """
+    path = Path(path)
+    if not path.is_dir():
+        return load_npz(path)
+
+    import tensorstore as ts
+
+    with open(path / 'metadata.json', 'r') as f:
+        data = json.load(f)
+
+    opens = {
+        entry.name: ts.open({'driver': 'zarr', 'kvstore': {'driver': 'file', 'path': str(entry).replace('\\', '/')}})
+        for entry in path.iterdir() if (entry / '.zarray').exists()
+    }
+    data.update({name: future.result() for name, future in opens.items()})
+    return data
+
+def _window(array, start, end):
+    """Rows start:end as an ndarray; a TensorStore reads only the chunks they touch"""
+    window = array[start:end]
+    return window.read().result() if hasattr(window, 'read') else window
+
 def create_progression_videos(npz_file, num_videos=10, episode_length=500):
     """
     Sample different parts of the dataset and create videos
 
     Args:
-        npz_file: Path to NPZ file (use Windows path: C:/...)
+        npz_file: Path to NPZ file or .zarr directory (use Windows path: C:/...);
+            a .zarr directory next to the NPZ file is used in its place
         num_videos: Number of videos to create (default: 10)
         episode_length: Length of each video segment (default: 500 steps)
     """
@@ -26,8 +64,14 @@ def create_progression_videos(npz_file, num_videos=10, episode_length=500):
         npz_file_str = str(npz_file).replace('/mnt/c', 'C:').replace('/mnt/d', 'D:').replace('/', '\\')
         npz_path = Path(npz_file_str)
 
+    # Prefer a Zarr export of the same dataset: it is read chunk by chunk,
+    # each chunk decoded once, instead of through the zip members
+    zarr_path = npz_path.with_suffix('.zarr')
+    if npz_path.suffix == '.npz' and zarr_path.is_dir() and importlib.util.find_spec('tensorstore'):
+        npz_path = zarr_path
+
     print(f"📂 Loading {npz_path}")
-    data = np.load(npz_path)
+    data = load_dataset(npz_path)
 
     # Extract metadata
     env = str(data['env'])
@@ -46,6 +90,7 @@ def create_progression_videos(npz_file, num_videos=10, episode_length=500):
     observations = data['observations']
     actions = data['actions']
     rewards = data['rewards']
+    states = data['states'] if 'states' in data else None
 
     # Sample evenly across the dataset
     step_size = (n_timesteps - episode_length) // (num_videos - 1)
@@ -60,8 +105,14 @@ def create_progression_videos(npz_file, num_videos=10, episode_length=500):
     for i, start in enumerate(sample_starts):
         end = start + episode_length
 
+        # Read this segment's window of every array once
+        obs_seg = _window(observations, start, end)
+        act_seg = _window(actions, start, end)
+        rew_seg = _window(rewards, start, end)
+        state_seg = _window(states, start, end) if states is not None else None
+
         # Calculate stats for this segment
-        segment_reward = np.sum(rewards[start:end])
+        segment_reward = np.sum(rew_seg)
         avg_reward = segment_reward / episode_length
 
         print(f"\n   Video {i+1}/{num_videos}:")
@@ -69,18 +120,15 @@ def create_progression_videos(npz_file, num_videos=10, episode_length=500):
         print(f"      Cumulative reward: {segment_reward:8.2f}")
         print(f"      Avg reward/step: {avg_reward:6.3f}")
 
-        # Export as JSON
-        trajectories = []
-        for t in range(start, end):
-            step = {
-                't': int(t - start),
-                'obs': observations[t].tolist(),
-                'act': actions[t].tolist(),
-                'rew': rewards[t].tolist()
-            }
-            if 'states' in data:
-                step['state'] = data['states'][t].tolist()
-            trajectories.append(step)
+        # Export as JSON, one {'t', 'obs', 'act', 'rew'[, 'state']} dict per step
+        # as record_mamujoco.py expects; rows come from one bulk conversion
+        # per array instead of a .tolist() per step
+        fields = {'obs': obs_seg, 'act': act_seg, 'rew': rew_seg}
+        if state_seg is not None:
+            fields['state'] = state_seg
+        keys = ('t', *fields)
+        rows = [json_rows(values) for values in fields.values()]
+        trajectories = [dict(zip(keys, (t, *values))) for t, values in enumerate(zip(*rows))]
 
         segment_data = {
             'metadata': {
@@ -100,8 +148,17 @@ def create_progression_videos(npz_file, num_videos=10, episode_length=500):
         }
 
         json_file = output_dir / f"{env}_{scenario}_{quality}_segment{i+1:02d}.json"
-        with open(json_file, 'w') as f:
-            json.dump(segment_data, f, indent=2)
+        if orjson is not None:
+            with open(json_file, 'wb') as f:
+                f.write(orjson.dumps(segment_data, option=orjson.OPT_INDENT_2 | orjson.OPT_SERIALIZE_NUMPY))
+        else:
+            with open(json_file, 'w') as f:
+                json.dump(segment_data, f, indent=2)
+
+        # Metadata alone in a small sidecar, so batch_record_videos.py and the
+        # summary below can read it without parsing every trajectory
+        with open(json_file.with_suffix('.meta.json'), 'w') as f:
+            json.dump(segment_data['metadata'], f, indent=2)
 
         json_files.append(json_file)
         print(f"      ✅ Saved: {json_file.name}")
@@ -142,11 +199,11 @@ def create_progression_videos(npz_file, num_videos=10, episode_length=500):
     print(f"\n✅ Done! Created {num_videos} videos in:")
     print(f"   {output_dir}")
 
-    # Show summary
+    # Show summary, from the metadata sidecars
     print(f"\n📈 Progression Summary:")
     for i, json_file in enumerate(json_files):
-        with open(json_file, 'r') as f:
-            meta = json.load(f)['metadata']
+        with open(json_file.with_suffix('.meta.json'), 'r') as f:
+            meta = json.load(f)
         print(f"   Video {i+1}: Steps {meta['original_start_step']:7d}-{meta['original_start_step']+episode_length:7d} | "
               f"Avg reward: {meta['avg_reward']:6.3f}")
 
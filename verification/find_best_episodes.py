@@ -8,7 +8,34 @@ import numpy as np
 from pathlib import Path
 import sys
 
-def find_best_episodes(json_file, episode_length=1000, top_n=5):
+try:
+    import ijson
+except ImportError:
+    ijson = None
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+def _stream_items(json_file, prefix):
+    """Yield the JSON values at prefix one at a time, without loading the whole file"""
+    with open(json_file, 'rb') as f:
+        yield from ijson.items(f, prefix, use_float=True)
+
+def _read_windows(json_file, windows):
+    """Collect trajectories[start:end] for every (start, end) window in one streaming pass"""
+    selected = [[] for _ in windows]
+    last = max(end for _, end in windows)
+    for t, step in enumerate(_stream_items(json_file, 'trajectories.item')):
+        if t >= last:
+            break
+        for (start, end), steps in zip(windows, selected):
+            if start <= t < end:
+                steps.append(step)
+    return selected
+
+def find_best_episodes(json_file, episode_length=1000, top_n=5, pretty=False):
     """
     Analyze dataset and find episodes with highest cumulative rewards
 
@@ -16,35 +43,44 @@ def find_best_episodes(json_file, episode_length=1000, top_n=5):
         json_file: Path to exported JSON file
         episode_length: Length of episode window to analyze
         top_n: Number of top episodes to identify
+        pretty: Indent the best/worst episode JSON (compact by default)
     """
 
     print(f"📂 Loading {json_file}")
-    with open(json_file, 'r') as f:
-        data = json.load(f)
+    if ijson is not None:
+        # Stream the file, keeping only each step's mean reward; the two
+        # windows exported below are read in a second pass. The reward lists
+        # hold one entry per agent, small enough that a plain sum() beats a
+        # np.mean() call per step
+        metadata = next(_stream_items(json_file, 'metadata'))
+        trajectories = None
+        step_rewards = np.fromiter(
+            (sum(rew) / len(rew) for rew in _stream_items(json_file, 'trajectories.item.rew')),
+            dtype=np.float64
+        )
+    else:
+        with open(json_file, 'rb') as f:
+            data = orjson.loads(f.read()) if orjson is not None else json.load(f)
 
-    metadata = data['metadata']
-    trajectories = data['trajectories']
+        metadata = data['metadata']
+        trajectories = data['trajectories']
+        step_rewards = np.fromiter((sum(step['rew']) / len(step['rew']) for step in trajectories),
+                                   dtype=np.float64, count=len(trajectories))
+    n_steps = len(step_rewards)
 
     print(f"\n📊 Dataset Info:")
     print(f"   Environment: {metadata['env']}")
     print(f"   Scenario: {metadata['scenario']}")
-    print(f"   Total timesteps: {len(trajectories)}")
+    print(f"   Total timesteps: {n_steps}")
 
     print(f"\n🔍 Analyzing trajectories in {episode_length}-step windows...")
 
-    # Calculate cumulative rewards for sliding windows
-    episode_rewards = []
-    episode_starts = []
-
-    for start in range(0, len(trajectories) - episode_length, episode_length // 2):  # 50% overlap
-        episode_reward = sum(
-            np.mean(trajectories[t]['rew'])
-            for t in range(start, min(start + episode_length, len(trajectories)))
-        )
-        episode_rewards.append(episode_reward)
-        episode_starts.append(start)
-
-    episode_rewards = np.array(episode_rewards)
+    # Cumulative rewards of all sliding windows (50% overlap) as differences
+    # of one prefix sum
+    cumulative = np.concatenate(([0.0], np.cumsum(step_rewards)))
+    starts = np.arange(0, n_steps - episode_length, episode_length // 2)
+    episode_rewards = cumulative[starts + episode_length] - cumulative[starts]
+    episode_starts = starts.tolist()
 
     # Find statistics
     print(f"\n📈 Reward Statistics (per {episode_length} steps):")
@@ -53,8 +89,17 @@ def find_best_episodes(json_file, episode_length=1000, top_n=5):
     print(f"   Min reward: {np.min(episode_rewards):.2f}")
     print(f"   Max reward: {np.max(episode_rewards):.2f}")
 
-    # Find best episodes
-    best_indices = np.argsort(episode_rewards)[-top_n:][::-1]
+    # The exported best and worst windows are a single reduction each
+    best_index = int(np.argmax(episode_rewards))
+    worst_index = int(np.argmin(episode_rewards))
+
+    # Find best episodes: partition out the top k, then sort only those
+    k = min(top_n, len(episode_rewards))
+    if k > 1:
+        best_indices = np.argpartition(-episode_rewards, k - 1)[:k]
+        best_indices = best_indices[np.argsort(-episode_rewards[best_indices])]
+    else:
+        best_indices = np.array([best_index])
 
     print(f"\n🏆 Top {top_n} Best Episodes:")
     for rank, idx in enumerate(best_indices, 1):
@@ -64,7 +109,11 @@ def find_best_episodes(json_file, episode_length=1000, top_n=5):
         print(f"   #{rank}: Steps {start_step:6d}-{start_step + episode_length:6d} | Total: {reward:7.2f} | Avg: {avg_reward:6.3f}")
 
     # Find worst episodes for comparison
-    worst_indices = np.argsort(episode_rewards)[:min(top_n, len(episode_rewards))]
+    if k > 1:
+        worst_indices = np.argpartition(episode_rewards, k - 1)[:k]
+        worst_indices = worst_indices[np.argsort(episode_rewards[worst_indices])]
+    else:
+        worst_indices = np.array([worst_index])
 
     print(f"\n😞 Worst {min(top_n, len(episode_rewards))} Episodes (for comparison):")
     for rank, idx in enumerate(worst_indices, 1):
@@ -73,39 +122,48 @@ def find_best_episodes(json_file, episode_length=1000, top_n=5):
         avg_reward = reward / episode_length
         print(f"   #{rank}: Steps {start_step:6d}-{start_step + episode_length:6d} | Total: {reward:7.2f} | Avg: {avg_reward:6.3f}")
 
-    # Create a JSON with just the best episode
-    best_episode_start = episode_starts[best_indices[0]]
-    best_episode_end = min(best_episode_start + episode_length, len(trajectories))
+    # Trajectories of the best and worst windows
+    best_episode_start = episode_starts[best_index]
+    best_episode_end = min(best_episode_start + episode_length, n_steps)
+    worst_episode_start = episode_starts[worst_index]
+    worst_episode_end = min(worst_episode_start + episode_length, n_steps)
 
+    windows = [(best_episode_start, best_episode_end), (worst_episode_start, worst_episode_end)]
+    if trajectories is None:
+        best_trajectories, worst_trajectories = _read_windows(json_file, windows)
+    else:
+        best_trajectories, worst_trajectories = (trajectories[start:end] for start, end in windows)
+
+    # Create a JSON with just the best episode
     best_episode_data = {
         'metadata': metadata.copy(),
-        'trajectories': trajectories[best_episode_start:best_episode_end]
+        'trajectories': best_trajectories
     }
     best_episode_data['metadata']['note'] = f'Best episode: steps {best_episode_start}-{best_episode_end}'
     best_episode_data['metadata']['original_start_step'] = best_episode_start
-    best_episode_data['metadata']['cumulative_reward'] = float(episode_rewards[best_indices[0]])
+    best_episode_data['metadata']['cumulative_reward'] = float(episode_rewards[best_index])
+
+    # Compact output unless asked for: indenting roughly doubles the file
+    json_options = {'indent': 2} if pretty else {'separators': (',', ':')}
 
     output_file = Path(json_file).parent / f"{Path(json_file).stem}_BEST.json"
     with open(output_file, 'w') as f:
-        json.dump(best_episode_data, f, indent=2)
+        json.dump(best_episode_data, f, **json_options)
 
     print(f"\n💾 Saved best episode to: {output_file.name}")
 
     # Also save worst for comparison
-    worst_episode_start = episode_starts[worst_indices[0]]
-    worst_episode_end = min(worst_episode_start + episode_length, len(trajectories))
-
     worst_episode_data = {
         'metadata': metadata.copy(),
-        'trajectories': trajectories[worst_episode_start:worst_episode_end]
+        'trajectories': worst_trajectories
     }
     worst_episode_data['metadata']['note'] = f'Worst episode: steps {worst_episode_start}-{worst_episode_end}'
     worst_episode_data['metadata']['original_start_step'] = worst_episode_start
-    worst_episode_data['metadata']['cumulative_reward'] = float(episode_rewards[worst_indices[0]])
+    worst_episode_data['metadata']['cumulative_reward'] = float(episode_rewards[worst_index])
 
     worst_output_file = Path(json_file).parent / f"{Path(json_file).stem}_WORST.json"
     with open(worst_output_file, 'w') as f:
-        json.dump(worst_episode_data, f, indent=2)
+        json.dump(worst_episode_data, f, **json_options)
 
     print(f"💾 Saved worst episode to: {worst_output_file.name}")
 
@@ -118,16 +176,20 @@ def find_best_episodes(json_file, episode_length=1000, top_n=5):
 
 if __name__ == "__main__":
     if len(sys.argv) < 2:
-        print("Usage: python find_best_episodes.py <path_to_json_file> [episode_length] [top_n]")
+        print("Usage: python find_best_episodes.py <path_to_json_file> [episode_length] [top_n] [--pretty]")
         print("\nExample:")
         print("  python find_best_episodes.py data.json 1000 5")
         print("\nArguments:")
         print("  episode_length: Length of episode window (default: 1000)")
         print("  top_n: Number of top episodes to show (default: 5)")
+        print("  --pretty: Indent the best/worst episode JSON files")
         sys.exit(1)
 
-    json_file = sys.argv[1]
-    episode_length = int(sys.argv[2]) if len(sys.argv) > 2 else 1000
-    top_n = int(sys.argv[3]) if len(sys.argv) > 3 else 5
+    pretty = '--pretty' in sys.argv
+    args = [arg for arg in sys.argv if arg != '--pretty']
+
+    json_file = args[1]
+    episode_length = int(args[2]) if len(args) > 2 else 1000
+    top_n = int(args[3]) if len(args) > 3 else 5
 
-    find_best_episodes(json_file, episode_length, top_n)
+    find_best_episodes(json_file, episode_length, top_n, pretty)
@@ -3,12 +3,84 @@
 Analyze OG-MARL NPZ data to find best performing episodes
 """
 
+import functools
 import json
 import numpy as np
 from pathlib import Path
 import sys
 
-def find_best_episodes(npz_file, episode_length=1000, top_n=5):
+from _npz import load_npz
+
+# Stored dtypes of exported episode NPZ fields: observations and actions are
+# only replayed or visualized, so half precision suffices; rewards stay float32
+EPISODE_NPZ_DTYPES = {'obs': np.float16, 'act': np.float16, 'rew': np.float32}
+
+def _write_episode_json(path, metadata, fields, pretty=False):
+    """
+    Write {'metadata', 'trajectories'} as JSON, one step at a time
+
+    Each field is converted with one .tolist() over its window, and steps are
+    encoded and written one by one instead of as a single document. The
+    output is the same as json.dump(...) with compact separators, or with
+    indent=2 if pretty is set.
+
+    Args:
+        path: Output .json file
+        metadata: Metadata dict
+        fields: Dict mapping step key to a (steps, ...) array window
+        pretty: Indent the output for reading
+    """
+    keys = ('t', *fields)
+    rows = [np.asarray(values).tolist() for values in fields.values()]
+
+    options = {'indent': 2} if pretty else {'separators': (',', ':')}
+    # Whitespace json.dump puts before the top-level keys and before each step
+    pad, step_pad, colon = ('\n  ', '\n    ', ': ') if pretty else ('', '', ':')
+
+    with open(path, 'w') as f:
+        f.write('{' + pad + '"metadata"' + colon + json.dumps(metadata, **options).replace('\n', pad))
+        f.write(',' + pad + '"trajectories"' + colon + '[')
+        for t, values in enumerate(zip(*rows)):
+            f.write((',' if t else '') + step_pad)
+            f.write(json.dumps(dict(zip(keys, (t, *values))), **options).replace('\n', step_pad))
+        f.write((pad + ']' if rows[0] else ']') + pad[:1] + '}')
+
+def _write_episode_npz(path, metadata, fields):
+    """
+    Save an episode window as an uncompressed NPZ that record_mamujoco.py reads
+
+    Each field ('obs', 'act', 'rew'[, 'state']) is stored as one array, in
+    the dtype given by EPISODE_NPZ_DTYPES, and each metadata entry as a
+    scalar, so no per-step encoding is needed.
+    """
+    fields = {name: array.astype(EPISODE_NPZ_DTYPES.get(name, array.dtype), copy=False)
+              for name, array in fields.items()}
+    np.savez(path, **fields, **metadata)
+
+def _window_rewards(rewards, starts, episode_length, step_size):
+    """
+    Total reward (all agents) of each window [start, start + episode_length)
+
+    When a window is exactly two steps long, as with the default 50% overlap,
+    every window is the sum of two consecutive step-sized blocks: one pass
+    over the rewards sums the blocks, with no per-timestep intermediate.
+    Other window lengths take differences of a float64 prefix sum.
+    """
+    rewards = rewards.reshape(len(rewards), -1)
+
+    if episode_length == 2 * step_size:
+        n_blocks = len(starts) + 1
+        blocks = rewards[:n_blocks * step_size].reshape(n_blocks, -1).sum(axis=1, dtype=np.float64)
+        return blocks[:-1] + blocks[1:]
+
+    # The per-step sums and their running total are both computed in place in
+    # one float64 buffer
+    cumulative = np.zeros(len(rewards) + 1)
+    rewards.sum(axis=1, dtype=np.float64, out=cumulative[1:])
+    np.cumsum(cumulative[1:], out=cumulative[1:])
+    return cumulative[starts + episode_length] - cumulative[starts]
+
+def find_best_episodes(npz_file, episode_length=1000, top_n=5, output_format='npz', pretty=False):
     """
     Analyze NPZ dataset and find episodes with highest cumulative rewards
 
@@ -16,10 +88,12 @@ def find_best_episodes(npz_file, episode_length=1000, top_n=5):
         npz_file: Path to exported NPZ file
         episode_length: Length of episode window to analyze
         top_n: Number of top episodes to identify
+        output_format: 'npz' (default) or 'json' for the best/worst episode files
+        pretty: Indent JSON output (compact by default)
     """
 
     print(f"📂 Loading {npz_file}")
-    data = np.load(npz_file)
+    data = load_npz(npz_file)
 
     # Extract metadata
     env = str(data['env'])
@@ -35,27 +109,23 @@ def find_best_episodes(npz_file, episode_length=1000, top_n=5):
     print(f"   Total timesteps: {n_timesteps}")
     print(f"   Agents: {n_agents}")
 
-    # Load trajectory data
+    # Load trajectory data; observations, actions and states stay memory-mapped
+    # (when stored uncompressed) and only the exported windows are read
     observations = data['observations']  # Shape: (timesteps, agents, obs_dim)
     actions = data['actions']            # Shape: (timesteps, agents, act_dim)
-    rewards = data['rewards']            # Shape: (timesteps, agents)
+    rewards = np.array(data['rewards'])  # Shape: (timesteps, agents)
+    states = data['states'] if 'states' in data else None
 
     print(f"   Shapes: obs={observations.shape}, act={actions.shape}, rew={rewards.shape}")
 
     print(f"\n🔍 Analyzing trajectories in {episode_length}-step windows...")
 
-    # Calculate cumulative rewards for sliding windows
-    episode_rewards = []
-    episode_starts = []
-
+    # Cumulative rewards of all sliding windows
     step_size = episode_length // 2  # 50% overlap
 
-    for start in range(0, n_timesteps - episode_length, step_size):
-        episode_reward = np.sum(rewards[start:start + episode_length])
-        episode_rewards.append(episode_reward)
-        episode_starts.append(start)
-
-    episode_rewards = np.array(episode_rewards)
+    starts = np.arange(0, n_timesteps - episode_length, step_size)
+    episode_rewards = _window_rewards(rewards, starts, episode_length, step_size)
+    episode_starts = starts.tolist()
 
     # Find statistics
     print(f"\n📈 Reward Statistics (per {episode_length} steps):")
@@ -65,8 +135,17 @@ def find_best_episodes(npz_file, episode_length=1000, top_n=5):
     print(f"   Min reward: {np.min(episode_rewards):.2f}")
     print(f"   Max reward: {np.max(episode_rewards):.2f}")
 
-    # Find best episodes
-    best_indices = np.argsort(episode_rewards)[-top_n:][::-1]
+    # The exported best and worst windows are a single reduction each
+    best_index = int(np.argmax(episode_rewards))
+    worst_index = int(np.argmin(episode_rewards))
+
+    # Find best episodes: partition out the top k, then sort only those
+    k = min(top_n, len(episode_rewards))
+    if k > 1:
+        best_indices = np.argpartition(-episode_rewards, k - 1)[:k]
+        best_indices = best_indices[np.argsort(-episode_rewards[best_indices])]
+    else:
+        best_indices = np.array([best_index])
 
     print(f"\n🏆 Top {top_n} Best Episodes:")
     for rank, idx in enumerate(best_indices, 1):
@@ -76,7 +155,11 @@ def find_best_episodes(npz_file, episode_length=1000, top_n=5):
         print(f"   #{rank}: Steps {start_step:7d}-{start_step + episode_length:7d} | Total: {reward:8.2f} | Avg: {avg_reward:6.3f}")
 
     # Find worst episodes
-    worst_indices = np.argsort(episode_rewards)[:top_n]
+    if k > 1:
+        worst_indices = np.argpartition(episode_rewards, k - 1)[:k]
+        worst_indices = worst_indices[np.argsort(episode_rewards[worst_indices])]
+    else:
+        worst_indices = np.array([worst_index])
 
     print(f"\n😞 Worst {top_n} Episodes (for comparison):")
     for rank, idx in enumerate(worst_indices, 1):
@@ -85,81 +168,66 @@ def find_best_episodes(npz_file, episode_length=1000, top_n=5):
         avg_reward = reward / episode_length
         print(f"   #{rank}: Steps {start_step:7d}-{start_step + episode_length:7d} | Total: {reward:8.2f} | Avg: {avg_reward:6.3f}")
 
-    # Export best episode as JSON for visualization
-    best_episode_start = episode_starts[best_indices[0]]
+    # Export best episode for visualization
+    best_episode_start = episode_starts[best_index]
     best_episode_end = best_episode_start + episode_length
 
-    print(f"\n💾 Exporting best episode to JSON for visualization...")
-
-    trajectories = []
-    for t in range(best_episode_start, best_episode_end):
-        step = {
-            't': int(t - best_episode_start),
-            'obs': observations[t].tolist(),
-            'act': actions[t].tolist(),
-            'rew': rewards[t].tolist()
-        }
-        if 'states' in data:
-            step['state'] = data['states'][t].tolist()
-        trajectories.append(step)
-
-    best_episode_data = {
-        'metadata': {
-            'env': env,
-            'scenario': scenario,
-            'quality': quality,
-            'n_agents': n_agents,
-            'n_timesteps': episode_length,
-            'obs_dim': observations.shape[-1],
-            'act_dim': actions.shape[-1],
-            'note': f'Best episode: steps {best_episode_start}-{best_episode_end}',
-            'original_start_step': best_episode_start,
-            'cumulative_reward': float(episode_rewards[best_indices[0]])
-        },
-        'trajectories': trajectories
+    print(f"\n💾 Exporting best episode to {output_format.upper()} for visualization...")
+    write_episode = _write_episode_npz if output_format == 'npz' else functools.partial(_write_episode_json, pretty=pretty)
+
+    fields = {
+        'obs': observations[best_episode_start:best_episode_end],
+        'act': actions[best_episode_start:best_episode_end],
+        'rew': rewards[best_episode_start:best_episode_end]
+    }
+    if states is not None:
+        fields['state'] = states[best_episode_start:best_episode_end]
+
+    best_metadata = {
+        'env': env,
+        'scenario': scenario,
+        'quality': quality,
+        'n_agents': n_agents,
+        'n_timesteps': episode_length,
+        'obs_dim': observations.shape[-1],
+        'act_dim': actions.shape[-1],
+        'note': f'Best episode: steps {best_episode_start}-{best_episode_end}',
+        'original_start_step': best_episode_start,
+        'cumulative_reward': float(episode_rewards[best_index])
     }
 
-    output_file = Path(npz_file).parent / f"{Path(npz_file).stem}_BEST.json"
-    with open(output_file, 'w') as f:
-        json.dump(best_episode_data, f, indent=2)
+    output_file = Path(npz_file).parent / f"{Path(npz_file).stem}_BEST.{output_format}"
+    write_episode(output_file, best_metadata, fields)
 
     print(f"   ✅ Saved: {output_file.name}")
 
     # Also export worst for comparison
-    worst_episode_start = episode_starts[worst_indices[0]]
+    worst_episode_start = episode_starts[worst_index]
     worst_episode_end = worst_episode_start + episode_length
 
-    trajectories = []
-    for t in range(worst_episode_start, worst_episode_end):
-        step = {
-            't': int(t - worst_episode_start),
-            'obs': observations[t].tolist(),
-            'act': actions[t].tolist(),
-            'rew': rewards[t].tolist()
-        }
-        if 'states' in data:
-            step['state'] = data['states'][t].tolist()
-        trajectories.append(step)
-
-    worst_episode_data = {
-        'metadata': {
-            'env': env,
-            'scenario': scenario,
-            'quality': quality,
-            'n_agents': n_agents,
-            'n_timesteps': episode_length,
-            'obs_dim': observations.shape[-1],
-            'act_dim': actions.shape[-1],
-            'note': f'Worst episode: steps {worst_episode_start}-{worst_episode_end}',
-            'original_start_step': worst_episode_start,
-            'cumulative_reward': float(episode_rewards[worst_indices[0]])
-        },
-        'trajectories': trajectories
+    fields = {
+        'obs': observations[worst_episode_start:worst_episode_end],
+        'act': actions[worst_episode_start:worst_episode_end],
+        'rew': rewards[worst_episode_start:worst_episode_end]
+    }
+    if states is not None:
+        fields['state'] = states[worst_episode_start:worst_episode_end]
+
+    worst_metadata = {
+        'env': env,
+        'scenario': scenario,
+        'quality': quality,
+        'n_agents': n_agents,
+        'n_timesteps': episode_length,
+        'obs_dim': observations.shape[-1],
+        'act_dim': actions.shape[-1],
+        'note': f'Worst episode: steps {worst_episode_start}-{worst_episode_end}',
+        'original_start_step': worst_episode_start,
+        'cumulative_reward': float(episode_rewards[worst_index])
     }
 
-    worst_output_file = Path(npz_file).parent / f"{Path(npz_file).stem}_WORST.json"
-    with open(worst_output_file, 'w') as f:
-        json.dump(worst_episode_data, f, indent=2)
+    worst_output_file = Path(npz_file).parent / f"{Path(npz_file).stem}_WORST.{output_format}"
+    write_episode(worst_output_file, worst_metadata, fields)
 
     print(f"   ✅ Saved: {worst_output_file.name}")
 
@@ -172,16 +240,22 @@ def find_best_episodes(npz_file, episode_length=1000, top_n=5):
 
 if __name__ == "__main__":
     if len(sys.argv) < 2:
-        print("Usage: python find_best_episodes_npz.py <path_to_npz_file> [episode_length] [top_n]")
+        print("Usage: python find_best_episodes_npz.py <path_to_npz_file> [episode_length] [top_n] [format] [--pretty]")
         print("\nExample:")
         print("  python find_best_episodes_npz.py data.npz 1000 5")
         print("\nArguments:")
         print("  episode_length: Length of episode window (default: 1000)")
         print("  top_n: Number of top episodes to show (default: 5)")
+        print("  format: npz (default) or json for the best/worst episode files")
+        print("  --pretty: Indent JSON output")
         sys.exit(1)
 
-    npz_file = sys.argv[1]
-    episode_length = int(sys.argv[2]) if len(sys.argv) > 2 else 1000
-    top_n = int(sys.argv[3]) if len(sys.argv) > 3 else 5
+    pretty = '--pretty' in sys.argv
+    args = [arg for arg in sys.argv if arg != '--pretty']
+
+    npz_file = args[1]
+    episode_length = int(args[2]) if len(args) > 2 else 1000
+    top_n = int(args[3]) if len(args) > 3 else 5
+    output_format = args[4] if len(args) > 4 else 'npz'
 
-    find_best_episodes(npz_file, episode_length, top_n)
+    find_best_episodes(npz_file, episode_length, top_n, output_format, pretty)
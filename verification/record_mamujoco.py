@@ -4,23 +4,94 @@
 Record OG-MARL exported data as a video by replaying in MAMuJoCo
 """
 
+import contextlib
+import ctypes.util
 import json
+import os
 import numpy as np
 from pathlib import Path
 import sys
 import io
+import queue
+import threading
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+from _replay import replay
+
+# Rendered frames buffered between the simulation and the encoder thread
+FRAME_QUEUE_SIZE = 4
 
 # Fix Windows console encoding for emojis
 if sys.platform == 'win32':
     sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8')
     sys.stderr = io.TextIOWrapper(sys.stderr.buffer, encoding='utf-8')
 
+def load_episode(path):
+    """
+    Load an exported episode for replay
+
+    Either a JSON file with 'metadata' and per-step 'trajectories', or an NPZ
+    file (as written by find_best_episodes_npz.py) with 'act' and 'rew'
+    arrays and the metadata as scalar entries.
+
+    Returns:
+        (metadata, actions, rewards): actions and rewards indexable per step
+    """
+    if Path(path).suffix == '.npz':
+        with np.load(path) as data:
+            metadata = {key: data[key].item() for key in data.files if data[key].ndim == 0}
+            return metadata, data['act'], data['rew']
+
+    with open(path, 'rb') as f:
+        data = orjson.loads(f.read()) if orjson is not None else json.load(f)
+    trajectories = data['trajectories']
+    return data['metadata'], [step['act'] for step in trajectories], [step['rew'] for step in trajectories]
+
+def _select_offscreen_gl():
+    """
+    Pick MuJoCo's offscreen GL backend on headless Linux, unless MUJOCO_GL is set
+
+    MuJoCo's default GLFW backend needs a display. Without one, EGL renders
+    into a GPU framebuffer; OSMesa (software) is the fallback.
+
+    Returns:
+        The MUJOCO_GL value in effect, or None for MuJoCo's default
+    """
+    headless = sys.platform.startswith('linux') and not (os.environ.get('DISPLAY') or os.environ.get('WAYLAND_DISPLAY'))
+    if headless and 'MUJOCO_GL' not in os.environ:
+        for backend, library in (('egl', 'EGL'), ('osmesa', 'OSMesa')):
+            if ctypes.util.find_library(library):
+                os.environ['MUJOCO_GL'] = backend
+                break
+    return os.environ.get('MUJOCO_GL')
+
+def _encode_worker(frames, writer, errors):
+    """
+    Append frames from a queue to the video writer until a None sentinel
+
+    After a failed append the remaining frames are discarded, so the producer
+    never blocks on a full queue; the exception is left in errors.
+    """
+    while True:
+        frame = frames.get()
+        if frame is None:
+            return
+        if not errors:
+            try:
+                writer.append_data(frame)
+            except Exception as e:
+                errors.append(e)
+
 def record_trajectory(json_file, output_video, num_steps=1000, fps=30):
     """
-    Load JSON data and record video of MAMuJoCo environment
+    Load exported data and record video of MAMuJoCo environment
 
     Args:
-        json_file: Path to exported JSON file
+        json_file: Path to exported JSON (or episode NPZ) file
         output_video: Path to save video file (e.g., output.mp4)
         num_steps: Number of steps to record (default 1000)
         fps: Frames per second for output video (default 30)
@@ -28,25 +99,27 @@ def record_trajectory(json_file, output_video, num_steps=1000, fps=30):
 
     # Load exported data
     print(f"📂 Loading {json_file}")
-    with open(json_file, 'r') as f:
-        data = json.load(f)
-
-    metadata = data['metadata']
-    trajectories = data['trajectories']
+    metadata, episode_actions, episode_rewards = load_episode(json_file)
+    n_steps = min(num_steps, len(episode_actions))
+    n_agents = metadata['n_agents']
 
     print(f"\n📊 Dataset Info:")
     print(f"   Environment: {metadata['env']}")
     print(f"   Scenario: {metadata['scenario']}")
-    print(f"   Agents: {metadata['n_agents']}")
-    print(f"   Recording {min(num_steps, len(trajectories))} steps")
+    print(f"   Agents: {n_agents}")
+    print(f"   Recording {n_steps} steps")
 
     # Add og-marl to path
     og_marl_path = Path(__file__).parent.parent
     if str(og_marl_path) not in sys.path:
         sys.path.insert(0, str(og_marl_path))
 
-    # Import and create environment with RGB array rendering
+    # Import and create environment with RGB array rendering; the GL backend
+    # has to be chosen before MuJoCo's rendering module is imported
     print(f"\n🎮 Creating environment...")
+    gl_backend = _select_offscreen_gl()
+    if gl_backend:
+        print(f"   Offscreen rendering with MUJOCO_GL={gl_backend}")
 
     import gymnasium as gym
     from og_marl.wrapped_environments.gymnasium_mamujoco import get_env_config
@@ -63,80 +136,100 @@ def record_trajectory(json_file, output_video, num_steps=1000, fps=30):
     # Reset environment
     obs, _ = env.reset()
 
-    print(f"\n🎬 Recording video...")
-    print(f"   This may take a while...")
+    try:
+        import imageio
+    except ImportError:
+        print(f"   ❌ imageio not installed. Installing...")
+        import subprocess
+        subprocess.run([sys.executable, "-m", "pip", "install", "-q", "imageio", "imageio-ffmpeg"])
 
-    frames = []
+        import imageio
 
-    try:
-        for i in range(min(num_steps, len(trajectories))):
-            step_data = trajectories[i]
+    print(f"\n🎬 Recording video to {output_video}...")
+    print(f"   This may take a while...")
 
-            # Get stored action
-            stored_actions = np.array(step_data['act'])  # Shape: (n_agents, act_dim)
-            stored_reward = np.array(step_data['rew'])
+    # Every replayed action converted once, as (steps, n_agents, act_dim)
+    stored_actions_all = np.asarray(episode_actions[:n_steps], dtype=np.float32)
 
-            # Format actions for environment
-            actions = {f"agent_{j}": stored_actions[j] for j in range(metadata['n_agents'])}
+    # Frames are encoded as they are rendered, so they are never all held in
+    # memory; a background thread encodes while the next steps are simulated
+    # (MuJoCo rendering and the ffmpeg pipe both release the GIL)
+    n_frames = 0
+    writer = imageio.get_writer(output_video, fps=fps, macro_block_size=1)
+    frames = queue.Queue(maxsize=FRAME_QUEUE_SIZE)
+    encode_errors = []
+    encoder = threading.Thread(target=_encode_worker, args=(frames, writer, encode_errors), daemon=True)
+    encoder.start()
 
-            # Step environment
-            obs, reward, terminated, truncated, _ = env.step(actions)
+    # Environment agent names, formatted once rather than every step
+    agent_keys = [f"agent_{j}" for j in range(n_agents)]
 
-            # Capture frame
-            frame = env.render()
-            frames.append(frame)
+    try:
+        for i, frame, reward, ended in replay(env, stored_actions_all, agent_keys, render=True):
+            if encode_errors:
+                break
+            frames.put(np.ascontiguousarray(frame, dtype=np.uint8))
+            n_frames = i + 1
 
             # Print progress
             if i % 100 == 0:
-                print(f"   Step {i}/{min(num_steps, len(trajectories))} | {len(frames)} frames captured")
+                print(f"   Step {i}/{n_steps} | {n_frames} frames captured")
 
-            # Check termination
-            done = any(terminated.values()) if isinstance(terminated, dict) else terminated
-            trunc = any(truncated.values()) if isinstance(truncated, dict) else truncated
-
-            if done or trunc:
+            if ended:
                 print(f"   Episode ended at step {i}, resetting...")
-                obs, _ = env.reset()
 
     except KeyboardInterrupt:
         print(f"\n\n⏸️  Recording stopped by user")
 
-    env.close()
-
-    # Save video
-    print(f"\n💾 Saving video to {output_video}...")
+    finally:
+        frames.put(None)
+        encoder.join()
+        env.close()
+        writer.close()
 
-    try:
-        import imageio
+    if encode_errors:
+        raise encode_errors[0]
 
-        # Convert frames to proper format
-        frames_array = np.array(frames)
-        print(f"   Video shape: {frames_array.shape} (frames, height, width, channels)")
+    if n_frames:
+        print(f"   Video shape: {(n_frames, *frame.shape)} (frames, height, width, channels)")
 
-        # Save as MP4
-        imageio.mimsave(output_video, frames_array, fps=fps)
+    file_size = Path(output_video).stat().st_size / (1024*1024)
+    print(f"\n✅ Video saved! ({file_size:.1f} MB)")
+    print(f"   Open with: {output_video}")
 
-        file_size = Path(output_video).stat().st_size / (1024*1024)
-        print(f"\n✅ Video saved! ({file_size:.1f} MB)")
-        print(f"   Open with: {output_video}")
 
-    except ImportError:
-        print(f"   ❌ imageio not installed. Installing...")
-        import subprocess
-        subprocess.run([sys.executable, "-m", "pip", "install", "-q", "imageio", "imageio-ffmpeg"])
-
-        import imageio
-        frames_array = np.array(frames)
-        imageio.mimsave(output_video, frames_array, fps=fps)
+def run_worker():
+    """
+    Record videos for jobs read from stdin until it closes
 
-        file_size = Path(output_video).stat().st_size / (1024*1024)
-        print(f"\n✅ Video saved! ({file_size:.1f} MB)")
-        print(f"   Open with: {output_video}")
+    Each stdin line is one JSON job {"json_file", "output_video", "num_steps",
+    "fps"}; each gets one JSON status line on stdout, {"ok": true} or
+    {"ok": false, "error": ...}. Progress messages go to stderr. One worker
+    records many videos, so gymnasium and MuJoCo are imported only once.
+    """
+    status_out = sys.stdout
+    for line in sys.stdin:
+        if not line.strip():
+            continue
+        try:
+            job = json.loads(line)
+            with contextlib.redirect_stdout(sys.stderr):
+                record_trajectory(job['json_file'], job['output_video'], job['num_steps'], job['fps'])
+            status = {'ok': True}
+        except Exception as e:
+            status = {'ok': False, 'error': f"{type(e).__name__}: {e}"}
+        status_out.write(json.dumps(status) + "\n")
+        status_out.flush()
 
 
 if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == '--worker':
+        run_worker()
+        sys.exit(0)
+
     if len(sys.argv) < 2:
-        print("Usage: python record_mamujoco.py <path_to_json_file> [output_video] [num_steps] [fps]")
+        print("Usage: python record_mamujoco.py <path_to_json_or_npz_file> [output_video] [num_steps] [fps]")
+        print("       python record_mamujoco.py --worker  (jobs as JSON lines on stdin)")
         print("\nExample:")
         print("  python record_mamujoco.py /path/to/data.json output.mp4 1000 30")
         print("\nArguments:")
@@ -8,6 +8,13 @@ import numpy as np
 from pathlib import Path
 import sys
 
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+from _replay import replay
+
 def verify_trajectory(json_file, num_steps=100, render=False):
     """
     Load JSON data and replay in MAMuJoCo environment
@@ -20,8 +27,8 @@ def verify_trajectory(json_file, num_steps=100, render=False):
 
     # Load exported data
     print(f"📂 Loading {json_file}")
-    with open(json_file, 'r') as f:
-        data = json.load(f)
+    with open(json_file, 'rb') as f:
+        data = orjson.loads(f.read()) if orjson is not None else json.load(f)
 
     metadata = data['metadata']
     trajectories = data['trajectories']
@@ -98,24 +105,15 @@ def verify_trajectory(json_file, num_steps=100, render=False):
     # Verify data consistency without environment replay
     print(f"\n📊 Data Validation:")
 
-    action_ranges = []
-    reward_ranges = []
-    obs_ranges = []
-
-    for i in range(min(100, len(trajectories))):
-        step_data = trajectories[i]
-
-        stored_actions = np.array(step_data['act'])
-        stored_obs = np.array(step_data['obs'])
-        stored_reward = np.array(step_data['rew'])
-
-        action_ranges.append((stored_actions.min(), stored_actions.max()))
-        obs_ranges.append((stored_obs.min(), stored_obs.max()))
-        reward_ranges.append((stored_reward.min(), stored_reward.max()))
+    # Stack the first steps of each field into one array, then reduce it once
+    checked = trajectories[:100]
+    checked_actions = np.array([step['act'] for step in checked], dtype=np.float32)
+    checked_obs = np.array([step['obs'] for step in checked], dtype=np.float32)
+    checked_rewards = np.array([step['rew'] for step in checked], dtype=np.float32)
 
-    print(f"   Actions: min={np.min([r[0] for r in action_ranges]):.3f}, max={np.max([r[1] for r in action_ranges]):.3f}")
-    print(f"   Observations: min={np.min([r[0] for r in obs_ranges]):.3f}, max={np.max([r[1] for r in obs_ranges]):.3f}")
-    print(f"   Rewards: min={np.min([r[0] for r in reward_ranges]):.3f}, max={np.max([r[1] for r in reward_ranges]):.3f}")
+    print(f"   Actions: min={checked_actions.min():.3f}, max={checked_actions.max():.3f}")
+    print(f"   Observations: min={checked_obs.min():.3f}, max={checked_obs.max():.3f}")
+    print(f"   Rewards: min={checked_rewards.min():.3f}, max={checked_rewards.max():.3f}")
 
     # Check if we have state information
     if 'state' in trajectories[0]:
@@ -127,12 +125,15 @@ def verify_trajectory(json_file, num_steps=100, render=False):
 
     # Verify shapes are consistent
     shapes_consistent = True
+    n_agents = metadata['n_agents']
+    obs_shape = (n_agents, metadata['obs_dim'])
+    act_shape = (n_agents, metadata['act_dim'])
     for i in range(min(10, len(trajectories))):
         step_data = trajectories[i]
-        if np.array(step_data['obs']).shape != (metadata['n_agents'], metadata['obs_dim']):
+        if np.array(step_data['obs']).shape != obs_shape:
             shapes_consistent = False
             print(f"   ❌ Inconsistent obs shape at step {i}")
-        if np.array(step_data['act']).shape != (metadata['n_agents'], metadata['act_dim']):
+        if np.array(step_data['act']).shape != act_shape:
             shapes_consistent = False
             print(f"   ❌ Inconsistent act shape at step {i}")
 
@@ -146,20 +147,14 @@ def verify_trajectory(json_file, num_steps=100, render=False):
     obs, info = env.reset()
     env_rewards = []
 
-    for i in range(min(20, len(trajectories))):
-        step_data = trajectories[i]
-        stored_actions = np.array(step_data['act'])
-        actions = {f"agent_{j}": stored_actions[j] for j in range(metadata['n_agents'])}
+    # Environment agent names, formatted once rather than every step
+    agent_keys = [f"agent_{j}" for j in range(n_agents)]
 
-        obs, reward, terminated, truncated, info = env.step(actions)
+    for i, _, reward, ended in replay(env, checked_actions[:20], agent_keys, reset_on_end=False):
         env_rewards.append(np.mean(list(reward.values())))
 
-        done = any(terminated.values()) if isinstance(terminated, dict) else terminated
-        trunc = any(truncated.values()) if isinstance(truncated, dict) else truncated
-
-        if done or trunc:
+        if ended:
             print(f"   ⚠️  Episode terminated early at step {i}")
-            break
 
     stored_rewards_sample = [np.mean(trajectories[i]['rew']) for i in range(len(env_rewards))]
 
@@ -177,7 +172,7 @@ def verify_trajectory(json_file, num_steps=100, render=False):
         print(f"   ✓ Data shapes are consistent")
         checks_passed += 1
 
-    if -1.5 <= np.min([r[0] for r in action_ranges]) and np.max([r[1] for r in action_ranges]) <= 1.5:
+    if -1.5 <= checked_actions.min() and checked_actions.max() <= 1.5:
         print(f"   ✓ Actions are in valid range [-1, 1]")
         checks_passed += 1
     else:
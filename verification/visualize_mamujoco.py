@@ -3,40 +3,249 @@
 Visualize OG-MARL exported data by replaying in MAMuJoCo with rendering
 """
 
+import importlib.util
 import json
 import numpy as np
 from pathlib import Path
+import shutil
+import subprocess
 import sys
 import time
 
-def visualize_trajectory(json_file, num_steps=1000, speed=1.0):
+try:
+    import simdjson
+except ImportError:
+    simdjson = None
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+from _npz import load_npz
+from _replay import done_reducer, replay
+
+# Final stretch (seconds) before a frame deadline that is busy-waited rather
+# than slept, since sleeps this short are not accurate
+SPIN_MARGIN = 5e-4
+
+# Frame rate of --record videos
+RECORD_FPS = 50
+
+def load_trajectory(json_file):
+    """
+    Parse an exported JSON file into its metadata and per-step trajectories
+
+    With pysimdjson installed the trajectories stay a lazy simdjson Array, so
+    a step is only materialized when it is indexed; otherwise the whole file
+    is parsed with orjson, or the stdlib json as a last resort.
+
+    Returns:
+        (metadata, trajectories)
+    """
+    if simdjson is not None:
+        data = simdjson.Parser().load(str(json_file))
+        return data['metadata'].as_dict(), data['trajectories']
+
+    with open(json_file, 'rb') as f:
+        data = orjson.loads(f.read()) if orjson is not None else json.load(f)
+    return data['metadata'], data['trajectories']
+
+def _as_list(value):
+    """A parsed JSON array as (nested) Python lists (simdjson arrays are lazy views)"""
+    return value.as_list() if hasattr(value, 'as_list') else value
+
+def _as_array(value, shape):
+    """
+    A parsed JSON array of numbers as an array-like of the given shape
+
+    simdjson arrays are exported straight from the parsed document as one
+    flat float64 buffer, without creating a Python float per number.
+    """
+    if hasattr(value, 'as_buffer'):
+        return np.frombuffer(value.as_buffer(of_type='d'), dtype=np.float64).reshape(shape)
+    return value
+
+def _ensure_binary_cache(json_file):
+    """
+    Return the binary replay cache of a JSON export, writing it if needed
+
+    The cache is an uncompressed NPZ next to the JSON, '<stem>.replay.npz',
+    with 'act' (steps, n_agents, act_dim) and 'rew' (steps, n_agents) as
+    float32 and the scalar metadata entries, the same layout as the episode
+    files of find_best_episodes_npz.py. The JSON is parsed only when the
+    cache is missing or older than it.
+    """
+    json_file = Path(json_file)
+    cache_file = json_file.with_name(f"{json_file.stem}.replay.npz")
+    if cache_file.exists() and cache_file.stat().st_mtime_ns >= json_file.stat().st_mtime_ns:
+        return cache_file
+
+    print(f"   Building replay cache {cache_file.name}...")
+    metadata, trajectories = load_trajectory(json_file)
+
+    # Each step's rows are copied straight into preallocated float32 arrays,
+    # sized from the first step, instead of building a nested list first.
+    # Only 'act' and 'rew' are read, so with simdjson the other fields of a
+    # step are never decoded
+    first = trajectories[0] if len(trajectories) else {'act': [], 'rew': []}
+    fields = {
+        name: np.empty((len(trajectories), *np.shape(_as_list(first[name]))), dtype=np.float32)
+        for name in ('act', 'rew')
+    }
+    act_shape, rew_shape = fields['act'].shape[1:], fields['rew'].shape[1:]
+    for t, step in enumerate(trajectories):
+        fields['act'][t] = _as_array(step['act'], act_shape)
+        fields['rew'][t] = _as_array(step['rew'], rew_shape)
+
+    scalars = {key: value for key, value in metadata.items() if isinstance(value, (str, int, float, bool))}
+
+    # Written under a temporary name, so an interrupted run leaves no
+    # truncated cache behind
+    tmp_file = cache_file.with_name(cache_file.name + '.tmp')
+    with open(tmp_file, 'wb') as f:
+        np.savez(f, **fields, **scalars)
+    tmp_file.replace(cache_file)
+    return cache_file
+
+def _mujoco_env(env):
+    """The gymnasium MuJoCo env underneath the multi-agent wrapper (None if not found)"""
+    single_agent_env = getattr(env.environment, 'single_agent_env', None)
+    return getattr(single_agent_env, 'unwrapped', None)
+
+def _time_limit(env):
+    """The TimeLimit wrapper counting the episode's elapsed steps (None if not found)"""
+    wrapper = getattr(env.environment, 'single_agent_env', None)
+    while wrapper is not None and not hasattr(wrapper, '_elapsed_steps'):
+        wrapper = getattr(wrapper, 'env', None)
+    return wrapper
+
+def _save_snapshot(snapshot_dir, step, env, mujoco_env):
+    """
+    Save the environment state after `step` replayed steps, unless already saved
+
+    Besides qpos/qvel this keeps everything a later step depends on: the
+    simulation time, the solver warm start, the env's RNG state and the
+    TimeLimit step counter, so a run resumed from the snapshot matches one
+    replayed from step 0.
+    """
+    path = snapshot_dir / f"step_{step}.npz"
+    if path.exists():
+        return
+
+    data = mujoco_env.data
+    state = dict(qpos=data.qpos, qvel=data.qvel, time=data.time, qacc_warmstart=data.qacc_warmstart,
+                 rng_state=json.dumps(mujoco_env.np_random.bit_generator.state))
+    time_limit = _time_limit(env)
+    if time_limit is not None:
+        state['elapsed_steps'] = time_limit._elapsed_steps
+
+    snapshot_dir.mkdir(parents=True, exist_ok=True)
+    np.savez(path, **state)
+
+def _restore_snapshot(path, env, mujoco_env):
+    """
+    Restore the environment state saved by _save_snapshot()
+
+    Returns:
+        False (leaving the environment untouched) if the snapshot predates
+        the full state being saved
+    """
+    with np.load(path) as snapshot:
+        if 'rng_state' not in snapshot.files:
+            return False
+        mujoco_env.set_state(snapshot['qpos'], snapshot['qvel'])
+        mujoco_env.data.time = snapshot['time'].item()
+        mujoco_env.data.qacc_warmstart[:] = snapshot['qacc_warmstart']
+        mujoco_env.np_random.bit_generator.state = json.loads(snapshot['rng_state'].item())
+        time_limit = _time_limit(env)
+        if time_limit is not None and 'elapsed_steps' in snapshot.files:
+            time_limit._elapsed_steps = snapshot['elapsed_steps'].item()
+    return True
+
+def _latest_snapshot(snapshot_dir, start, min_mtime_ns):
+    """
+    Find the latest snapshot taken at or before step `start`
+
+    Snapshots older than min_mtime_ns (the replayed data) are ignored.
+
+    Returns:
+        (step, path), or (0, None) if there is none
+    """
+    latest = (0, None)
+    for path in snapshot_dir.glob('step_*.npz'):
+        step = int(path.stem[len('step_'):])
+        if latest[0] < step <= start and path.stat().st_mtime_ns >= min_mtime_ns:
+            latest = (step, path)
+    return latest
+
+def _start_video_encoder(path, width, height, fps=RECORD_FPS):
+    """
+    Start an ffmpeg process encoding raw RGB frames from its stdin to H.264
+
+    Encoding runs in ffmpeg's own process, so writing a frame only copies it
+    into the pipe. ffmpeg is taken from PATH, else from imageio-ffmpeg.
+
+    Returns:
+        The subprocess.Popen, or None if no ffmpeg was found
+    """
+    ffmpeg = shutil.which('ffmpeg')
+    if ffmpeg is None:
+        try:
+            import imageio_ffmpeg
+            ffmpeg = imageio_ffmpeg.get_ffmpeg_exe()
+        except (ImportError, RuntimeError):
+            return None
+
+    return subprocess.Popen(
+        [ffmpeg, '-y', '-loglevel', 'error',
+         '-f', 'rawvideo', '-pix_fmt', 'rgb24', '-s', f'{width}x{height}', '-r', str(fps), '-i', '-',
+         '-vf', 'pad=ceil(iw/2)*2:ceil(ih/2)*2', '-c:v', 'libx264', '-preset', 'ultrafast',
+         '-pix_fmt', 'yuv420p', str(path)],
+        stdin=subprocess.PIPE, bufsize=10 * width * height * 3)
+
+def visualize_trajectory(json_file, num_steps=1000, speed=1.0, start=0, snapshot_every=0, record=None,
+                         stride=1):
     """
     Load JSON data and visualize in MAMuJoCo environment
 
     Args:
-        json_file: Path to exported JSON file
+        json_file: Path to exported JSON file (or episode NPZ file)
         num_steps: Number of steps to visualize (default 1000)
         speed: Playback speed multiplier (default 1.0, use 0.5 for slower)
+        start: First step to visualize; earlier steps are replayed without
+            rendering, from the latest saved snapshot before it if any
+        snapshot_every: Save the simulator state every this many steps under
+            .viz_cache/<file name>/ next to the input (0 = never)
+        record: Also encode the visualized steps to this video file
+        stride: Render (and record) only every stride-th step, so long
+            trajectories play back stride times faster
     """
 
     # Load exported data
     print(f"📂 Loading {json_file}")
-    with open(json_file, 'r') as f:
-        data = json.load(f)
+    npz_file = json_file if Path(json_file).suffix == '.npz' else _ensure_binary_cache(json_file)
+    data = load_npz(npz_file)
+    metadata = {key: value.item() for key, value in data.items() if value.ndim == 0}
 
-    metadata = data['metadata']
-    trajectories = data['trajectories']
+    # Replayed actions as (steps, n_agents, act_dim); float32 memory-mapped
+    # actions are used in place
+    start = min(start, len(data['act']))
+    n_steps = min(start + num_steps, len(data['act']))
+    stored_actions_all = np.asarray(data['act'][:n_steps], dtype=np.float32)
+
+    # Mean stored reward per step, for the progress line
+    stored_reward_means = np.asarray(data['rew'][:n_steps], dtype=np.float64).reshape(n_steps, -1).mean(axis=1)
 
     print(f"\n📊 Dataset Info:")
     print(f"   Environment: {metadata['env']}")
     print(f"   Scenario: {metadata['scenario']}")
     print(f"   Agents: {metadata['n_agents']}")
-    print(f"   Visualizing {min(num_steps, len(trajectories))} steps")
+    print(f"   Visualizing {n_steps - start} steps" + (f" from step {start}" if start else ""))
 
-    # Add og-marl to path
-    og_marl_path = Path(__file__).parent.parent
-    if str(og_marl_path) not in sys.path:
-        sys.path.insert(0, str(og_marl_path))
+    # Use an installed og_marl, falling back to the checkout this script is in
+    if importlib.util.find_spec('og_marl') is None:
+        sys.path.insert(0, str(Path(__file__).parent.parent))
 
     # Import and create environment with rendering
     from og_marl.wrapped_environments.gymnasium_mamujoco import GymnasiumMAMuJoCo
@@ -58,64 +267,169 @@ def visualize_trajectory(json_file, num_steps=1000, speed=1.0):
     # Reset environment
     obs, info = env.reset()
 
+    # Environment agent names, formatted once rather than every step, and one
+    # action dict whose values are replaced in place each step
+    agent_keys = tuple(f"agent_{j}" for j in range(metadata['n_agents']))
+    actions = dict.fromkeys(agent_keys)
+
+    # Snapshots of the simulator state, so a later --start can skip the
+    # steps before it
+    mujoco_env = _mujoco_env(env)
+    snapshot_dir = Path(json_file).parent / '.viz_cache' / Path(json_file).name
+    if mujoco_env is None:
+        snapshot_every = 0
+    elif snapshot_every:
+        print(f"   Saving snapshots every {snapshot_every} steps to {snapshot_dir}")
+
+    # Replay the steps before start without rendering
+    if start:
+        skip_from, snapshot_path = 0, None
+        if mujoco_env is not None:
+            skip_from, snapshot_path = _latest_snapshot(snapshot_dir, start, Path(npz_file).stat().st_mtime_ns)
+        if snapshot_path is not None and _restore_snapshot(snapshot_path, env, mujoco_env):
+            print(f"   Restored snapshot at step {skip_from}")
+        else:
+            skip_from = 0
+
+        print(f"   Fast-forwarding {start - skip_from} steps...")
+        for i, _, _, _ in replay(env, stored_actions_all[skip_from:start], agent_keys):
+            if snapshot_every and (skip_from + i + 1) % snapshot_every == 0:
+                _save_snapshot(snapshot_dir, skip_from + i + 1, env, mujoco_env)
+
     print(f"\n🎬 Starting visualization...")
     print(f"   Press Ctrl+C to stop")
-    print(f"   Playback speed: {speed}x")
+    print(f"   Playback speed: {speed}x" + (f", rendering every {stride} steps" if stride > 1 else ""))
 
+    # Probe rendering once instead of guarding every frame; environments
+    # without a working render() render by themselves
+    render = env.environment.render
     try:
-        for i in range(min(num_steps, len(trajectories))):
-            step_data = trajectories[i]
+        render()
+    except Exception:
+        render = None
+
+    # Optional video of the visualized steps, rendered offscreen and encoded
+    # by an ffmpeg process
+    video = None
+    if record and mujoco_env is None:
+        print(f"   ⚠️  Cannot record: MuJoCo renderer not found")
+    elif record:
+        height, width = mujoco_env.mujoco_renderer.render('rgb_array').shape[:2]
+        video = _start_video_encoder(record, width, height)
+        if video is None:
+            print(f"   ⚠️  Cannot record: ffmpeg not found (pip install imageio-ffmpeg)")
+        else:
+            print(f"   Recording to {record} ({width}x{height}, {RECORD_FPS} fps)")
+
+    # Frames are paced against a perf_counter deadline, so the time spent
+    # stepping and rendering counts towards each frame instead of adding to it
+    frame_interval = 0.002 / speed  # MuJoCo timestep is typically 0.002s
+    next_frame = time.perf_counter()
+
+    # Chosen from the first step's result type
+    reduce_done = None
+
+    try:
+        for i in range(start, n_steps):
+            if snapshot_every and i and i % snapshot_every == 0:
+                _save_snapshot(snapshot_dir, i, env, mujoco_env)
 
             # Get stored action
-            stored_actions = np.array(step_data['act'])  # Shape: (n_agents, act_dim)
-            stored_reward = np.array(step_data['rew'])
+            stored_actions = stored_actions_all[i]  # Shape: (n_agents, act_dim)
 
-            # Format actions for environment
-            actions = {f"agent_{j}": stored_actions[j] for j in range(metadata['n_agents'])}
+            # Format actions for environment (rows are views into the
+            # replayed actions, not copies)
+            actions.update(zip(agent_keys, stored_actions))
 
             # Step environment
             obs, reward, terminated, truncated, info = env.step(actions)
 
-            # Render
-            try:
-                env.environment.render()
-            except:
-                pass  # Some environments auto-render
+            # Render, record and pace only every stride-th step; the steps in
+            # between are still simulated so the dynamics match the data
+            if (i - start) % stride == 0:
+                if render is not None:
+                    render()
+                if video is not None:
+                    video.stdin.write(np.ascontiguousarray(mujoco_env.mujoco_renderer.render('rgb_array')).data)
+
+                # Control playback speed: sleep until just before the deadline,
+                # then spin, as time.sleep can overshoot by about a millisecond
+                next_frame += frame_interval
+                remaining = next_frame - time.perf_counter()
+                if remaining > SPIN_MARGIN:
+                    time.sleep(remaining - SPIN_MARGIN)
+                while time.perf_counter() < next_frame:
+                    pass
 
             # Print progress
             if i % 50 == 0:
-                print(f"   Step {i}/{min(num_steps, len(trajectories))} | Stored reward: {np.mean(stored_reward):.3f}")
-
-            # Control playback speed (MuJoCo timestep is typically 0.002s)
-            time.sleep(0.002 / speed)
+                print(f"   Step {i}/{n_steps} | Stored reward: {stored_reward_means[i]:.3f}")
 
             # Check termination
-            done = any(terminated.values()) if isinstance(terminated, dict) else terminated
-            trunc = any(truncated.values()) if isinstance(truncated, dict) else truncated
+            if reduce_done is None:
+                reduce_done = done_reducer(terminated)
 
-            if done or trunc:
+            if reduce_done(terminated) or reduce_done(truncated):
                 print(f"\n   Episode ended at step {i}, resetting...")
                 obs, info = env.reset()
 
     except KeyboardInterrupt:
         print(f"\n\n⏸️  Visualization stopped by user")
 
+    if video is not None:
+        video.stdin.close()
+        video.wait()
+        print(f"   ✓ Video saved: {record}")
+
     print(f"\n✅ Visualization complete!")
     env.environment.close()
 
 
-if __name__ == "__main__":
-    if len(sys.argv) < 2:
-        print("Usage: python visualize_mamujoco.py <path_to_json_file> [num_steps] [speed]")
+def main(argv=None):
+    """
+    Command-line entry point
+
+    Args:
+        argv: Arguments without the program name (default: sys.argv[1:])
+
+    Returns:
+        Process exit status
+    """
+    # --start N, --snapshot-every K, --record PATH and --stride K may appear
+    # anywhere on the command line
+    option_types = {'--start': int, '--snapshot-every': int, '--record': str, '--stride': int}
+    options = {'--start': 0, '--snapshot-every': 0, '--record': None, '--stride': 1}
+    args = []
+    argv = iter(sys.argv[1:] if argv is None else argv)
+    for arg in argv:
+        if arg in option_types:
+            options[arg] = option_types[arg](next(argv))
+        else:
+            args.append(arg)
+
+    if not args:
+        print("Usage: python visualize_mamujoco.py <path_to_json_or_npz_file> [num_steps] [speed] [--start N] [--snapshot-every K] [--record out.mp4] [--stride K]")
         print("\nExample:")
         print("  python visualize_mamujoco.py /path/to/data.json 1000 1.0")
+        print("  python visualize_mamujoco.py /path/to/data.json 500 --start 20000 --snapshot-every 1000")
         print("\nArguments:")
         print("  num_steps: Number of steps to visualize (default: 1000)")
         print("  speed: Playback speed multiplier (default: 1.0, use 0.5 for half speed)")
-        sys.exit(1)
+        print("  --start: First step to show; earlier steps are replayed without rendering")
+        print("  --snapshot-every: Save the simulator state every K steps, so later --start runs")
+        print("                    resume from the nearest snapshot instead of step 0")
+        print(f"  --record: Also save the visualized steps as an H.264 video ({RECORD_FPS} fps)")
+        print("  --stride: Render only every K-th step (all steps are still simulated)")
+        return 1
+
+    json_file = args[0]
+    num_steps = int(args[1]) if len(args) > 1 else 1000
+    speed = float(args[2]) if len(args) > 2 else 1.0
 
-    json_file = sys.argv[1]
-    num_steps = int(sys.argv[2]) if len(sys.argv) > 2 else 1000
-    speed = float(sys.argv[3]) if len(sys.argv) > 3 else 1.0
+    visualize_trajectory(json_file, num_steps, speed, options['--start'], options['--snapshot-every'],
+                         options['--record'], max(1, options['--stride']))
+    return 0
 
-    visualize_trajectory(json_file, num_steps, speed)
+
+if __name__ == "__main__":
+    sys.exit(main())